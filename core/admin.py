@@ -1,7 +1,8 @@
 # Em core/admin.py
 from django.contrib import admin
 from .models import Categoria, Fornecedor, Produto
-from .models import Armazem, EstoqueItem, MovimentacaoEstoque
+from .models import Armazem, EstoqueItem, MovimentacaoEstoque, EventoWebhook, ReservaEstoque
+from .models import MovimentacaoEstoqueArquivada, ResumoMensalMovimentacao, LoteMovimentacoesCompactadas, PosicaoEstoque
 
 @admin.register(Categoria)
 class CategoriaAdmin(admin.ModelAdmin):
@@ -21,24 +22,77 @@ class ProdutoAdmin(admin.ModelAdmin):
 
 @admin.register(Armazem)
 class ArmazemAdmin(admin.ModelAdmin):
-    list_display = ('nome', 'localizacao')
+    list_display = ('nome', 'localizacao', 'prioridade')
     search_fields = ('nome',)
 
 @admin.register(EstoqueItem)
 class EstoqueItemAdmin(admin.ModelAdmin):
-    list_display = ('produto', 'armazem', 'quantidade')
+    list_display = ('produto', 'armazem', 'quantidade', 'reservado')
     list_filter = ('armazem', 'produto__categoria')
     search_fields = ('produto__nome', 'produto__sku')
 
-    readonly_fields = ('quantidade',)
+    readonly_fields = ('quantidade', 'reservado')
 
 @admin.register(MovimentacaoEstoque)
 class MovimentacaoEstoqueAdmin(admin.ModelAdmin):
     list_display = ('data_movimentacao', 'produto', 'tipo', 'quantidade', 'armazem', 'responsavel')
     list_filter = ('tipo', 'armazem', 'data_movimentacao')
     search_fields = ('produto__nome', 'produto__sku', 'motivo')
+    list_select_related = ('produto', 'armazem', 'responsavel')
+    # Sem COUNT(*) da tabela inteira a cada página.
+    show_full_result_count = False
 
     def has_change_permission(self, request, obj=None):
         return False
     def has_delete_permission(self, request, obj=None):
-        return False
\ No newline at end of file
+        return False
+
+class SomenteLeituraAdmin(admin.ModelAdmin):
+    def has_add_permission(self, request):
+        return False
+    def has_change_permission(self, request, obj=None):
+        return False
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(MovimentacaoEstoqueArquivada)
+class MovimentacaoEstoqueArquivadaAdmin(SomenteLeituraAdmin):
+    list_display = ('data_movimentacao', 'produto', 'tipo', 'quantidade', 'armazem', 'responsavel')
+    list_filter = ('tipo', 'armazem')
+    search_fields = ('produto__sku',)
+    list_select_related = ('produto', 'armazem', 'responsavel')
+    show_full_result_count = False
+
+@admin.register(ResumoMensalMovimentacao)
+class ResumoMensalMovimentacaoAdmin(SomenteLeituraAdmin):
+    list_display = ('mes', 'produto', 'armazem', 'tipo', 'quantidade', 'movimentacoes')
+    list_filter = ('tipo', 'armazem', 'mes')
+    search_fields = ('produto__sku',)
+    list_select_related = ('produto', 'armazem')
+
+@admin.register(LoteMovimentacoesCompactadas)
+class LoteMovimentacoesCompactadasAdmin(SomenteLeituraAdmin):
+    list_display = ('mes', 'armazem', 'linhas', 'data_criacao')
+    list_filter = ('armazem',)
+    exclude = ('conteudo',)
+
+@admin.register(EventoWebhook)
+class EventoWebhookAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tipo', 'status', 'tentativas', 'proxima_tentativa', 'data_criacao', 'data_envio')
+    list_filter = ('status', 'tipo')
+    search_fields = ('chave_deduplicacao', 'ultimo_erro')
+    readonly_fields = ('payload', 'lote', 'ultimo_erro', 'data_criacao', 'data_envio')
+
+@admin.register(ReservaEstoque)
+class ReservaEstoqueAdmin(SomenteLeituraAdmin):
+    list_display = ('pedido_venda', 'produto', 'armazem', 'quantidade', 'expira_em', 'data_criacao')
+    list_filter = ('armazem',)
+    search_fields = ('produto__nome', 'produto__sku')
+
+@admin.register(PosicaoEstoque)
+class PosicaoEstoqueAdmin(SomenteLeituraAdmin):
+    list_display = ('momento', 'produto', 'armazem', 'quantidade')
+    list_filter = ('armazem',)
+    search_fields = ('produto__sku',)
+    list_select_related = ('produto', 'armazem')
+    show_full_result_count = False
@@ -0,0 +1,133 @@
+from django.db import transaction
+from django.db.models import F, Case, When, Value, IntegerField
+from .models import EstoqueItem, MovimentacaoEstoque
+from .services import EstoqueInsuficiente, TAMANHO_LOTE_BULK, _abaixo_minimo_apos, _ordenar_linhas, _registrar_variacoes
+
+ESTRATEGIA_MENOS_ARMAZENS = 'MENOS_ARMAZENS'
+ESTRATEGIA_PRIORIDADE = 'PRIORIDADE'
+ESTRATEGIAS_ALOCACAO = (ESTRATEGIA_MENOS_ARMAZENS, ESTRATEGIA_PRIORIDADE)
+
+
+def _carregar_candidatos(produto_ids, travar=False):
+    """
+    Todos os itens de estoque com saldo disponível para os produtos, numa única consulta:
+    [(id, produto_id, armazem_id, prioridade do armazém, quantidade, disponível)]. Com
+    `travar`, as linhas ficam bloqueadas na ordem (produto, armazém), a mesma das reservas.
+    """
+    queryset = EstoqueItem.objects.filter(produto_id__in=produto_ids, quantidade__gt=F('reservado'))
+    if travar:
+        queryset = queryset.select_for_update(of=('self',))
+    return list(queryset.annotate(disponivel=F('quantidade') - F('reservado')).order_by('produto_id', 'armazem_id').values_list(
+        'id', 'produto_id', 'armazem_id', 'armazem__prioridade', 'quantidade', 'disponivel'
+    ))
+
+
+def _cobertura(estoque, pendentes):
+    # Percorre só os produtos do armazém: cada passo do guloso custa O(candidatos), não O(armazéns x linhas).
+    completas = unidades = 0
+    for produto_id, disponivel in estoque.items():
+        falta = pendentes.get(produto_id)
+        if falta:
+            completas += disponivel >= falta
+            unidades += min(disponivel, falta)
+    return completas, unidades
+
+
+def _calcular_plano(linhas, candidatos, estrategia):
+    """
+    Divide as linhas entre os armazéns. Retorna {armazem_id: [(produto_id, quantidade)]}.
+
+    MENOS_ARMAZENS é o guloso de cobertura de conjuntos: a cada passo escolhe o armazém que
+    atende por inteiro mais linhas pendentes (desempate por unidades atendidas e prioridade)
+    e tira dele tudo o que puder. PRIORIDADE atende cada linha percorrendo os armazéns em
+    ordem de prioridade. Levanta EstoqueInsuficiente se o disponível somado não basta.
+    """
+    pendentes = dict(linhas)
+    prioridades, por_armazem, total = {}, {}, {}
+    for _, produto_id, armazem_id, prioridade, _, disponivel in candidatos:
+        prioridades[armazem_id] = prioridade
+        por_armazem.setdefault(armazem_id, {})[produto_id] = disponivel
+        total[produto_id] = total.get(produto_id, 0) + disponivel
+    for produto_id, quantidade in linhas:
+        if total.get(produto_id, 0) < quantidade:
+            raise EstoqueInsuficiente(produto_id, None)
+
+    plano = {}
+    ordem = sorted(por_armazem, key=lambda armazem_id: (prioridades[armazem_id], armazem_id), reverse=True)
+    while pendentes:
+        if estrategia == ESTRATEGIA_PRIORIDADE:
+            armazem_id = ordem.pop()
+        else:
+            armazem_id = max(por_armazem, key=lambda armazem_id: (
+                *_cobertura(por_armazem[armazem_id], pendentes), -prioridades[armazem_id], -armazem_id
+            ))
+
+        estoque = por_armazem.pop(armazem_id)
+        retiradas = []
+        for produto_id in sorted(pendentes.keys() & estoque.keys()):
+            quantidade = min(estoque[produto_id], pendentes[produto_id])
+            retiradas.append((produto_id, quantidade))
+            pendentes[produto_id] -= quantidade
+            if not pendentes[produto_id]:
+                del pendentes[produto_id]
+        if retiradas:
+            plano[armazem_id] = retiradas
+    return plano
+
+
+def planejar_alocacao(linhas, estrategia=ESTRATEGIA_MENOS_ARMAZENS):
+    """Simulação: calcula o plano sem travar nem alterar o estoque."""
+    linhas = _ordenar_linhas(linhas)
+    return _calcular_plano(linhas, _carregar_candidatos([produto_id for produto_id, _ in linhas]), estrategia)
+
+
+def alocar_saidas(linhas, responsavel, motivo, estrategia=ESTRATEGIA_MENOS_ARMAZENS):
+    """
+    Calcula o plano sobre os itens travados e dá baixa em todos os armazéns de uma vez,
+    com um número fixo de consultas (um UPDATE para todos os itens, um INSERT em lote das
+    movimentações): ou o pedido sai inteiro, ou nada é baixado.
+    Retorna (plano, {armazem_id: {produto_id: saldo}}).
+    """
+    linhas = _ordenar_linhas(linhas)
+    if not linhas:
+        return {}, {}
+
+    with transaction.atomic():
+        candidatos = _carregar_candidatos([produto_id for produto_id, _ in linhas], travar=True)
+        plano = _calcular_plano(linhas, candidatos, estrategia)
+        itens = {(produto_id, armazem_id): (item_id, quantidade) for item_id, produto_id, armazem_id, _, quantidade, _ in candidatos}
+
+        retiradas = [
+            (itens[(produto_id, armazem_id)][0], quantidade)
+            for armazem_id, linhas_armazem in plano.items()
+            for produto_id, quantidade in linhas_armazem
+        ]
+        item_ids = [item_id for item_id, _ in retiradas]
+        por_item = Case(*[When(pk=item_id, then=Value(quantidade)) for item_id, quantidade in retiradas], default=Value(0), output_field=IntegerField())
+
+        # A condição no próprio UPDATE mantém a baixa segura mesmo em bancos sem SELECT ... FOR UPDATE.
+        atualizados = EstoqueItem.objects.filter(pk__in=item_ids, quantidade__gte=F('reservado') + por_item).update(quantidade=F('quantidade') - por_item)
+        if atualizados != len(retiradas):
+            raise EstoqueInsuficiente(None, None)
+        # Com centenas de linhas, montar o CASE domina o custo; o indicador é recalculado sobre o saldo novo, sem repeti-lo.
+        EstoqueItem.objects.filter(pk__in=item_ids).update(abaixo_minimo=_abaixo_minimo_apos(0))
+
+        MovimentacaoEstoque.objects.bulk_create([
+            MovimentacaoEstoque(produto_id=produto_id, armazem_id=armazem_id, quantidade=-quantidade, responsavel=responsavel, tipo='SAIDA', motivo=motivo)
+            for armazem_id, linhas_armazem in sorted(plano.items())
+            for produto_id, quantidade in linhas_armazem
+        ], batch_size=TAMANHO_LOTE_BULK)
+        _registrar_variacoes({produto_id: -quantidade for produto_id, quantidade in linhas})
+
+    saldos = {
+        armazem_id: {produto_id: itens[(produto_id, armazem_id)][1] - quantidade for produto_id, quantidade in linhas_armazem}
+        for armazem_id, linhas_armazem in plano.items()
+    }
+    return plano, saldos
+
+
+def serializar_plano(plano):
+    return [
+        {'armazem': armazem_id, 'itens': [{'produto': produto_id, 'quantidade': quantidade} for produto_id, quantidade in retiradas]}
+        for armazem_id, retiradas in sorted(plano.items())
+    ]
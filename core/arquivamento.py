@@ -0,0 +1,158 @@
+import gzip
+import io
+import json
+from datetime import datetime
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import LoteMovimentacoesCompactadas, MesRestaurado, MovimentacaoEstoque, MovimentacaoEstoqueArquivada, ResumoMensalMovimentacao
+
+TAMANHO_LOTE_ARQUIVAMENTO = 5000
+CAMPOS = ('id', 'produto_id', 'armazem_id', 'quantidade', 'data_movimentacao', 'responsavel_id', 'tipo', 'motivo')
+
+
+def inicio_do_mes(meses_atras=0, referencia=None):
+    """Início (meia-noite local do dia 1) do mês `meses_atras` meses antes da referência."""
+    referencia = timezone.localtime(referencia)
+    indice = referencia.year * 12 + referencia.month - 1 - meses_atras
+    return timezone.make_aware(datetime(indice // 12, indice % 12 + 1, 1))
+
+
+def _proximo_mes(inicio):
+    return timezone.make_aware(datetime(inicio.year + inicio.month // 12, inicio.month % 12 + 1, 1))
+
+
+def camadas_de_movimentacoes(filtrar):
+    """
+    Querysets das movimentações da mais recente para a mais antiga (tabela quente, arquivo),
+    cada um passado por `filtrar`. Como o arquivamento corta por data, a PaginacaoKeyset
+    lê as camadas em sequência e só consulta o arquivo quando a tabela quente se esgota.
+    """
+    return [
+        filtrar(MovimentacaoEstoque.objects.select_related('responsavel')),
+        filtrar(MovimentacaoEstoqueArquivada.objects.select_related('responsavel')),
+    ]
+
+
+def meses_compactados(produto_id=None, armazem_id=None):
+    """
+    Meses ('AAAA-MM') cujo detalhe só existe nos lotes compactados e, portanto, não aparece na
+    listagem nem no histórico; opcionalmente restritos a um produto e a um armazém.
+    """
+    lotes = LoteMovimentacoesCompactadas.objects.all()
+    if armazem_id is not None:
+        lotes = lotes.filter(armazem_id=armazem_id)
+    if produto_id is not None:
+        lotes = lotes.filter(Exists(ResumoMensalMovimentacao.objects.filter(
+            mes=OuterRef('mes'), armazem_id=OuterRef('armazem_id'), produto_id=produto_id,
+        )))
+    return [f'{mes:%Y-%m}' for mes in lotes.order_by('mes').values_list('mes', flat=True).distinct()]
+
+
+def arquivar_movimentacoes(antes_de, tamanho_lote=TAMANHO_LOTE_ARQUIVAMENTO):
+    """Move da tabela quente para o arquivo as movimentações anteriores a `antes_de`, em lotes transacionais."""
+    total = 0
+    while True:
+        with transaction.atomic():
+            linhas = list(
+                MovimentacaoEstoque.objects.filter(data_movimentacao__lt=antes_de).order_by('id').values_list(*CAMPOS)[:tamanho_lote]
+            )
+            if not linhas:
+                return total
+            MovimentacaoEstoqueArquivada.objects.bulk_create(
+                [MovimentacaoEstoqueArquivada(**dict(zip(CAMPOS, linha))) for linha in linhas], ignore_conflicts=True
+            )
+            MovimentacaoEstoque.objects.filter(id__in=[linha[0] for linha in linhas]).delete()
+        total += len(linhas)
+
+
+def _compactar(linhas):
+    buffer = io.BytesIO()
+    codificador = DjangoJSONEncoder(ensure_ascii=False)
+    with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=9) as arquivo:
+        for linha in linhas:
+            arquivo.write((codificador.encode(dict(zip(CAMPOS, linha))) + '\n').encode('utf-8'))
+    return buffer.getvalue()
+
+
+def _compactar_mes(inicio, fim):
+    do_mes = MovimentacaoEstoqueArquivada.objects.filter(data_movimentacao__gte=inicio, data_movimentacao__lt=fim)
+    ResumoMensalMovimentacao.objects.bulk_create([
+        ResumoMensalMovimentacao(mes=inicio.date(), **resumo)
+        for resumo in do_mes.values('produto_id', 'armazem_id', 'tipo').annotate(quantidade=Sum('quantidade'), movimentacoes=Count('id')).order_by()
+    ], update_conflicts=True, unique_fields=['mes', 'produto', 'armazem', 'tipo'], update_fields=['quantidade', 'movimentacoes'])
+
+    total = 0
+    for armazem_id in do_mes.values_list('armazem_id', flat=True).distinct().order_by('armazem_id'):
+        linhas = list(do_mes.filter(armazem_id=armazem_id).order_by('data_movimentacao', 'id').values_list(*CAMPOS))
+        LoteMovimentacoesCompactadas.objects.update_or_create(
+            mes=inicio.date(), armazem_id=armazem_id, defaults={'linhas': len(linhas), 'conteudo': _compactar(linhas)}
+        )
+        total += len(linhas)
+    do_mes.delete()
+    return total
+
+
+def compactar_meses(antes_de):
+    """
+    Compacta os meses do arquivo anteriores a `antes_de` (alinhado ao mês): cada mês vira
+    linhas de ResumoMensalMovimentacao e um lote gzip por armazém, e o detalhe sai do
+    arquivo. Um mês por transação. Meses restaurados (MesRestaurado) ficam de fora até
+    recompactar_mes. Retorna [(mês, movimentações compactadas)].
+    """
+    restaurados = Q()
+    for mes in MesRestaurado.objects.values_list('mes', flat=True):
+        inicio = timezone.make_aware(datetime(mes.year, mes.month, 1))
+        restaurados |= Q(data_movimentacao__gte=inicio, data_movimentacao__lt=_proximo_mes(inicio))
+    pendentes = MovimentacaoEstoqueArquivada.objects.filter(data_movimentacao__lt=antes_de).exclude(restaurados)
+
+    compactados = []
+    while True:
+        primeira = pendentes.order_by('data_movimentacao').values_list('data_movimentacao', flat=True).first()
+        if primeira is None:
+            return compactados
+        inicio = inicio_do_mes(referencia=primeira)
+        with transaction.atomic():
+            total = _compactar_mes(inicio, min(_proximo_mes(inicio), antes_de))
+        compactados.append((inicio.date(), total))
+
+
+def restaurar_mes(mes):
+    """
+    Descomprime os lotes de um mês de volta para o arquivo (para consultas de detalhe) e marca o
+    mês como restaurado, para a compactação periódica não desfazer a restauração. Retorna as linhas restauradas.
+    """
+    total = 0
+    with transaction.atomic():
+        for lote in LoteMovimentacoesCompactadas.objects.filter(mes=mes).select_for_update():
+            movimentacoes = []
+            for texto in gzip.decompress(bytes(lote.conteudo)).decode('utf-8').splitlines():
+                registro = json.loads(texto)
+                registro['data_movimentacao'] = parse_datetime(registro['data_movimentacao'])
+                movimentacoes.append(MovimentacaoEstoqueArquivada(**registro))
+            MovimentacaoEstoqueArquivada.objects.bulk_create(movimentacoes, batch_size=TAMANHO_LOTE_ARQUIVAMENTO, ignore_conflicts=True)
+            lote.delete()
+            total += len(movimentacoes)
+        if total:
+            MesRestaurado.objects.get_or_create(mes=mes)
+    return total
+
+
+def recompactar_mes(mes):
+    """Compacta de novo um mês restaurado e o devolve à compactação periódica. Retorna as linhas compactadas."""
+    with transaction.atomic():
+        if not MesRestaurado.objects.filter(mes=mes).delete()[0]:
+            return None
+        inicio = timezone.make_aware(datetime(mes.year, mes.month, 1))
+        return _compactar_mes(inicio, _proximo_mes(inicio))
+
+
+def janelas_configuradas(agora=None):
+    """Cortes (início de mês) da janela quente e da janela com detalhe no arquivo."""
+    return (
+        inicio_do_mes(getattr(settings, 'MOVIMENTACOES_MESES_QUENTES', 6), agora),
+        inicio_do_mes(getattr(settings, 'MOVIMENTACOES_MESES_DETALHADOS', 24), agora),
+    )
@@ -0,0 +1,182 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotAuthenticated, NotFound, PermissionDenied, ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from .autenticacao import AutenticacaoJWTSemEstado, UsuarioDoToken
+from .filters import BaixoEstoqueFilter
+from .leitura import RenderizadorJSONRapido
+from .metricas import aobter_metricas, periodo_das_metricas
+from .models import ContagemBaixoEstoque, EstoqueItem, Produto
+from .permissions import IsGerente
+
+
+def _resposta(dados, status_code=status.HTTP_200_OK):
+    return HttpResponse(RenderizadorJSONRapido().render(dados), status=status_code, content_type='application/json')
+
+
+class VisaoAssincrona(View):
+    """
+    View nativa do Django (async) para leituras de alta concorrência sob ASGI, sem ocupar
+    uma thread por requisição enquanto espera o banco. O DRF não tem views assíncronas,
+    então a autenticação JWT (AutenticacaoJWTSemEstado.aauthenticate) e as permission_classes
+    do DRF são aplicadas aqui; as respostas usam o mesmo formato JSON das views do DRF.
+
+    As permissões rodam direto no event loop quando o usuário vem das claims do token (não
+    fazem E/S); para usuários lidos do banco, rodam numa thread.
+    """
+    permission_classes = [IsAuthenticated]
+    autenticacao = AutenticacaoJWTSemEstado()
+
+    async def dispatch(self, request, *args, **kwargs):
+        medicao = getattr(request, '_medicao', None)
+        if medicao is not None:
+            medicao.endpoint = f'{type(self).__name__}.{request.method.lower()}'
+        try:
+            await self._autenticar(request)
+            await self._checar_permissoes(request)
+            return await super().dispatch(request, *args, **kwargs)
+        except APIException as exc:
+            return self._erro(exc)
+
+    async def _autenticar(self, request):
+        resultado = await self.autenticacao.aauthenticate(request)
+        request.user, request.auth = resultado if resultado is not None else (AnonymousUser(), None)
+
+    async def _checar_permissoes(self, request):
+        permissoes = [permissao() for permissao in self.permission_classes]
+
+        def permitido():
+            return all(permissao.has_permission(request, self) for permissao in permissoes)
+
+        if not (permitido() if isinstance(request.user, UsuarioDoToken) else await sync_to_async(permitido)()):
+            if not request.user or not request.user.is_authenticated:
+                raise NotAuthenticated()
+            raise PermissionDenied()
+
+    def _erro(self, exc):
+        dados = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        resposta = _resposta(dados, exc.status_code)
+        if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+            resposta['WWW-Authenticate'] = self.autenticacao.authenticate_header(None)
+        return resposta
+
+
+def _pagina(request, total):
+    """Página e tamanho no formato da PaginacaoPadrao (?page=, ?page_size=)."""
+    try:
+        tamanho = int(request.GET.get('page_size', settings.REST_FRAMEWORK['PAGE_SIZE']))
+    except ValueError:
+        tamanho = settings.REST_FRAMEWORK['PAGE_SIZE']
+    tamanho = min(max(tamanho, 1), getattr(settings, 'PAGINACAO_TAMANHO_MAXIMO', 500))
+    try:
+        pagina = int(request.GET.get('page', 1))
+    except ValueError:
+        raise NotFound('Página inválida.')
+    if pagina < 1 or (pagina - 1) * tamanho >= max(total, 1):
+        raise NotFound('Página inválida.')
+    return pagina, tamanho
+
+
+class DisponibilidadeEstoqueView(VisaoAssincrona):
+    """Saldo disponível de um produto (?produto= ou ?sku=) por armazém (opcional ?armazem=), para os PDVs."""
+
+    async def get(self, request):
+        filtros = {}
+        try:
+            if request.GET.get('produto'):
+                filtros['produto_id'] = int(request.GET['produto'])
+            elif request.GET.get('sku'):
+                filtros['produto__sku'] = request.GET['sku']
+            else:
+                return _resposta({'erro': "Informe 'produto' ou 'sku'."}, status.HTTP_400_BAD_REQUEST)
+            if request.GET.get('armazem'):
+                filtros['armazem_id'] = int(request.GET['armazem'])
+        except ValueError:
+            return _resposta({'erro': "'produto' e 'armazem' devem ser números inteiros."}, status.HTTP_400_BAD_REQUEST)
+
+        itens = [
+            item async for item in EstoqueItem.objects.filter(**filtros).order_by('armazem_id')
+            .values('produto_id', 'produto__sku', 'armazem_id', 'quantidade', 'reservado')
+        ]
+        if itens:
+            produto_id, sku = itens[0]['produto_id'], itens[0]['produto__sku']
+        else:
+            filtros_produto = {'id': filtros['produto_id']} if 'produto_id' in filtros else {'sku': filtros['produto__sku']}
+            produto = await Produto.objects.filter(**filtros_produto).values('id', 'sku').afirst()
+            if produto is None:
+                return _resposta({'erro': 'Produto não encontrado.'}, status.HTTP_404_NOT_FOUND)
+            produto_id, sku = produto['id'], produto['sku']
+
+        armazens = [
+            {'armazem': item['armazem_id'], 'quantidade': item['quantidade'], 'reservado': item['reservado'], 'disponivel': item['quantidade'] - item['reservado']}
+            for item in itens
+        ]
+        return _resposta({
+            'produto': produto_id,
+            'sku': sku,
+            'disponivel': sum(armazem['disponivel'] for armazem in armazens),
+            'armazens': armazens,
+        })
+
+
+class RelatorioBaixoEstoqueAssincronoView(VisaoAssincrona):
+    """Mesmo conteúdo, filtros e paginação de RelatorioBaixoEstoqueView."""
+
+    async def get(self, request):
+        filtro = BaixoEstoqueFilter(request.GET, queryset=EstoqueItem.objects.filter(abaixo_minimo=True))
+        if not filtro.is_valid():
+            raise ValidationError(filtro.errors)
+        itens = filtro.qs.order_by('armazem_id', 'produto_id')
+
+        total = await itens.acount()
+        if total == 0:
+            return _resposta({'mensagem': 'Nenhum produto com baixo estoque encontrado.'})
+        pagina, tamanho = _pagina(request, total)
+        linhas = itens.values(
+            'produto_id', 'produto__nome', 'produto__sku', 'produto__estoque_minimo', 'quantidade', 'armazem__nome'
+        )[(pagina - 1) * tamanho:pagina * tamanho]
+
+        url = request.build_absolute_uri()
+        anterior = None
+        if pagina > 1:
+            anterior = remove_query_param(url, 'page') if pagina == 2 else replace_query_param(url, 'page', pagina - 1)
+        return _resposta({
+            'count': total,
+            'next': replace_query_param(url, 'page', pagina + 1) if pagina * tamanho < total else None,
+            'previous': anterior,
+            'results': [
+                {
+                    'produto_id': linha['produto_id'],
+                    'produto_nome': linha['produto__nome'],
+                    'produto_sku': linha['produto__sku'],
+                    'estoque_minimo': linha['produto__estoque_minimo'],
+                    'quantidade_atual': linha['quantidade'],
+                    'armazem_nome': linha['armazem__nome'],
+                }
+                async for linha in linhas
+            ],
+        })
+
+
+class DashboardAssincronoView(VisaoAssincrona):
+    """Mesmo conteúdo de DashboardView."""
+    permission_classes = [IsGerente | IsAdminUser]
+
+    async def get(self, request):
+        datas, erro = periodo_das_metricas(request.GET)
+        if erro:
+            return _resposta({'erro': erro}, status.HTTP_400_BAD_REQUEST)
+
+        metricas = await aobter_metricas(**datas)
+        return _resposta({
+            'total_vendas': metricas['total_vendas'],
+            'total_compras': metricas['total_compras'],
+            'valor_total_inventario': metricas['valor_total_inventario'],
+            'produtos_com_baixo_estoque': await ContagemBaixoEstoque.atotal(),
+            'top_5_produtos_vendidos': metricas['top_5_produtos_vendidos'],
+        })
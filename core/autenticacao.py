@@ -0,0 +1,157 @@
+import logging
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from .cache_respostas import cache_compartilhado
+from .permissions import papeis_do_usuario
+
+logger = logging.getLogger(__name__)
+
+CLAIM_GRUPOS = 'grupos'
+# Momento de emissão em nanossegundos: `iat` tem resolução de segundos e não ordena a emissão e a revogação no mesmo segundo.
+CLAIM_EMITIDO_EM = 'emitido_em_ns'
+
+
+def sem_estado_habilitado():
+    """
+    Se as claims do token podem dispensar a leitura do usuário. A revogação (desativação,
+    troca de grupos) só vale em todos os processos com cache compartilhado; por isso, sem
+    AUTENTICACAO_SEM_ESTADO explícito, o caminho sem estado só é usado com um.
+    """
+    habilitado = getattr(settings, 'AUTENTICACAO_SEM_ESTADO', None)
+    return cache_compartilhado() if habilitado is None else habilitado
+
+
+def _chave_revogacao(usuario_id):
+    return f'jwt:revogado:{usuario_id}'
+
+
+def adicionar_claims(token, usuario):
+    token['username'] = usuario.get_username()
+    token['is_staff'] = usuario.is_staff
+    token['is_superuser'] = usuario.is_superuser
+    token[CLAIM_GRUPOS] = sorted(papeis_do_usuario(usuario))
+    token[CLAIM_EMITIDO_EM] = time.time_ns()
+
+
+def revogar_tokens(usuario_ids):
+    """
+    Invalida os access tokens já emitidos para os usuários: tokens emitidos até a revogação
+    são recusados até expirarem, forçando a renovação, que relê o usuário.
+    """
+    usuario_ids = list(usuario_ids)
+    if not usuario_ids:
+        return
+    validade = int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()) + 1
+
+    def revogar():
+        agora = time.time_ns()
+        cache.set_many({_chave_revogacao(usuario_id): agora for usuario_id in usuario_ids}, validade)
+    # Após o commit, como invalidar_papeis: um token renovado antes do commit ainda leria os papéis antigos.
+    transaction.on_commit(revogar)
+
+
+class ObterTokenSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        adicionar_claims(token, user)
+        return token
+
+
+class RenovarTokenSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        # O access token herdaria as claims (e o iat) do refresh token; relê usuário e grupos para não propagar claims antigas.
+        data = super().validate(attrs)
+        access = AccessToken(data['access'])
+        access.set_iat()
+        usuario = self.token_class(attrs['refresh']).payload[api_settings.USER_ID_CLAIM]
+        adicionar_claims(access, get_user_model().objects.get(**{api_settings.USER_ID_FIELD: usuario}))
+        data['access'] = str(access)
+        return data
+
+
+class UsuarioDoToken(TokenUser):
+    @cached_property
+    def _papeis(self):
+        return frozenset(self.token.get(CLAIM_GRUPOS, ()))
+
+
+class AutenticacaoJWTSemEstado(JWTAuthentication):
+    """
+    Autentica pelo JWT sem buscar o User no banco: o usuário é montado a partir das claims
+    assinadas (id, username, is_staff, is_superuser, grupos).
+
+    O banco só é consultado quando a ação da view grava o usuário como responsável
+    (atributo `acoes_com_responsavel` da view) ou quando o token não traz as claims.
+    Usuários desativados ou com papéis alterados têm os tokens revogados via cache; sem
+    cache compartilhado (ver sem_estado_habilitado) ou com ele fora do ar, o usuário é
+    lido do banco, como no JWTAuthentication, que recusa usuários inativos.
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        token = self.get_validated_token(raw_token)
+
+        if CLAIM_GRUPOS not in token or not sem_estado_habilitado() or self._exige_usuario_persistido(request):
+            return self.get_user(token), token
+
+        try:
+            revogado_em = cache.get(_chave_revogacao(token[api_settings.USER_ID_CLAIM]))
+        except Exception:
+            logger.warning('Cache de revogação indisponível; autenticando pelo banco.', exc_info=True)
+            return self.get_user(token), token
+        self._conferir_revogacao(token, revogado_em)
+        return UsuarioDoToken(token), token
+
+    async def aauthenticate(self, request):
+        """
+        authenticate() para as views assíncronas (core.assincrono), com uma HttpRequest do
+        Django: a validação do JWT não faz E/S; o cache de revogação e a busca do usuário
+        (tokens sem as claims) são aguardados fora do event loop.
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        token = self.get_validated_token(raw_token)
+
+        if CLAIM_GRUPOS not in token or not sem_estado_habilitado():
+            return await sync_to_async(self.get_user)(token), token
+        try:
+            revogado_em = await cache.aget(_chave_revogacao(token[api_settings.USER_ID_CLAIM]))
+        except Exception:
+            logger.warning('Cache de revogação indisponível; autenticando pelo banco.', exc_info=True)
+            return await sync_to_async(self.get_user)(token), token
+        self._conferir_revogacao(token, revogado_em)
+        return UsuarioDoToken(token), token
+
+    def _conferir_revogacao(self, token, revogado_em):
+        if revogado_em is None:
+            return
+        emitido_em = token.get(CLAIM_EMITIDO_EM)
+        # Sem a claim (tokens antigos), o `iat` do mesmo segundo da revogação também é recusado.
+        revogado = emitido_em <= revogado_em if emitido_em is not None else token.get('iat', 0) <= revogado_em // 10 ** 9
+        if revogado:
+            raise InvalidToken('Token revogado. Renove o token de acesso.')
+
+    def _exige_usuario_persistido(self, request):
+        view = request.parser_context.get('view')
+        return getattr(view, 'action', None) in getattr(view, 'acoes_com_responsavel', ())
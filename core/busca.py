@@ -0,0 +1,97 @@
+import re
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from .models import Categoria, Produto
+
+# Campos devolvidos pelo autocompletar: só o necessário para a lista do PDV.
+CAMPOS_SUGESTAO = ('id', 'sku', 'nome', 'preco_venda', 'estoque_total')
+LIMITE_SUGESTOES = 10
+MAXIMO_SUGESTOES = 50
+MAXIMO_TERMOS = 8
+# Prefixos curtos casam com boa parte do catálogo; ranquear todos custaria O(casamentos) por tecla.
+# Só os primeiros N casamentos (ordem do índice) são ranqueados: exato para buscas seletivas, aproximado para as amplas.
+CANDIDATOS_RANQUEADOS = 1000
+CONFIGURACAO_TEXTO = 'portuguese'
+
+TABELA_FTS = 'core_produto_busca'
+# Pesos do bm25 por coluna do índice FTS5 (nome, sku, descricao).
+PESOS_FTS = (10.0, 5.0, 1.0)
+
+
+def _termos(texto):
+    return re.findall(r'\w+', texto.lower())[:MAXIMO_TERMOS]
+
+
+def vetor_busca():
+    """Mesma expressão do índice GIN criado na migração 0014: o planner só usa o índice se forem idênticas."""
+    from django.contrib.postgres.search import SearchVector
+    return (
+        SearchVector('nome', weight='A', config=CONFIGURACAO_TEXTO)
+        + SearchVector('sku', weight='A', config=CONFIGURACAO_TEXTO)
+        + SearchVector('descricao', weight='C', config=CONFIGURACAO_TEXTO)
+    )
+
+
+def _consulta_postgres(termos):
+    from django.contrib.postgres.search import SearchQuery
+    # Cada termo vira prefixo (`termo:*`): é o que o autocompletar precisa enquanto o usuário digita.
+    return SearchQuery(' & '.join(f'{termo}:*' for termo in termos), search_type='raw', config=CONFIGURACAO_TEXTO)
+
+
+def _consulta_fts(termos):
+    return ' '.join(f'"{termo}"*' for termo in termos)
+
+
+def filtrar_produtos(queryset, texto):
+    """Restringe o queryset aos produtos que casam com o texto, usando o índice textual do banco."""
+    termos = _termos(texto)
+    if not termos:
+        return queryset.none()
+    # Nome da categoria, como no search_fields anterior: a tabela de categorias é pequena e a busca nela não
+    # passa pelo índice textual; os produtos saem pelo índice da FK. Todos os termos precisam estar no nome.
+    pela_categoria = Q(categoria__in=Categoria.objects.filter(*[Q(nome__icontains=termo) for termo in termos]).values('pk'))
+    if connection.vendor == 'postgresql':
+        # Prefixo de SKU: atendido pelo índice produto_sku_prefixo (migração 0017), em BitmapOr com o GIN.
+        return queryset.annotate(vetor=vetor_busca()).filter(
+            Q(vetor=_consulta_postgres(termos)) | Q(sku__istartswith=texto.strip()) | pela_categoria
+        )
+    return queryset.filter(
+        Q(pk__in=RawSQL(f'SELECT rowid FROM {TABELA_FTS} WHERE {TABELA_FTS} MATCH %s', [_consulta_fts(termos)])) | pela_categoria
+    )
+
+
+def sugerir_produtos(texto, limite=LIMITE_SUGESTOES):
+    """
+    Autocompletar: até `limite` projeções leves (CAMPOS_SUGESTAO), das mais relevantes
+    para as menos. Um SKU idêntico ao texto vem sempre primeiro.
+    """
+    termos = _termos(texto)
+    if not termos:
+        return []
+    texto = texto.strip()
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchRank
+        consulta = _consulta_postgres(termos)
+        candidatos = filtrar_produtos(Produto.objects.all(), texto).values('pk')[:CANDIDATOS_RANQUEADOS]
+        sugestoes = list(
+            Produto.objects.filter(pk__in=candidatos)
+            .annotate(relevancia=SearchRank(vetor_busca(), consulta))
+            .order_by('-relevancia', 'nome')
+            .values(*CAMPOS_SUGESTAO)[:limite]
+        )
+        if not sugestoes:
+            # Nada pelo texto nem pelo prefixo: tenta o SKU digitado com erro (índice de trigramas).
+            sugestoes = list(Produto.objects.filter(sku__trigram_similar=texto).order_by('sku').values(*CAMPOS_SUGESTAO)[:limite])
+    else:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM (SELECT rowid, bm25({TABELA_FTS}, {", ".join(map(str, PESOS_FTS))}) AS relevancia '
+                f'FROM {TABELA_FTS} WHERE {TABELA_FTS} MATCH %s LIMIT %s) ORDER BY relevancia LIMIT %s',
+                [_consulta_fts(termos), CANDIDATOS_RANQUEADOS, limite]
+            )
+            ordem = {produto_id: posicao for posicao, (produto_id,) in enumerate(cursor.fetchall())}
+        sugestoes = sorted(Produto.objects.filter(pk__in=ordem).values(*CAMPOS_SUGESTAO), key=lambda produto: ordem[produto['id']])
+
+    return sorted(sugestoes, key=lambda produto: produto['sku'].lower() != texto.lower())
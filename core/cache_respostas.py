@@ -0,0 +1,176 @@
+import hashlib
+import json
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+# Recursos cujas respostas dependem de cada modelo: o produto exibe o nome da categoria e do fornecedor.
+DEPENDENCIAS = {
+    'Produto': ('produto',),
+    'Categoria': ('categoria', 'produto'),
+    'Fornecedor': ('fornecedor', 'produto'),
+    'Armazem': ('armazem',),
+}
+RECURSOS = ('produto', 'categoria', 'fornecedor', 'armazem')
+
+
+def cache_compartilhado(alias='default'):
+    """Se o que um processo grava no cache `alias` é visto pelos demais (não vale para memória local)."""
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
+
+
+def _cache():
+    return caches[getattr(settings, 'CACHE_RESPOSTAS_ALIAS', 'default')]
+
+
+def _versao(recurso):
+    """Versão atual das respostas do recurso. Uma versão ausente (expirada ou descartada) é recriada, invalidando tudo."""
+    cache = _cache()
+    chave = f'respostas:versao:{recurso}'
+    versao = cache.get(chave)
+    if versao is None:
+        cache.add(chave, time.time_ns(), None)
+        versao = cache.get(chave)
+    return versao
+
+
+def invalidar_respostas(*recursos):
+    # Após o commit, para que uma leitura concorrente não volte a guardar o estado anterior.
+    def invalidar():
+        _cache().set_many({f'respostas:versao:{recurso}': time.time_ns() for recurso in recursos}, None)
+    transaction.on_commit(invalidar)
+
+
+def invalidar_linhas(recurso, ids):
+    """Troca só a versão das linhas `ids` do recurso (ver RespostaEmCacheMixin.versao_por_linha), após o commit."""
+    ids = list(ids)
+    if not ids:
+        return
+
+    def invalidar():
+        versao = time.time_ns()
+        _cache().set_many({f'respostas:versao:{recurso}:{id_}': versao for id_ in ids}, None)
+    transaction.on_commit(invalidar)
+
+
+def _versoes_das_linhas(recurso, ids):
+    """{id: versão} das linhas; as ausentes são criadas (e uma versão perdida depois conta como alteração)."""
+    cache = _cache()
+    chaves = {f'respostas:versao:{recurso}:{id_}': id_ for id_ in ids}
+    versoes = cache.get_many(chaves)
+    ausentes = {chave: 0 for chave in chaves if chave not in versoes}
+    if ausentes:
+        cache.set_many(ausentes, None)
+        versoes.update(ausentes)
+    return {chaves[chave]: versao for chave, versao in versoes.items()}
+
+
+def _linhas_vigentes(recurso, versoes):
+    guardadas = _cache().get_many([f'respostas:versao:{recurso}:{id_}' for id_ in versoes])
+    return all(guardadas.get(f'respostas:versao:{recurso}:{id_}') == versao for id_, versao in versoes.items())
+
+
+def _ids_das_linhas(dados):
+    """Ids das linhas de uma resposta de list (paginada ou não) ou retrieve; None se alguma linha não trouxer o id."""
+    if isinstance(dados, dict) and isinstance(dados.get('results'), list):
+        linhas = dados['results']
+    elif isinstance(dados, list):
+        linhas = dados
+    else:
+        linhas = [dados]
+    if not all(isinstance(linha, dict) and 'id' in linha for linha in linhas):
+        return None
+    return [linha['id'] for linha in linhas]
+
+
+def _contar(recurso, evento):
+    cache = _cache()
+    chave = f'respostas:{evento}:{recurso}'
+    cache.add(chave, 0, None)
+    try:
+        cache.incr(chave)
+    except ValueError:
+        pass
+
+
+def estatisticas():
+    cache = _cache()
+    return {
+        recurso: {'acertos': cache.get(f'respostas:acertos:{recurso}', 0), 'falhas': cache.get(f'respostas:falhas:{recurso}', 0)}
+        for recurso in RECURSOS
+    }
+
+
+def _etag(dados):
+    conteudo = json.dumps(dados, cls=DjangoJSONEncoder, sort_keys=True).encode('utf-8')
+    return '"%s"' % hashlib.sha1(conteudo).hexdigest()
+
+
+class RespostaEmCacheMixin:
+    """
+    Read-through cache de list/retrieve para ViewSets de dados de referência.
+
+    A chave combina recurso, versão do recurso, host e caminho com a query string (filtros,
+    busca e paginação). Os sinais de core.signals trocam a versão quando um modelo muda.
+    As respostas levam ETag; If-None-Match com a mesma ETag devolve 304.
+
+    Com `versao_por_linha`, cada resposta guarda também a versão de cada linha, conferida
+    (numa leitura do cache) a cada acerto: invalidar_linhas descarta só as páginas que
+    contêm as linhas alteradas, sem trocar a versão do recurso inteiro. Filtros que dependem
+    desses dados (`parametros_sem_cache`) não passam pelo cache: a alteração de uma linha
+    pode fazê-la entrar numa página em que não estava.
+    """
+    recurso_cache = None
+    versao_por_linha = False
+    parametros_sem_cache = ()
+
+    def list(self, request, *args, **kwargs):
+        return self._resposta_em_cache(request, lambda: super(RespostaEmCacheMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._resposta_em_cache(request, lambda: super(RespostaEmCacheMixin, self).retrieve(request, *args, **kwargs))
+
+    def _resposta_em_cache(self, request, gerar):
+        if any(parametro in request.query_params for parametro in self.parametros_sem_cache):
+            return gerar()
+        cache = _cache()
+        endereco = hashlib.sha1(f'{request.get_host()}{request.get_full_path()}'.encode('utf-8')).hexdigest()
+        chave = f'respostas:{self.recurso_cache}:{_versao(self.recurso_cache)}:{endereco}'
+
+        guardado = cache.get(chave)
+        if guardado is not None and self.versao_por_linha and not _linhas_vigentes(self.recurso_cache, guardado[2]):
+            guardado = None
+        if guardado is None:
+            _contar(self.recurso_cache, 'falhas')
+            inicio = time.time_ns()
+            resposta = gerar()
+            if resposta.status_code != status.HTTP_200_OK:
+                return resposta
+            versoes = None
+            if self.versao_por_linha:
+                ids = _ids_das_linhas(resposta.data)
+                versoes = _versoes_das_linhas(self.recurso_cache, ids) if ids is not None else None
+                # Sem ids não há como acompanhar as linhas; alterada durante a leitura, a página pode já estar velha.
+                if versoes is None or any(versao > inicio for versao in versoes.values()):
+                    return resposta
+            guardado = (resposta.data, _etag(resposta.data), versoes)
+            cache.set(chave, guardado, getattr(settings, 'CACHE_RESPOSTAS_TIMEOUT', 300))
+            origem = 'MISS'
+        else:
+            _contar(self.recurso_cache, 'acertos')
+            origem = 'HIT'
+
+        dados, etag, _ = guardado
+        if etag in [valor.strip().removeprefix('W/') for valor in request.headers.get('If-None-Match', '').split(',')]:
+            resposta = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            resposta = Response(dados)
+        resposta['ETag'] = etag
+        resposta['X-Cache'] = origem
+        return resposta
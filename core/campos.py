@@ -0,0 +1,148 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+PARAMETRO_CAMPOS = 'fields'
+PARAMETRO_EXPANDIR = 'expand'
+
+
+def _lista(request, parametro):
+    valor = request.query_params.get(parametro)
+    if valor is None:
+        return None
+    return [nome.strip() for nome in valor.split(',') if nome.strip()]
+
+
+class CamposDinamicosMixin:
+    """
+    Serializer com campos esparsos: `campos` restringe os campos devolvidos e `expandir`
+    troca campos de relação (por padrão, só o id) pelo serializer de `expansoes`.
+
+    `dependencias` diz o que os campos sem `source` mapeável (ex.: SerializerMethodField)
+    leem do modelo, para que a view consiga restringir o SQL (campos_do_orm).
+    """
+    expansoes = {}
+    dependencias = {}
+
+    def __init__(self, *args, campos=None, expandir=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        desconhecidas = sorted(set(expandir or ()) - set(self.expansoes))
+        if desconhecidas:
+            disponiveis = ', '.join(self.expansoes) or 'nenhuma'
+            raise ValidationError({PARAMETRO_EXPANDIR: f"Expansão inválida: {', '.join(desconhecidas)}. Disponíveis: {disponiveis}."})
+        for nome in expandir or ():
+            self.fields[nome] = self.expansoes[nome](read_only=True)
+        if campos is not None:
+            legiveis = [nome for nome, campo in self.fields.items() if not campo.write_only]
+            desconhecidos = sorted(set(campos) - set(legiveis))
+            if desconhecidos:
+                raise ValidationError({PARAMETRO_CAMPOS: f"Campo(s) inválido(s): {', '.join(desconhecidos)}. Disponíveis: {', '.join(legiveis)}."})
+            for nome in set(legiveis) - set(campos) - set(expandir or ()):
+                self.fields.pop(nome)
+
+
+def campos_do_orm(serializer, modelo):
+    """
+    Caminhos do ORM que o serializer lê: (only, select_related, prefetch_related). Devolve
+    None quando algum campo não pode ser mapeado (propriedades, métodos sem `dependencias`).
+    """
+    only, juncoes, prefetches = {modelo._meta.pk.name}, set(), set()
+
+    def resolver(atributos, modelo, prefixo, inteiro):
+        for indice, atributo in enumerate(atributos):
+            try:
+                campo = modelo._meta.get_field(atributo)
+            except FieldDoesNotExist:
+                return False
+            caminho = prefixo + campo.name
+            ultimo = indice == len(atributos) - 1
+            if campo.one_to_many or campo.many_to_many or (campo.one_to_one and not campo.concrete):
+                prefetches.add(caminho.split('__')[0])
+                return True
+            if not campo.is_relation or (ultimo and not inteiro):
+                only.add(caminho)
+                return True
+            # Relação atravessada (ou lida inteira, como no StringRelatedField): junta com select_related.
+            juncoes.add(caminho)
+            modelo, prefixo = campo.related_model, caminho + '__'
+        # Objeto relacionado inteiro.
+        only.update(prefixo + campo.name for campo in modelo._meta.concrete_fields)
+        return True
+
+    def percorrer(serializer, modelo, prefixo):
+        for nome, campo in serializer.fields.items():
+            if campo.write_only:
+                continue
+            if nome in getattr(serializer, 'dependencias', {}):
+                for caminho in serializer.dependencias[nome]:
+                    if not resolver(caminho.split('__'), modelo, prefixo, False):
+                        return False
+                continue
+            if not campo.source_attrs:
+                return False
+            if isinstance(campo, serializers.Serializer):
+                if not resolver(campo.source_attrs, modelo, prefixo, False):
+                    return False
+                relacionado = modelo._meta.get_field(campo.source_attrs[0]).related_model
+                juncoes.add(prefixo + campo.source_attrs[0])
+                if not percorrer(campo, relacionado, prefixo + campo.source_attrs[0] + '__'):
+                    return False
+                continue
+            if isinstance(campo, serializers.ListSerializer):
+                if not resolver(campo.source_attrs, modelo, prefixo, False):
+                    return False
+                continue
+            pk_apenas = isinstance(campo, serializers.RelatedField) and campo.use_pk_only_optimization()
+            inteiro = isinstance(campo, serializers.RelatedField) and not pk_apenas
+            if not resolver(campo.source_attrs, modelo, prefixo, inteiro):
+                return False
+        return True
+
+    if not percorrer(serializer, modelo, ''):
+        return None
+    return sorted(only), sorted(juncoes), prefetches
+
+
+class CamposEsparsosMixin:
+    """
+    `?fields=a,b` e `?expand=relacao` nas ações de leitura. O queryset é reduzido ao que o
+    serializer vai ler: only() nas colunas, select_related só das relações usadas e apenas
+    os prefetches dos campos pedidos.
+    """
+    acoes_campos_esparsos = ('list', 'retrieve')
+    # Colunas lidas fora do serializer (ex.: o campo do cursor da paginação).
+    campos_sempre_lidos = ()
+
+    def _campos_esparsos(self):
+        # Views genéricas (sem ação) contam como listagem no GET.
+        acao = getattr(self, 'action', None) or ('list' if self.request.method == 'GET' else None)
+        if acao not in self.acoes_campos_esparsos:
+            return {}
+        return {'campos': _lista(self.request, PARAMETRO_CAMPOS), 'expandir': _lista(self.request, PARAMETRO_EXPANDIR)}
+
+    def get_serializer(self, *args, **kwargs):
+        for chave, valor in self._campos_esparsos().items():
+            kwargs.setdefault(chave, valor)
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        return super().filter_queryset(self.restringir_queryset(queryset))
+
+    def restringir_queryset(self, queryset):
+        opcoes = self._campos_esparsos()
+        if not opcoes:
+            return queryset
+        serializer = self.get_serializer_class()(context=self.get_serializer_context(), **opcoes)
+        caminhos = campos_do_orm(serializer, queryset.model)
+        if caminhos is None:
+            return queryset
+        only, juncoes, prefetches = caminhos
+        lookups = [
+            lookup for lookup in queryset._prefetch_related_lookups
+            if (lookup.prefetch_to if isinstance(lookup, Prefetch) else lookup).split('__')[0] in prefetches
+        ]
+        queryset = queryset.select_related(None).prefetch_related(None).prefetch_related(*lookups)
+        if juncoes:
+            queryset = queryset.select_related(*juncoes)
+        return queryset.only(*only, *self.campos_sempre_lidos)
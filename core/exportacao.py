@@ -0,0 +1,71 @@
+import csv
+import json
+from itertools import chain
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import ValidationError
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+TAMANHO_CHUNK = 2000
+LINHAS_POR_BLOCO = 500
+
+
+class _Eco:
+    """Pseudo-arquivo para o csv.writer: devolve a linha formatada em vez de gravá-la."""
+
+    def write(self, valor):
+        return valor
+
+
+def _gerar_csv(rotulos, linhas):
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(rotulos)
+    bloco = []
+    for linha in linhas:
+        bloco.append(escritor.writerow(linha))
+        if len(bloco) >= LINHAS_POR_BLOCO:
+            yield ''.join(bloco)
+            bloco = []
+    if bloco:
+        yield ''.join(bloco)
+
+
+def _gerar_ndjson(rotulos, linhas):
+    codificador = DjangoJSONEncoder(ensure_ascii=False)
+    bloco = []
+    for linha in linhas:
+        bloco.append(codificador.encode(dict(zip(rotulos, linha))) + '\n')
+        if len(bloco) >= LINHAS_POR_BLOCO:
+            yield ''.join(bloco)
+            bloco = []
+    if bloco:
+        yield ''.join(bloco)
+
+
+def exportar_queryset(request, queryset, colunas, nome_arquivo):
+    """
+    Exporta o queryset em streaming como CSV ou NDJSON (?formato=).
+
+    `colunas` é uma lista de pares (rótulo, campo do ORM). As linhas são lidas com
+    values_list(...).iterator(chunk_size=...), sem instanciar modelos nem manter o
+    resultado em memória, então o consumo de memória não depende do número de linhas.
+    `queryset` pode ser uma lista de querysets, exportados em sequência.
+    """
+    formato = request.query_params.get('formato', 'csv').lower()
+    if formato not in FORMATOS:
+        raise ValidationError({'formato': f"Formato inválido. Use um de: {', '.join(FORMATOS)}."})
+
+    rotulos = [rotulo for rotulo, _ in colunas]
+    querysets = queryset if isinstance(queryset, (list, tuple)) else [queryset]
+    linhas = chain.from_iterable(
+        parte.values_list(*[campo for _, campo in colunas]).iterator(chunk_size=TAMANHO_CHUNK) for parte in querysets
+    )
+    gerador = _gerar_csv(rotulos, linhas) if formato == 'csv' else _gerar_ndjson(rotulos, linhas)
+
+    resposta = StreamingHttpResponse(gerador, content_type=FORMATOS[formato])
+    resposta['Content-Disposition'] = f'attachment; filename="{nome_arquivo}.{formato}"'
+    return resposta
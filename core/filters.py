@@ -1,10 +1,35 @@
 import django_filters
-from .models import Produto
+from rest_framework.filters import SearchFilter
+from .busca import filtrar_produtos
+from .models import Produto, EstoqueItem
 
 class ProdutoFilter(django_filters.FilterSet):
     preco_maior_que = django_filters.NumberFilter(field_name="preco_venda", lookup_expr="gt")
     preco_menor_que = django_filters.NumberFilter(field_name="preco_venda", lookup_expr='lt')
+    em_estoque = django_filters.BooleanFilter(method='filtrar_em_estoque')
+    quantidade_min = django_filters.NumberFilter(field_name='estoque_total', lookup_expr='gte')
 
     class Meta:
         model = Produto
-        fields = ['categoria', 'fornecedor']
\ No newline at end of file
+        fields = ['categoria', 'fornecedor']
+
+    def filtrar_em_estoque(self, queryset, name, value):
+        # Filtra pelo total denormalizado (indexado), sem agregar EstoqueItem.
+        return queryset.filter(estoque_total__gt=0) if value else queryset.filter(estoque_total__lte=0)
+
+class BaixoEstoqueFilter(django_filters.FilterSet):
+    armazem = django_filters.NumberFilter(field_name='armazem_id')
+    categoria = django_filters.NumberFilter(field_name='produto__categoria_id')
+
+    class Meta:
+        model = EstoqueItem
+        fields = ['armazem', 'categoria']
+
+class BuscaProdutoFilter(SearchFilter):
+    """?search= pelo índice textual de produtos (core.busca), sem LIKE '%termo%' nos search_fields."""
+
+    def filter_queryset(self, request, queryset, view):
+        texto = request.query_params.get(self.search_param, '')
+        if not texto.strip():
+            return queryset
+        return filtrar_produtos(queryset, texto)
@@ -0,0 +1,191 @@
+import csv
+import io
+import json
+import time
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from .cache_respostas import invalidar_respostas
+from .indice_sku import invalidar_indice_sku
+from .metricas import registrar_reavaliacoes
+from .models import Categoria, EstoqueItem, Fornecedor, Produto
+
+FORMATOS_IMPORTACAO = ('csv', 'ndjson')
+TAMANHO_LOTE_IMPORTACAO = 2000
+LIMITE_ERROS = 1000
+CAMPOS_PRODUTO = ('nome', 'descricao', 'preco_custo', 'preco_venda', 'unidade_medida', 'estoque_minimo')
+_NAO_VALIDADOS = [campo.name for campo in Produto._meta.fields if campo.name not in CAMPOS_PRODUTO]
+
+
+class LinhaInvalida(Exception):
+    def __init__(self, erros):
+        super().__init__(erros)
+        self.erros = erros
+
+
+def ler_linhas(arquivo, formato):
+    """Lê um arquivo binário aos poucos, devolvendo (número da linha, registro). Registros ilegíveis vêm como None."""
+    if formato == 'csv':
+        texto = io.TextIOWrapper(arquivo, encoding='utf-8-sig', newline='')
+        yield from enumerate(csv.DictReader(texto), start=2)
+        return
+
+    texto = io.TextIOWrapper(arquivo, encoding='utf-8-sig')
+    for numero, conteudo in enumerate(texto, start=1):
+        if not conteudo.strip():
+            continue
+        try:
+            yield numero, json.loads(conteudo)
+        except ValueError:
+            yield numero, None
+
+
+class ImportadorCatalogo:
+    """
+    Importa produtos em lotes com upsert pelo SKU (bulk_create com update_conflicts).
+
+    Categorias (por nome) e fornecedores (por CNPJ ou nome fantasia) são resolvidos por
+    caches em memória carregados uma vez; categorias desconhecidas são criadas. Colunas
+    ausentes ou vazias não alteram o produto existente. Cada lote é gravado em sua própria
+    transação, com um número fixo de consultas, e os erros são reportados por linha.
+    """
+
+    def __init__(self, tamanho_lote=TAMANHO_LOTE_IMPORTACAO, ao_progredir=None):
+        self.tamanho_lote = tamanho_lote
+        self.ao_progredir = ao_progredir
+        self.categorias = dict(Categoria.objects.values_list('nome', 'id'))
+        self.fornecedores_por_cnpj = {}
+        self.fornecedores_por_nome = {}
+        for fornecedor_id, nome, cnpj in Fornecedor.objects.values_list('id', 'nome_fantasia', 'cnpj'):
+            if cnpj:
+                self.fornecedores_por_cnpj[cnpj] = fornecedor_id
+            # Nomes repetidos ficam ambíguos (None) e exigem o CNPJ.
+            self.fornecedores_por_nome[nome] = None if nome in self.fornecedores_por_nome else fornecedor_id
+        self.resumo = {'linhas': 0, 'criados': 0, 'atualizados': 0, 'erros': 0}
+        self.erros = []
+
+    def importar(self, linhas):
+        inicio = time.perf_counter()
+        pendentes = []
+        for numero, registro in linhas:
+            self.resumo['linhas'] += 1
+            try:
+                pendentes.append((numero, *self._preparar(registro)))
+            except LinhaInvalida as e:
+                self._registrar_erro(numero, registro, e.erros)
+            if len(pendentes) >= self.tamanho_lote:
+                self._gravar(pendentes)
+                pendentes = []
+                self._progresso(inicio)
+        if pendentes:
+            self._gravar(pendentes)
+        self._progresso(inicio)
+
+        duracao = time.perf_counter() - inicio
+        return {
+            **self.resumo,
+            'duracao_segundos': round(duracao, 3),
+            'linhas_por_segundo': round(self.resumo['linhas'] / duracao, 1) if duracao else None,
+            'detalhes_erros': self.erros,
+        }
+
+    def _progresso(self, inicio):
+        if self.ao_progredir:
+            self.ao_progredir(self.resumo, time.perf_counter() - inicio)
+
+    def _registrar_erro(self, numero, registro, erros):
+        self.resumo['erros'] += 1
+        if len(self.erros) < LIMITE_ERROS:
+            sku = registro.get('sku') if isinstance(registro, dict) else None
+            self.erros.append({'linha': numero, 'sku': sku, 'erros': erros})
+
+    def _preparar(self, registro):
+        if not isinstance(registro, dict):
+            raise LinhaInvalida({'linha': ['Registro ilegível.']})
+        valores = {}
+        for chave, valor in registro.items():
+            if chave is None:
+                continue
+            valor = valor.strip() if isinstance(valor, str) else valor
+            if valor not in (None, ''):
+                valores[chave.strip()] = valor
+
+        sku = str(valores.get('sku', ''))
+        if not sku:
+            raise LinhaInvalida({'sku': ['Este campo é obrigatório.']})
+
+        dados = {campo: valores[campo] for campo in CAMPOS_PRODUTO if campo in valores}
+        produto = Produto(sku=sku, **dados)
+        try:
+            produto.clean_fields(exclude=[campo for campo in _NAO_VALIDADOS if campo != 'sku'] + [campo for campo in CAMPOS_PRODUTO if campo not in dados])
+        except ValidationError as e:
+            raise LinhaInvalida(e.message_dict)
+        campos = list(dados)
+
+        if 'fornecedor_cnpj' in valores:
+            fornecedor_id = self.fornecedores_por_cnpj.get(str(valores['fornecedor_cnpj']))
+            if fornecedor_id is None:
+                raise LinhaInvalida({'fornecedor_cnpj': ['Fornecedor não encontrado.']})
+            produto.fornecedor_id = fornecedor_id
+            campos.append('fornecedor_id')
+        elif 'fornecedor' in valores:
+            fornecedor_id = self.fornecedores_por_nome.get(str(valores['fornecedor']))
+            if fornecedor_id is None:
+                mensagem = 'Fornecedor ambíguo; informe fornecedor_cnpj.' if str(valores['fornecedor']) in self.fornecedores_por_nome else 'Fornecedor não encontrado.'
+                raise LinhaInvalida({'fornecedor': [mensagem]})
+            produto.fornecedor_id = fornecedor_id
+            campos.append('fornecedor_id')
+
+        if 'categoria' in valores:
+            nome = str(valores['categoria'])
+            if nome not in self.categorias:
+                self.categorias[nome] = Categoria.objects.get_or_create(nome=nome)[0].id
+            produto.categoria_id = self.categorias[nome]
+            campos.append('categoria_id')
+
+        return produto, campos
+
+    def _gravar(self, pendentes):
+        # A última ocorrência de um SKU repetido no lote prevalece (o upsert não aceita a mesma chave duas vezes).
+        por_sku = {}
+        for numero, produto, campos in pendentes:
+            if produto.sku in por_sku:
+                self.resumo['atualizados'] += 1
+            por_sku[produto.sku] = (numero, produto, campos)
+
+        with transaction.atomic():
+            existentes = {
+                sku: (produto_id, estoque_minimo, preco_custo)
+                for sku, produto_id, estoque_minimo, preco_custo in Produto.objects.filter(sku__in=por_sku.keys()).values_list('sku', 'id', 'estoque_minimo', 'preco_custo')
+            }
+
+            por_campos = {}
+            for sku, (numero, produto, campos) in por_sku.items():
+                if sku not in existentes and 'nome' not in campos:
+                    self._registrar_erro(numero, {'sku': sku}, {'nome': ['Obrigatório para produtos novos.']})
+                    continue
+                por_campos.setdefault(tuple(sorted(campos)), []).append(produto)
+
+            for campos, produtos in por_campos.items():
+                Produto.objects.bulk_create(
+                    produtos, update_conflicts=True, unique_fields=['sku'], update_fields=[*campos, 'data_atualizaçao']
+                )
+                for produto in produtos:
+                    self.resumo['atualizados' if produto.sku in existentes else 'criados'] += 1
+
+            # bulk_create não dispara os sinais de Produto: replica aqui o que sincronizar_produto faria.
+            minimo_alterado, precos = [], {}
+            for sku, (produto_id, estoque_minimo, preco_custo) in existentes.items():
+                _, produto, campos = por_sku[sku]
+                if 'estoque_minimo' in campos and produto.estoque_minimo != estoque_minimo:
+                    minimo_alterado.append(produto_id)
+                if 'preco_custo' in campos:
+                    precos[produto_id] = (preco_custo, produto.preco_custo)
+            if minimo_alterado:
+                EstoqueItem.objects.filter(produto_id__in=minimo_alterado).update(abaixo_minimo=Exists(
+                    Produto.objects.filter(pk=OuterRef('produto_id'), estoque_minimo__gte=OuterRef('quantidade'))
+                ))
+            registrar_reavaliacoes(precos)
+            invalidar_respostas('produto')
+            # Os SKUs novos não estavam no índice (ausências não são guardadas): só os existentes mudaram.
+            invalidar_indice_sku(existentes)
@@ -0,0 +1,206 @@
+import logging
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+from .cache_respostas import cache_compartilhado
+from .models import Produto
+
+logger = logging.getLogger(__name__)
+
+CHAVE_GERACAO = 'indice_sku:geracao'
+# Alterações por SKU: um contador e uma chave com os SKUs de cada alteração, lidos pelos outros processos.
+CHAVE_SEQUENCIA = 'indice_sku:sequencia'
+CHAVE_ALTERACAO = 'indice_sku:alteracao:{}'
+VALIDADE_ALTERACOES = 24 * 60 * 60
+# Mais alterações que isso (numa gravação ou de atraso de um processo) descartam o mapa inteiro.
+MAXIMO_ALTERACOES = 1000
+# Uma alteração numerada que não aparece no cache depois disso é dada como perdida.
+ESPERA_ALTERACAO_SEGUNDOS = 5
+MAXIMO_SKUS_LOTE = 1000
+# id e preço (em centavos) num único int: preco_venda tem max_digits=10, então cabe em 34 bits.
+_BITS_PRECO = 34
+_MASCARA_PRECO = (1 << _BITS_PRECO) - 1
+
+
+def _compactar(produto_id, preco):
+    return produto_id << _BITS_PRECO | int(preco * 100)
+
+
+def _expandir(valor):
+    centavos = valor & _MASCARA_PRECO
+    return valor >> _BITS_PRECO, f'{centavos // 100}.{centavos % 100:02d}'
+
+
+def _geracao_atual():
+    geracao = cache.get(CHAVE_GERACAO)
+    if geracao is None:
+        cache.add(CHAVE_GERACAO, time.time_ns(), None)
+        geracao = cache.get(CHAVE_GERACAO)
+    return geracao
+
+
+def _sequencia_atual():
+    return cache.get(CHAVE_SEQUENCIA, 0)
+
+
+def invalidar_indice_sku(skus=None):
+    """
+    Após o commit, descarta do índice os `skus` alterados (o SKU anterior e o novo, quando
+    mudou), neste processo na hora e nos demais na próxima verificação. Sem `skus` (ou com
+    muitos), troca a geração: todos os processos descartam o mapa e o aquecem de novo.
+    """
+    skus = None if skus is None else sorted({sku for sku in skus if sku})
+    if skus == []:
+        return
+
+    def publicar():
+        if skus is None or len(skus) > MAXIMO_ALTERACOES:
+            cache.set(CHAVE_GERACAO, time.time_ns(), None)
+            indice_sku.descartar()
+            return
+        indice_sku.descartar(skus)
+        cache.add(CHAVE_SEQUENCIA, 0, None)
+        try:
+            numero = cache.incr(CHAVE_SEQUENCIA)
+        except ValueError:
+            # Contador perdido entre o add e o incr: os outros processos só percebem pela geração.
+            cache.set(CHAVE_GERACAO, time.time_ns(), None)
+            return
+        cache.set(CHAVE_ALTERACAO.format(numero), skus, VALIDADE_ALTERACOES)
+    transaction.on_commit(publicar)
+
+
+class IndiceSku:
+    """
+    Mapa SKU -> (id, preço de venda) na memória do processo, para os leitores de código de barras.
+
+    É aquecido com o catálogo inteiro na inicialização. As alterações de produto descartam só
+    os SKUs afetados; o processo confere a geração e as alterações publicadas no cache no
+    máximo a cada INDICE_SKU_VERIFICACAO_MS, e não a cada leitura. Uma troca de geração
+    (importação, dados sintéticos) descarta o mapa e o aquece de novo em segundo plano. SKUs
+    ausentes do mapa são buscados numa única consulta pelo índice único de `sku` e passam a
+    fazer parte dele.
+
+    Entre processos, a invalidação depende de um cache compartilhado (Redis etc.). Com cache
+    em memória local, o mapa é recarregado por inteiro a cada INDICE_SKU_RECARGA_SEGUNDOS,
+    o que limita a defasagem às alterações feitas em outros processos.
+    """
+
+    def __init__(self):
+        self._mapa = {}
+        self._geracao = None
+        self._sequencia = 0
+        self._proxima_verificacao = 0
+        self._aquecido_em = time.monotonic()
+        self._pendente_desde = None
+        self._verificando = threading.Lock()
+        self._aquecendo = threading.Lock()
+
+    def descartar(self, skus=None):
+        if skus is None:
+            # A próxima leitura já vê a geração nova e dispara o aquecimento.
+            self._mapa, self._geracao, self._proxima_verificacao = {}, None, 0
+            return
+        mapa = self._mapa
+        for sku in skus:
+            mapa.pop(sku, None)
+
+    def _validar(self):
+        agora = time.monotonic()
+        if agora >= self._proxima_verificacao and self._verificando.acquire(blocking=False):
+            try:
+                self._proxima_verificacao = agora + getattr(settings, 'INDICE_SKU_VERIFICACAO_MS', 1000) / 1000
+                self._verificar(agora)
+            finally:
+                self._verificando.release()
+        return self._mapa
+
+    def _verificar(self, agora):
+        geracao = _geracao_atual()
+        recarga = getattr(settings, 'INDICE_SKU_RECARGA_SEGUNDOS', 300)
+        if geracao != self._geracao:
+            self._mapa, self._geracao, self._sequencia = {}, geracao, _sequencia_atual()
+            aquecer_em_segundo_plano()
+            return
+        if not cache_compartilhado() and recarga and agora - self._aquecido_em >= recarga:
+            self._aquecido_em = agora
+            aquecer_em_segundo_plano()
+
+        sequencia = _sequencia_atual()
+        if sequencia <= self._sequencia:
+            return
+        if sequencia - self._sequencia > MAXIMO_ALTERACOES:
+            self._recomecar(sequencia)
+            return
+        numeros = range(self._sequencia + 1, sequencia + 1)
+        alteracoes = cache.get_many([CHAVE_ALTERACAO.format(numero) for numero in numeros])
+        for numero in numeros:
+            skus = alteracoes.get(CHAVE_ALTERACAO.format(numero))
+            if skus is None:
+                # Publicada entre o incr e o set: espera um pouco; se não aparecer, foi perdida.
+                self._pendente_desde = self._pendente_desde or agora
+                if agora - self._pendente_desde >= ESPERA_ALTERACAO_SEGUNDOS:
+                    self._recomecar(sequencia)
+                return
+            self.descartar(skus)
+            self._sequencia, self._pendente_desde = numero, None
+
+    def _recomecar(self, sequencia):
+        self._mapa, self._sequencia, self._pendente_desde = {}, sequencia, None
+        aquecer_em_segundo_plano()
+
+    def aquecer(self):
+        # Geração e sequência lidas antes do catálogo: o que mudar durante a leitura é descartado na próxima verificação.
+        geracao, sequencia = _geracao_atual(), _sequencia_atual()
+        mapa = {
+            sku: _compactar(produto_id, preco)
+            for sku, produto_id, preco in Produto.objects.values_list('sku', 'id', 'preco_venda').iterator(chunk_size=10000)
+        }
+        # Troca atômica de referência: leituras concorrentes veem o mapa antigo ou o novo, nunca um parcial.
+        self._mapa, self._geracao, self._sequencia = mapa, geracao, sequencia
+        self._aquecido_em = time.monotonic()
+        return len(mapa)
+
+    def buscar_varios(self, skus):
+        """Retorna {sku: (id, preco_venda)} para os SKUs encontrados, com no máximo uma consulta."""
+        mapa = self._validar()
+        encontrados, faltantes = {}, []
+        for sku in skus:
+            valor = mapa.get(sku)
+            if valor is None:
+                faltantes.append(sku)
+            else:
+                encontrados[sku] = _expandir(valor)
+
+        if faltantes:
+            for sku, produto_id, preco in Produto.objects.filter(sku__in=faltantes).values_list('sku', 'id', 'preco_venda'):
+                mapa[sku] = valor = _compactar(produto_id, preco)
+                encontrados[sku] = _expandir(valor)
+        return encontrados
+
+    def buscar(self, sku):
+        return self.buscar_varios([sku]).get(sku)
+
+
+indice_sku = IndiceSku()
+
+
+def aquecer_em_segundo_plano():
+    """Na inicialização (wsgi/asgi) e após uma troca de geração: aquece o índice sem atrasar as requisições."""
+    if not getattr(settings, 'INDICE_SKU_AQUECER', True) or not indice_sku._aquecendo.acquire(blocking=False):
+        return
+
+    def aquecer():
+        inicio = time.perf_counter()
+        try:
+            total = indice_sku.aquecer()
+            logger.info('Índice de SKU aquecido: %s produtos em %.2fs.', total, time.perf_counter() - inicio)
+        except DatabaseError:
+            logger.warning('Não foi possível aquecer o índice de SKU; as leituras usarão o banco.', exc_info=True)
+        finally:
+            indice_sku._aquecendo.release()
+            connection.close()
+
+    threading.Thread(target=aquecer, name='aquecer-indice-sku', daemon=True).start()
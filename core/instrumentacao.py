@@ -0,0 +1,299 @@
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+PREFIXO = 'gestao_estoque'
+FASES = ('total', 'autenticacao', 'permissao', 'banco', 'serializacao')
+LIMITES_DURACAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LIMITES_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histograma:
+    def __init__(self, limites):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)
+        self.soma = 0
+        self.total = 0
+
+    def observar(self, valor):
+        self.contagens[bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+
+class Medicao:
+    """
+    Tempos e consultas de uma requisição amostrada. Também é o execute_wrapper das conexões.
+
+    As fases de autenticação, permissão e serialização descontam o tempo de banco gasto
+    dentro delas, que fica todo na fase 'banco'.
+    """
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.endpoint = None
+        self.fases = dict.fromkeys(FASES, 0.0)
+        self.consultas = Counter()
+        self.monitorando = False
+        self._aberta = None
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.fases['banco'] += time.perf_counter() - inicio
+            self.consultas[sql] += 1
+
+    @contextmanager
+    def monitorar_consultas(self):
+        """Instala a medição nas conexões da thread atual."""
+        self.monitorando = True
+        with ExitStack() as pilha:
+            for conexao in connections.all():
+                pilha.enter_context(conexao.execute_wrapper(self))
+            yield
+
+    def abrir_fase(self, nome):
+        # Fases aninhadas (ex.: serializers dentro de serializers) contam uma vez só.
+        if self._aberta is not None:
+            return None
+        self._aberta = (nome, time.perf_counter(), self.fases['banco'])
+        return self._aberta
+
+    def fechar_fase(self, marca):
+        if marca is None or self._aberta is not marca:
+            return
+        nome, inicio, banco = marca
+        self.fases[nome] += (time.perf_counter() - inicio) - (self.fases['banco'] - banco)
+        self._aberta = None
+
+    @contextmanager
+    def fase(self, nome):
+        marca = self.abrir_fase(nome)
+        try:
+            yield
+        finally:
+            self.fechar_fase(marca)
+
+    def server_timing(self):
+        return ', '.join(f'{fase};dur={self.fases[fase] * 1000:.1f}' for fase in FASES)
+
+
+class Registro:
+    """Histogramas agregados por endpoint, em memória e por processo (cada worker expõe os seus)."""
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self.limpar()
+
+    def limpar(self):
+        with self._trava:
+            self.requisicoes = Counter()
+            self.duracoes = {}
+            self.consultas = {}
+            self.duplicadas = Counter()
+            self.suspeitas = Counter()
+
+    def registrar(self, endpoint, metodo, status, medicao):
+        repeticoes = [quantidade for quantidade in medicao.consultas.values() if quantidade > 1]
+        with self._trava:
+            self.requisicoes[(endpoint, metodo, str(status))] += 1
+            for fase in FASES:
+                self.duracoes.setdefault((endpoint, fase), Histograma(LIMITES_DURACAO)).observar(medicao.fases[fase])
+            self.consultas.setdefault(endpoint, Histograma(LIMITES_CONSULTAS)).observar(sum(medicao.consultas.values()))
+            self.duplicadas[endpoint] += sum(repeticoes) - len(repeticoes)
+
+        limiar = getattr(settings, 'INSTRUMENTACAO_LIMIAR_N_MAIS_1', 10)
+        sql, quantidade = max(medicao.consultas.items(), key=lambda item: item[1], default=('', 0))
+        if quantidade >= limiar:
+            with self._trava:
+                self.suspeitas[endpoint] += 1
+            logger.warning("Possível N+1 em %s: a mesma consulta rodou %d vezes: %s", endpoint, quantidade, sql[:300])
+
+    def exportar(self):
+        """Texto no formato de exposição do Prometheus (0.0.4)."""
+        linhas = []
+
+        def cabecalho(nome, tipo, ajuda):
+            linhas.append(f'# HELP {PREFIXO}_{nome} {ajuda}')
+            linhas.append(f'# TYPE {PREFIXO}_{nome} {tipo}')
+
+        def histograma(nome, rotulos, valor):
+            acumulado = 0
+            for limite, contagem in zip((*valor.limites, '+Inf'), valor.contagens):
+                acumulado += contagem
+                linhas.append(f'{PREFIXO}_{nome}_bucket{_rotulos(**rotulos, le=limite)} {acumulado}')
+            linhas.append(f'{PREFIXO}_{nome}_sum{_rotulos(**rotulos)} {valor.soma:.6f}')
+            linhas.append(f'{PREFIXO}_{nome}_count{_rotulos(**rotulos)} {valor.total}')
+
+        with self._trava:
+            cabecalho('amostragem_taxa', 'gauge', 'Fração das requisições instrumentadas.')
+            linhas.append(f"{PREFIXO}_amostragem_taxa {_taxa()}")
+
+            cabecalho('requisicoes_total', 'counter', 'Requisições amostradas por endpoint, método e status.')
+            for (endpoint, metodo, status), total in sorted(self.requisicoes.items()):
+                linhas.append(f'{PREFIXO}_requisicoes_total{_rotulos(endpoint=endpoint, metodo=metodo, status=status)} {total}')
+
+            cabecalho('fase_duracao_segundos', 'histogram', 'Duração das requisições amostradas por fase.')
+            for (endpoint, fase), valor in sorted(self.duracoes.items()):
+                histograma('fase_duracao_segundos', {'endpoint': endpoint, 'fase': fase}, valor)
+
+            cabecalho('consultas_por_requisicao', 'histogram', 'Consultas SQL por requisição amostrada.')
+            for endpoint, valor in sorted(self.consultas.items()):
+                histograma('consultas_por_requisicao', {'endpoint': endpoint}, valor)
+
+            cabecalho('consultas_duplicadas_total', 'counter', 'Execuções repetidas da mesma consulta SQL numa requisição.')
+            for endpoint, total in sorted(self.duplicadas.items()):
+                linhas.append(f'{PREFIXO}_consultas_duplicadas_total{_rotulos(endpoint=endpoint)} {total}')
+
+            cabecalho('suspeitas_n_mais_1_total', 'counter', 'Requisições com uma consulta repetida INSTRUMENTACAO_LIMIAR_N_MAIS_1 vezes ou mais.')
+            for endpoint, total in sorted(self.suspeitas.items()):
+                linhas.append(f'{PREFIXO}_suspeitas_n_mais_1_total{_rotulos(endpoint=endpoint)} {total}')
+        return '\n'.join(linhas) + '\n'
+
+
+def _rotulos(**rotulos):
+    valores = ','.join(
+        '{}="{}"'.format(nome, str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for nome, valor in rotulos.items()
+    )
+    return '{' + valores + '}'
+
+
+def _taxa():
+    return float(getattr(settings, 'INSTRUMENTACAO_AMOSTRAGEM', 0))
+
+
+registro = Registro()
+
+
+class InstrumentacaoMiddleware:
+    """
+    Instrumenta uma fração das requisições (INSTRUMENTACAO_AMOSTRAGEM, desligado por padrão):
+    conta e cronometra as consultas SQL de todas as conexões, soma as fases marcadas pelo
+    InstrumentacaoMixin e registra tudo em `registro`, exposto em /api/_metrics/. As
+    respostas amostradas levam o cabeçalho Server-Timing. Fora da amostra o custo é um
+    sorteio. Consultas feitas enquanto uma resposta em streaming é consumida não entram.
+
+    Sob ASGI o middleware é assíncrono, para não prender as views assíncronas (core.assincrono)
+    a uma thread. As consultas das views do DRF passam a ser medidas pelo InstrumentacaoMixin,
+    na thread da view; nas views assíncronas só entram o total e as fases marcadas, já que o
+    ORM assíncrono executa as consultas em outra thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._amostrar():
+            return self.get_response(request)
+
+        medicao = request._medicao = Medicao()
+        with medicao.monitorar_consultas():
+            resposta = self.get_response(request)
+        return self._registrar(request, medicao, resposta)
+
+    async def __acall__(self, request):
+        if not self._amostrar():
+            return await self.get_response(request)
+        medicao = request._medicao = Medicao()
+        return self._registrar(request, medicao, await self.get_response(request))
+
+    def _amostrar(self):
+        taxa = _taxa()
+        return bool(taxa) and random.random() < taxa
+
+    def _registrar(self, request, medicao, resposta):
+        medicao.fases['total'] = time.perf_counter() - medicao.inicio
+        endpoint = medicao.endpoint
+        if endpoint is None:
+            endpoint = request.resolver_match.view_name if request.resolver_match else 'nao_resolvido'
+        registro.registrar(endpoint, request.method, resposta.status_code, medicao)
+        resposta['Server-Timing'] = medicao.server_timing()
+        return resposta
+
+
+_SERIALIZERS_MEDIDOS = {}
+
+
+def _serializer_medido(classe):
+    medido = _SERIALIZERS_MEDIDOS.get(classe)
+    if medido is None:
+        def to_representation(self, instance):
+            medicao = getattr(self.context.get('request'), '_medicao', None)
+            if medicao is None:
+                return super(medido, self).to_representation(instance)
+            with medicao.fase('serializacao'):
+                return super(medido, self).to_representation(instance)
+
+        medido = _SERIALIZERS_MEDIDOS[classe] = type(classe.__name__, (classe,), {
+            'to_representation': to_representation, '__module__': classe.__module__,
+        })
+    return medido
+
+
+class InstrumentacaoMixin:
+    """
+    Marca, nas requisições amostradas pelo InstrumentacaoMiddleware, o endpoint
+    (classe.ação) e as fases de autenticação, permissão e serialização (to_representation
+    dos serializers de get_serializer mais a renderização da resposta).
+    """
+
+    def _medicao(self):
+        return getattr(getattr(self, 'request', None), '_medicao', None)
+
+    def dispatch(self, request, *args, **kwargs):
+        medicao = getattr(request, '_medicao', None)
+        if medicao is None or medicao.monitorando:
+            return super().dispatch(request, *args, **kwargs)
+        # Sob ASGI o middleware roda no event loop e as consultas da view acontecem nesta thread.
+        with medicao.monitorar_consultas():
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        medicao = self._medicao()
+        if medicao is not None:
+            medicao.endpoint = f"{type(self).__name__}.{getattr(self, 'action', None) or request.method.lower()}"
+        super().initial(request, *args, **kwargs)
+
+    def perform_authentication(self, request):
+        medicao = self._medicao()
+        if medicao is None:
+            return super().perform_authentication(request)
+        with medicao.fase('autenticacao'):
+            super().perform_authentication(request)
+
+    def check_permissions(self, request):
+        medicao = self._medicao()
+        if medicao is None:
+            return super().check_permissions(request)
+        with medicao.fase('permissao'):
+            super().check_permissions(request)
+
+    def get_serializer_class(self):
+        classe = super().get_serializer_class()
+        return classe if self._medicao() is None else _serializer_medido(classe)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        medicao = self._medicao()
+        if medicao is not None and hasattr(response, 'add_post_render_callback') and not response.is_rendered:
+            marca = medicao.abrir_fase('serializacao')
+            response.add_post_render_callback(lambda _: medicao.fechar_fase(marca))
+        return response
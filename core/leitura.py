@@ -0,0 +1,119 @@
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from .campos import PARAMETRO_EXPANDIR
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Campos cuja representação é o próprio valor lido do banco; os demais passam por to_representation.
+CAMPOS_DIRETOS = (
+    serializers.BooleanField, serializers.IntegerField, serializers.CharField,
+    serializers.ChoiceField, serializers.PrimaryKeyRelatedField, serializers.ReadOnlyField,
+)
+
+
+class Projecao:
+    """
+    Leitura de um serializer direto de values(), sem instanciar modelos nem percorrer os
+    campos linha a linha: as colunas e as conversões são resolvidas uma vez, a partir dos
+    campos do serializer (já restritos por ?fields=).
+
+    No serializer, `fontes_rapidas` mapeia campos sem `source` direto para um caminho do ORM
+    (ex.: StringRelatedField -> o campo usado no __str__) e `relacionados_rapidos` mapeia
+    campos de várias linhas para uma função ids -> {id: valor}, chamada uma vez por página.
+    """
+
+    def __init__(self, colunas, relacionados):
+        self.colunas = colunas
+        self.relacionados = relacionados
+
+    @classmethod
+    def criar(cls, serializer):
+        """Projeção do serializer, ou None se algum campo não puder ser lido de values()."""
+        fontes = getattr(serializer, 'fontes_rapidas', {})
+        funcoes = getattr(serializer, 'relacionados_rapidos', {})
+        colunas, relacionados = [], {}
+        for nome, campo in serializer.fields.items():
+            if campo.write_only:
+                continue
+            if nome in funcoes:
+                relacionados[nome] = funcoes[nome]
+                colunas.append((nome, None, None))
+                continue
+            if nome in fontes:
+                caminho = fontes[nome]
+            elif campo.source_attrs and not isinstance(campo, (serializers.BaseSerializer, serializers.SerializerMethodField)):
+                if isinstance(campo, serializers.RelatedField) and not campo.use_pk_only_optimization():
+                    return None
+                caminho = '__'.join(campo.source_attrs)
+            else:
+                return None
+            colunas.append((nome, caminho, None if isinstance(campo, CAMPOS_DIRETOS) else campo.to_representation))
+        return cls(colunas, relacionados)
+
+    def valores(self, queryset, *extras):
+        caminhos = dict.fromkeys(['id', *(caminho for _, caminho, _ in self.colunas if caminho is not None), *extras])
+        return queryset.prefetch_related(None).values(*caminhos)
+
+    def converter(self, linhas):
+        colunas = self.colunas
+        dados = [
+            {
+                nome: None if caminho is None or linha[caminho] is None else (conversor(linha[caminho]) if conversor else linha[caminho])
+                for nome, caminho, conversor in colunas
+            }
+            for linha in linhas
+        ]
+        if self.relacionados and linhas:
+            ids = [linha['id'] for linha in linhas]
+            for nome, funcao in self.relacionados.items():
+                valores = funcao(ids)
+                for id_, dado in zip(ids, dados):
+                    dado[nome] = valores[id_]
+        return dados
+
+
+class RenderizadorJSONRapido(JSONRenderer):
+    """JSONRenderer com orjson (quando instalado) para respostas sem indentação."""
+
+    _padrao = JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Datas ficam com o encoder do DRF (milissegundos, 'Z'), como nas demais respostas.
+        return orjson.dumps(data, default=self._padrao, option=orjson.OPT_PASSTHROUGH_DATETIME)
+
+
+class LeituraRapidaMixin:
+    """
+    Chave por ViewSet (`leitura_rapida`): a listagem passa a ser lida com Projecao e
+    renderizada com RenderizadorJSONRapido. Com ?expand= ou campos sem projeção, usa o
+    serializer normalmente.
+    """
+    leitura_rapida = False
+
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        if not self.leitura_rapida:
+            return renderers
+        return [RenderizadorJSONRapido() if type(renderer) is JSONRenderer else renderer for renderer in renderers]
+
+    def projecao(self, serializer=None):
+        if not self.leitura_rapida or self.request.query_params.get(PARAMETRO_EXPANDIR):
+            return None
+        return Projecao.criar(self.get_serializer() if serializer is None else serializer)
+
+    def list(self, request, *args, **kwargs):
+        projecao = self.projecao()
+        if projecao is None:
+            return super().list(request, *args, **kwargs)
+        queryset = projecao.valores(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(projecao.converter(list(queryset)))
+        return self.get_paginated_response(projecao.converter(page))
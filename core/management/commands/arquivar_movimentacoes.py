@@ -0,0 +1,44 @@
+from datetime import datetime
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from core.arquivamento import TAMANHO_LOTE_ARQUIVAMENTO, arquivar_movimentacoes, compactar_meses, inicio_do_mes, recompactar_mes, restaurar_mes
+
+
+class Command(BaseCommand):
+    help = (
+        'Move para o arquivo as movimentações fora da janela quente e compacta (resumo mensal + lote gzip) '
+        'os meses fora da janela detalhada. Rodar periodicamente, ex.: uma vez por dia.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses-quentes', type=int, default=getattr(settings, 'MOVIMENTACOES_MESES_QUENTES', 6))
+        parser.add_argument('--meses-detalhados', type=int, default=getattr(settings, 'MOVIMENTACOES_MESES_DETALHADOS', 24))
+        parser.add_argument('--tamanho-lote', type=int, default=TAMANHO_LOTE_ARQUIVAMENTO)
+        parser.add_argument('--restaurar', metavar='AAAA-MM', help='Descomprime um mês compactado de volta para o arquivo e sai. O mês fica fora da compactação periódica.')
+        parser.add_argument('--recompactar', metavar='AAAA-MM', help='Compacta de novo um mês restaurado e sai.')
+
+    def handle(self, *args, **options):
+        if options['restaurar']:
+            mes = self._mes(options['restaurar'], '--restaurar')
+            self.stdout.write(f"{restaurar_mes(mes)} movimentação(ões) restaurada(s) para o arquivo.")
+            return
+        if options['recompactar']:
+            total = recompactar_mes(self._mes(options['recompactar'], '--recompactar'))
+            if total is None:
+                raise CommandError(f"{options['recompactar']} não é um mês restaurado.")
+            self.stdout.write(f"{total} movimentação(ões) compactada(s).")
+            return
+
+        if options['meses_detalhados'] < options['meses_quentes']:
+            raise CommandError('--meses-detalhados não pode ser menor que --meses-quentes.')
+
+        arquivadas = arquivar_movimentacoes(inicio_do_mes(options['meses_quentes']), options['tamanho_lote'])
+        self.stdout.write(f"{arquivadas} movimentação(ões) arquivada(s).")
+        for mes, total in compactar_meses(inicio_do_mes(options['meses_detalhados'])):
+            self.stdout.write(f"{mes:%Y-%m}: {total} movimentação(ões) compactada(s).")
+
+    def _mes(self, valor, opcao):
+        try:
+            return datetime.strptime(valor, '%Y-%m').date()
+        except ValueError:
+            raise CommandError(f'Use {opcao} no formato AAAA-MM.')
@@ -0,0 +1,88 @@
+import json
+import random
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from core.alocacao import ESTRATEGIAS_ALOCACAO, alocar_saidas, planejar_alocacao
+from core.models import Armazem, EstoqueItem, Produto
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede o planejamento e a aplicação da alocação automática entre armazéns para pedidos '
+        'com muitas linhas. Os dados são criados numa transação desfeita ao final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--linhas', type=int, nargs='+', default=[100, 500])
+        parser.add_argument('--armazens', type=int, nargs='+', default=[12, 48])
+        parser.add_argument('--cobertura', type=float, default=0.3, help='Fração dos armazéns que estoca cada produto.')
+        parser.add_argument('--semente', type=int, default=42)
+
+    def handle(self, *args, **options):
+        aleatorio = random.Random(options['semente'])
+        resultados = []
+        try:
+            with transaction.atomic():
+                for armazens in options['armazens']:
+                    for linhas in options['linhas']:
+                        pedido = self._popular(aleatorio, f'{armazens}-{linhas}', linhas, armazens, options['cobertura'])
+                        for estrategia in ESTRATEGIAS_ALOCACAO:
+                            resultados.append({
+                                'linhas': linhas,
+                                'armazens': armazens,
+                                'estrategia': estrategia,
+                                **self._medir(pedido, estrategia),
+                            })
+                raise _Rollback
+        except _Rollback:
+            pass
+        self.stdout.write(json.dumps(resultados, indent=2))
+
+    def _popular(self, aleatorio, sufixo, linhas, armazens, cobertura):
+        armazem_ids = [
+            Armazem.objects.create(nome=f'Benchmark alocação {sufixo}-{i}', prioridade=aleatorio.randrange(10)).id
+            for i in range(armazens)
+        ]
+        Produto.objects.bulk_create(Produto(nome=f'Benchmark {i}', sku=f'BENCH-ALOC-{sufixo}-{i}') for i in range(linhas))
+        produto_ids = list(Produto.objects.filter(sku__startswith=f'BENCH-ALOC-{sufixo}-').values_list('id', flat=True))
+
+        pedido, itens = [], []
+        for produto_id in produto_ids:
+            quantidade = aleatorio.randint(1, 20)
+            escolhidos = aleatorio.sample(armazem_ids, max(1, round(armazens * cobertura)))
+            saldos = [aleatorio.randint(0, 15) for _ in escolhidos]
+            # Garante que o pedido é atendível somando os armazéns.
+            saldos[0] += max(0, quantidade - sum(saldos))
+            itens.extend(EstoqueItem(produto_id=produto_id, armazem_id=armazem_id, quantidade=saldo) for armazem_id, saldo in zip(escolhidos, saldos))
+            pedido.append((produto_id, quantidade))
+        EstoqueItem.objects.bulk_create(itens)
+        return pedido
+
+    def _medir(self, pedido, estrategia):
+        with CaptureQueriesContext(connection) as consultas:
+            inicio = time.perf_counter()
+            plano = planejar_alocacao(pedido, estrategia)
+            planejamento = time.perf_counter() - inicio
+        resultado = {
+            'armazens_usados': len(plano),
+            'planejamento_ms': round(planejamento * 1000, 2),
+            'planejamento_consultas': len(consultas),
+        }
+
+        try:
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as consultas:
+                    inicio = time.perf_counter()
+                    alocar_saidas(pedido, None, 'Benchmark', estrategia)
+                    resultado['aplicacao_ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+                resultado['aplicacao_consultas'] = len(consultas)
+                raise _Rollback
+        except _Rollback:
+            pass
+        return resultado
@@ -0,0 +1,247 @@
+import json
+import platform
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from core.autenticacao import ObterTokenSerializer
+from core.models import Armazem, EstoqueItem, MovimentacaoEstoque, PedidoCompra, PedidoVenda, Produto
+from core.sinteticos import MATERIAIS, PRODUTOS
+
+AMOSTRA_ITENS = 5000
+
+
+def _entrada(cliente, aleatorio, contexto):
+    produto_id, armazem_id = aleatorio.choice(contexto['itens'])
+    return cliente.post('/api/estoque/entrada/', {'produto_id': produto_id, 'armazem_id': armazem_id, 'quantidade': aleatorio.randint(1, 10)}, format='json')
+
+
+def _saida(cliente, aleatorio, contexto):
+    produto_id, armazem_id = aleatorio.choice(contexto['itens'])
+    return cliente.post('/api/estoque/saida/', {'produto_id': produto_id, 'armazem_id': armazem_id, 'quantidade': 1}, format='json')
+
+
+def _despachar_pedido(cliente, aleatorio, contexto):
+    pedido_id = contexto['proximo']('pedidos_pagos')
+    if pedido_id is None:
+        return None
+    return cliente.post(f'/api/pedidos/venda/{pedido_id}/despachar_pedido/', {}, format='json')
+
+
+def _receber_pedido(cliente, aleatorio, contexto):
+    pedido_id = contexto['proximo']('compras_aprovadas')
+    if pedido_id is None:
+        return None
+    return cliente.post(f'/api/pedidos/compra/{pedido_id}/receber_pedido/', {'armazem_id': aleatorio.choice(contexto['armazens'])}, format='json')
+
+
+def _dashboard(cliente, aleatorio, contexto):
+    return cliente.get('/api/dashboard/')
+
+
+def _baixo_estoque(cliente, aleatorio, contexto):
+    return cliente.get('/api/relatorios/baixo-estoque/', {'page': aleatorio.randint(1, contexto['paginas_baixo_estoque'])})
+
+
+def _produtos_lista(cliente, aleatorio, contexto):
+    return cliente.get('/api/produtos/', {'page': aleatorio.randint(1, contexto['paginas_produtos'])})
+
+
+def _produtos_busca(cliente, aleatorio, contexto):
+    termo = f'{aleatorio.choice(PRODUTOS)} {aleatorio.choice(MATERIAIS)}'
+    return cliente.get('/api/produtos/', {'search': termo})
+
+
+CENARIOS = {
+    'entrada': _entrada,
+    'saida': _saida,
+    'despachar_pedido': _despachar_pedido,
+    'receber_pedido': _receber_pedido,
+    'dashboard': _dashboard,
+    'baixo_estoque': _baixo_estoque,
+    'produtos_lista': _produtos_lista,
+    'produtos_busca': _produtos_busca,
+}
+CENARIOS_ESCRITA = ('entrada', 'saida', 'despachar_pedido', 'receber_pedido')
+
+
+def _percentil(valores, fracao):
+    return valores[min(len(valores) - 1, max(int(len(valores) * fracao + 0.5) - 1, 0))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark dos endpoints principais, em processo (APIClient com JWT) e com concorrência. Reporta vazão, '
+        'latência p50/p95/p99, consultas SQL por requisição e status em JSON, para comparar execuções (--comparar). '
+        'Os cenários de escrita alteram o banco: use um banco dedicado, populado com gerar_dados_sinteticos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cenarios', default=','.join(CENARIOS), help=f"Lista separada por vírgulas. Disponíveis: {', '.join(CENARIOS)}.")
+        parser.add_argument('--somente-leitura', action='store_true', help='Ignora os cenários de escrita.')
+        parser.add_argument('--requisicoes', type=int, default=200, help='Requisições medidas por cenário e nível de concorrência.')
+        parser.add_argument('--concorrencia', default='1,8', help='Níveis de concorrência (threads), separados por vírgulas.')
+        parser.add_argument('--aquecimento', type=int, default=5, help='Requisições descartadas antes de cada medição.')
+        parser.add_argument('--semente', type=int, default=42)
+        parser.add_argument('--saida', help='Grava o JSON também neste arquivo.')
+        parser.add_argument('--comparar', help='JSON de uma execução anterior: inclui a variação de p95 e vazão.')
+
+    def handle(self, *args, **options):
+        cenarios = [nome.strip() for nome in options['cenarios'].split(',') if nome.strip()]
+        desconhecidos = [nome for nome in cenarios if nome not in CENARIOS]
+        if desconhecidos:
+            raise CommandError(f"Cenário(s) desconhecido(s): {', '.join(desconhecidos)}.")
+        if options['somente_leitura']:
+            cenarios = [nome for nome in cenarios if nome not in CENARIOS_ESCRITA]
+        try:
+            niveis = [int(nivel) for nivel in options['concorrencia'].split(',')]
+        except ValueError:
+            raise CommandError('--concorrencia deve ser uma lista de inteiros.')
+
+        aleatorio = random.Random(options['semente'])
+        contexto = self._preparar(aleatorio)
+        if not contexto['itens'] and any(nome in ('entrada', 'saida') for nome in cenarios):
+            raise CommandError('Não há itens de estoque: rode gerar_dados_sinteticos antes.')
+
+        resultado = {
+            'parametros': {chave: options[chave] for chave in ('requisicoes', 'aquecimento', 'semente')} | {'concorrencia': niveis},
+            'ambiente': {'banco': connection.vendor, 'django': django.get_version(), 'python': platform.python_version()},
+            'dados': {
+                'produtos': Produto.objects.count(),
+                'armazens': Armazem.objects.count(),
+                'itens_estoque': EstoqueItem.objects.count(),
+                'movimentacoes': MovimentacaoEstoque.objects.count(),
+                'pedidos_venda': PedidoVenda.objects.count(),
+            },
+            'cenarios': {},
+        }
+        for nome in cenarios:
+            resultado['cenarios'][nome] = {}
+            for nivel in niveis:
+                self.stderr.write(f"{nome} com {nivel} thread(s)...")
+                resultado['cenarios'][nome][str(nivel)] = self._executar(CENARIOS[nome], nivel, options, contexto, aleatorio.randrange(2 ** 32))
+
+        if options['comparar']:
+            with open(options['comparar'], encoding='utf-8') as arquivo:
+                resultado['comparacao'] = self._comparar(json.load(arquivo), resultado)
+        texto = json.dumps(resultado, indent=2)
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+                arquivo.write(texto + '\n')
+        self.stdout.write(texto)
+
+    def _preparar(self, aleatorio):
+        usuario, criado = User.objects.get_or_create(username='benchmark', defaults={'is_staff': True, 'is_superuser': True})
+        if criado:
+            usuario.set_unusable_password()
+            usuario.save()
+        itens = list(EstoqueItem.objects.filter(quantidade__gte=50).order_by('id').values_list('produto_id', 'armazem_id')[:AMOSTRA_ITENS * 10])
+        pedidos_pagos = list(PedidoVenda.objects.filter(status='PAGO').order_by('id').values_list('id', flat=True))
+        compras_aprovadas = list(PedidoCompra.objects.filter(status='APROVADO').order_by('id').values_list('id', flat=True))
+        aleatorio.shuffle(pedidos_pagos)
+        aleatorio.shuffle(compras_aprovadas)
+        filas, trava = {'pedidos_pagos': pedidos_pagos, 'compras_aprovadas': compras_aprovadas}, threading.Lock()
+
+        def proximo(fila):
+            # Cada pedido só pode ser despachado/recebido uma vez: as threads consomem a mesma fila.
+            with trava:
+                return filas[fila].pop() if filas[fila] else None
+
+        return {
+            'token': str(ObterTokenSerializer.get_token(usuario).access_token),
+            'itens': aleatorio.sample(itens, min(len(itens), AMOSTRA_ITENS)),
+            'armazens': list(Armazem.objects.values_list('id', flat=True)),
+            'paginas_produtos': max(1, min(Produto.objects.count() // 50, 200)),
+            'paginas_baixo_estoque': max(1, min(EstoqueItem.objects.filter(abaixo_minimo=True).count() // 50, 200)),
+            'proximo': proximo,
+            'host': self._host(),
+        }
+
+    def _host(self):
+        # O APIClient usa 'testserver', que fora dos testes não está em ALLOWED_HOSTS.
+        hosts = [host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')]
+        return hosts[0] if hosts else 'localhost'
+
+    def _executar(self, cenario, nivel, options, contexto, semente):
+        restantes = {'aquecimento': options['aquecimento'] * nivel, 'medidas': options['requisicoes']}
+        latencias, consultas, status, trava = [], [], Counter(), threading.Lock()
+
+        def trabalhar(indice):
+            aleatorio = random.Random(semente + indice)
+            cliente = APIClient(SERVER_NAME=contexto['host'])
+            cliente.credentials(HTTP_AUTHORIZATION=f"Bearer {contexto['token']}")
+            try:
+                while True:
+                    with trava:
+                        if restantes['aquecimento']:
+                            restantes['aquecimento'] -= 1
+                            medir = False
+                        elif restantes['medidas']:
+                            restantes['medidas'] -= 1
+                            medir = True
+                        else:
+                            return
+                    with CaptureQueriesContext(connection) as capturadas:
+                        inicio = time.perf_counter()
+                        resposta = cenario(cliente, aleatorio, contexto)
+                        duracao = time.perf_counter() - inicio
+                    if not medir:
+                        continue
+                    with trava:
+                        if resposta is None:
+                            status['sem_dados'] += 1
+                            continue
+                        status[str(resposta.status_code)] += 1
+                        latencias.append(duracao * 1000)
+                        consultas.append(len(capturadas))
+            finally:
+                if nivel > 1:
+                    connection.close()
+
+        inicio = time.perf_counter()
+        if nivel == 1:
+            trabalhar(0)
+        else:
+            threads = [threading.Thread(target=trabalhar, args=(indice,)) for indice in range(nivel)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        duracao = time.perf_counter() - inicio
+
+        latencias.sort()
+        medida = {'requisicoes': len(latencias), 'status': dict(sorted(status.items()))}
+        if latencias:
+            medida.update({
+                'vazao_rps': round(len(latencias) / duracao, 1),
+                'latencia_ms': {
+                    'p50': round(statistics.median(latencias), 2),
+                    'p95': round(_percentil(latencias, 0.95), 2),
+                    'p99': round(_percentil(latencias, 0.99), 2),
+                    'max': round(latencias[-1], 2),
+                },
+                'consultas': {'media': round(statistics.mean(consultas), 1), 'max': max(consultas)},
+            })
+        return medida
+
+    def _comparar(self, anterior, atual):
+        comparacao = {}
+        for nome, niveis in atual['cenarios'].items():
+            for nivel, medida in niveis.items():
+                base = anterior.get('cenarios', {}).get(nome, {}).get(nivel)
+                if not base or 'latencia_ms' not in base or 'latencia_ms' not in medida:
+                    continue
+                comparacao.setdefault(nome, {})[nivel] = {
+                    'p95_variacao_pct': round((medida['latencia_ms']['p95'] / base['latencia_ms']['p95'] - 1) * 100, 1),
+                    'vazao_variacao_pct': round((medida['vazao_rps'] / base['vazao_rps'] - 1) * 100, 1),
+                    'consultas_media': [base['consultas']['media'], medida['consultas']['media']],
+                }
+        return comparacao
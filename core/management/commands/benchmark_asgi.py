@@ -0,0 +1,202 @@
+import asyncio
+import io
+import json
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from core.autenticacao import ObterTokenSerializer
+from core.models import EstoqueItem
+
+# Cenário: (URL servida pelo deploy WSGI, com as views do DRF; URL servida pelo deploy ASGI, com as views assíncronas).
+CENARIOS = {
+    'disponibilidade': ('/api/estoque/', '/api/async/estoque/disponibilidade/'),
+    'baixo_estoque': ('/api/relatorios/baixo-estoque/', '/api/async/relatorios/baixo-estoque/'),
+    'dashboard': ('/api/dashboard/', '/api/async/dashboard/'),
+}
+
+
+def _percentil(valores, fracao):
+    return valores[min(len(valores) - 1, max(int(len(valores) * fracao + 0.5) - 1, 0))]
+
+
+class _PicoDeThreads:
+    """Pico de threads criadas durante a medição (sem contar as threads clientes e a própria amostragem)."""
+
+    def __init__(self):
+        self._base = self._contar()
+        self.pico = 0
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._amostrar, name='benchmark-amostragem', daemon=True)
+
+    @staticmethod
+    def _contar():
+        return sum(1 for thread in threading.enumerate() if not thread.name.startswith('benchmark-'))
+
+    def _amostrar(self):
+        while not self._parar.wait(0.005):
+            self.pico = max(self.pico, self._contar() - self._base)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._parar.set()
+        self._thread.join()
+
+
+class Command(BaseCommand):
+    help = (
+        'Teste de carga em processo das leituras de estoque (disponibilidade, baixo estoque, dashboard): o '
+        'handler WSGI com um pool de N threads (como gunicorn --threads) servindo as views do DRF contra o '
+        'handler ASGI servindo as views assíncronas, com C conexões simultâneas. Reporta vazão, latência '
+        '(incluindo a espera por uma thread livre no WSGI) e o pico de threads. Usa os dados do banco '
+        '(gerar_dados_sinteticos) e não os altera.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cenarios', default=','.join(CENARIOS), help=f"Disponíveis: {', '.join(CENARIOS)}.")
+        parser.add_argument('--conexoes', default='10,100,500', help='Conexões simultâneas, separadas por vírgulas.')
+        parser.add_argument('--requisicoes', type=int, default=5, help='Requisições sequenciais por conexão.')
+        parser.add_argument('--threads-wsgi', type=int, default=8, help='Threads do servidor WSGI simulado.')
+        parser.add_argument('--semente', type=int, default=42)
+
+    def handle(self, *args, **options):
+        cenarios = [nome.strip() for nome in options['cenarios'].split(',') if nome.strip()]
+        desconhecidos = [nome for nome in cenarios if nome not in CENARIOS]
+        if desconhecidos:
+            raise CommandError(f"Cenário(s) desconhecido(s): {', '.join(desconhecidos)}.")
+        try:
+            niveis = [int(nivel) for nivel in options['conexoes'].split(',')]
+        except ValueError:
+            raise CommandError('--conexoes deve ser uma lista de inteiros.')
+        produtos = list(EstoqueItem.objects.order_by().values_list('produto_id', flat=True).distinct()[:10_000])
+        if not produtos:
+            raise CommandError('Não há itens de estoque: rode gerar_dados_sinteticos antes.')
+
+        usuario, criado = User.objects.get_or_create(username='benchmark', defaults={'is_staff': True, 'is_superuser': True})
+        if criado:
+            usuario.set_unusable_password()
+            usuario.save()
+        hosts = [host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')]
+        contexto = {
+            'host': hosts[0] if hosts else 'localhost',
+            'token': str(ObterTokenSerializer.get_token(usuario).access_token),
+            'produtos': produtos,
+        }
+        wsgi, asgi = get_wsgi_application(), get_asgi_application()
+
+        resultado = {'parametros': {'requisicoes': options['requisicoes'], 'threads_wsgi': options['threads_wsgi'], 'conexoes': niveis}, 'cenarios': {}}
+        for nome in cenarios:
+            url_wsgi, url_asgi = CENARIOS[nome]
+            for nivel in niveis:
+                self.stderr.write(f'{nome} com {nivel} conexões...')
+                aleatorio = random.Random(options['semente'])
+                consultas = [self._consulta(nome, aleatorio, contexto) for _ in range(nivel * options['requisicoes'])]
+                resultado['cenarios'].setdefault(nome, {})[str(nivel)] = {
+                    'wsgi': self._medir_wsgi(wsgi, url_wsgi, consultas, nivel, options, contexto),
+                    'asgi': self._medir_asgi(asgi, url_asgi, consultas, nivel, options, contexto),
+                }
+        self.stdout.write(json.dumps(resultado, indent=2))
+
+    def _consulta(self, nome, aleatorio, contexto):
+        if nome == 'disponibilidade':
+            return f"produto={aleatorio.choice(contexto['produtos'])}"
+        if nome == 'baixo_estoque':
+            return f'page={aleatorio.randint(1, 3)}'
+        return ''
+
+    def _resumo(self, latencias, status, duracao, threads):
+        latencias.sort()
+        return {
+            'vazao_rps': round(len(latencias) / duracao, 1),
+            'latencia_ms': {
+                'p50': round(statistics.median(latencias), 1),
+                'p95': round(_percentil(latencias, 0.95), 1),
+                'max': round(latencias[-1], 1),
+            },
+            'status': dict(sorted(status.items())),
+            'threads_servidor': threads,
+        }
+
+    def _medir_wsgi(self, aplicacao, url, consultas, nivel, options, contexto):
+        # Cada conexão é uma thread cliente; só `threads_wsgi` requisições são atendidas por vez.
+        vagas, trava = threading.Semaphore(options['threads_wsgi']), threading.Lock()
+        latencias, status = [], Counter()
+
+        def conexao(indice):
+            for consulta in consultas[indice::nivel]:
+                ambiente = {
+                    'REQUEST_METHOD': 'GET', 'PATH_INFO': url, 'QUERY_STRING': consulta, 'SERVER_NAME': contexto['host'],
+                    'SERVER_PORT': '80', 'HTTP_HOST': contexto['host'], 'HTTP_AUTHORIZATION': f"Bearer {contexto['token']}",
+                    'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(), 'wsgi.errors': io.StringIO(),
+                }
+                codigo = []
+                inicio = time.perf_counter()
+                with vagas:
+                    corpo = aplicacao(ambiente, lambda linha, cabecalhos, exc_info=None: codigo.append(linha.split()[0]))
+                    b''.join(corpo)
+                    corpo.close()
+                with trava:
+                    latencias.append((time.perf_counter() - inicio) * 1000)
+                    status[codigo[0]] += 1
+
+        inicio = time.perf_counter()
+        clientes = [threading.Thread(target=conexao, args=(indice,), name=f'benchmark-cliente-{indice}') for indice in range(nivel)]
+        for cliente in clientes:
+            cliente.start()
+        for cliente in clientes:
+            cliente.join()
+        duracao = time.perf_counter() - inicio
+        # As threads clientes fazem o papel das conexões de rede; quem atende é o pool de `threads_wsgi`.
+        return self._resumo(latencias, status, duracao, min(options['threads_wsgi'], nivel))
+
+    def _medir_asgi(self, aplicacao, url, consultas, nivel, options, contexto):
+        latencias, status = [], Counter()
+
+        async def requisitar(consulta):
+            recebido, respondido = False, asyncio.Event()
+
+            async def receive():
+                nonlocal recebido
+                if not recebido:
+                    recebido = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                await respondido.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(mensagem):
+                if mensagem['type'] == 'http.response.start':
+                    status[str(mensagem['status'])] += 1
+                elif mensagem['type'] == 'http.response.body' and not mensagem.get('more_body'):
+                    respondido.set()
+
+            await aplicacao({
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+                'path': url, 'raw_path': url.encode(), 'query_string': consulta.encode(), 'root_path': '',
+                'headers': [(b'host', contexto['host'].encode()), (b'authorization', f"Bearer {contexto['token']}".encode())],
+                'server': (contexto['host'], 80), 'client': ('127.0.0.1', 0),
+            }, receive, send)
+
+        async def conexao(indice):
+            for consulta in consultas[indice::nivel]:
+                inicio = time.perf_counter()
+                await requisitar(consulta)
+                latencias.append((time.perf_counter() - inicio) * 1000)
+
+        async def principal():
+            await asyncio.gather(*(conexao(indice) for indice in range(nivel)))
+
+        # O event loop é uma thread só; as demais são do ORM (sync_to_async), uma por requisição em andamento.
+        with _PicoDeThreads() as pico:
+            inicio = time.perf_counter()
+            asyncio.run(principal())
+            duracao = time.perf_counter() - inicio
+        return self._resumo(latencias, status, duracao, 1 + pico.pico)
@@ -0,0 +1,60 @@
+import json
+import time
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from core.autenticacao import ObterTokenSerializer
+from core.permissions import invalidar_papeis
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Mede requisições/s e consultas por requisição em um endpoint protegido por IsGerente: sem cache de papéis, com cache e com token sem estado.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requisicoes', type=int, default=500)
+        parser.add_argument('--url', default='/api/dashboard/')
+
+    def handle(self, *args, **options):
+        resultados = {}
+        try:
+            with transaction.atomic():
+                usuario = User.objects.create_user('benchmark-autorizacao', password='benchmark')
+                usuario.groups.add(Group.objects.get_or_create(name='Gerentes')[0])
+                cliente = APIClient(HTTP_HOST='localhost')
+                cliente.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(usuario)}')
+
+                # "Sem cache" invalida os papéis antes de cada requisição, reproduzindo a consulta de grupos por chamada.
+                resultados['sem_cache'] = self._medir(cliente, options, lambda: invalidar_papeis([usuario.pk]))
+                resultados['com_cache'] = self._medir(cliente, options, lambda: None)
+
+                # Token com claims: o usuário é montado do próprio JWT, sem consultar o banco.
+                cliente.credentials(HTTP_AUTHORIZATION=f'Bearer {ObterTokenSerializer.get_token(usuario).access_token}')
+                resultados['sem_estado'] = self._medir(cliente, options, lambda: None)
+                raise _Rollback
+        except _Rollback:
+            pass
+        invalidar_papeis([usuario.pk])
+        self.stdout.write(json.dumps(resultados, indent=2))
+
+    def _medir(self, cliente, options, antes_de_cada):
+        total = options['requisicoes']
+        cliente.get(options['url'])
+        with CaptureQueriesContext(connection) as consultas:
+            inicio = time.perf_counter()
+            for _ in range(total):
+                antes_de_cada()
+                resposta = cliente.get(options['url'])
+            decorrido = time.perf_counter() - inicio
+        if resposta.status_code != 200:
+            self.stderr.write(f'Resposta inesperada: {resposta.status_code}')
+        return {
+            'requisicoes_por_segundo': round(total / decorrido, 1),
+            'consultas_por_requisicao': round(len(consultas) / total, 2),
+        }
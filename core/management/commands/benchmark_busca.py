@@ -0,0 +1,99 @@
+import json
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from core.busca import LIMITE_SUGESTOES, filtrar_produtos, sugerir_produtos
+from core.models import Produto
+
+PALAVRAS = (
+    'cadeira', 'mesa', 'parafuso', 'martelo', 'cabo', 'tomada', 'lampada', 'furadeira', 'serra', 'chave',
+    'fenda', 'philips', 'azul', 'preto', 'branco', 'inox', 'aco', 'madeira', 'plastico', 'ergonomica',
+    'escritorio', 'industrial', 'eletrica', 'hidraulica', 'torneira', 'registro', 'tubo', 'conexao', 'luva', 'joelho',
+    'broca', 'disco', 'corte', 'lixa', 'tinta', 'pincel', 'rolo', 'fita', 'isolante', 'adesivo',
+)
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede a latência (p50/p95/p99) do autocompletar de produtos num catálogo sintético, '
+        'comparando com a busca por icontains. Os dados são criados numa transação desfeita ao final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--produtos', type=int, default=1_000_000)
+        parser.add_argument('--consultas', type=int, default=500)
+        parser.add_argument('--consultas-icontains', type=int, default=20, help='A busca antiga é lenta; use uma amostra menor.')
+        parser.add_argument('--semente', type=int, default=42)
+
+    def handle(self, *args, **options):
+        aleatorio = random.Random(options['semente'])
+        try:
+            with transaction.atomic():
+                inicio = time.perf_counter()
+                for lote in range(0, options['produtos'], 10_000):
+                    Produto.objects.bulk_create([
+                        Produto(
+                            nome=' '.join(aleatorio.sample(PALAVRAS, 3)).capitalize(),
+                            sku=f'BENCH-BUSCA-{i:07d}',
+                            descricao=' '.join(aleatorio.choices(PALAVRAS, k=8)),
+                        )
+                        for i in range(lote, min(lote + 10_000, options['produtos']))
+                    ])
+                self.stderr.write(f"{options['produtos']} produtos criados e indexados em {time.perf_counter() - inicio:.1f}s.")
+
+                consultas = [self._consulta(aleatorio, options['produtos']) for _ in range(options['consultas'])]
+                resultado = {
+                    'produtos': options['produtos'],
+                    'banco': connection.vendor,
+                    'indice': self._medir(lambda texto: sugerir_produtos(texto), consultas),
+                    'icontains': self._medir(self._icontains, consultas[:options['consultas_icontains']]),
+                }
+                if connection.vendor == 'postgresql':
+                    with connection.cursor() as cursor:
+                        cursor.execute('ANALYZE core_produto')
+                    # Nenhum dos dois pode ter Seq Scan em core_produto: texto pelo GIN, prefixo de SKU por produto_sku_prefixo.
+                    resultado['planos'] = {
+                        'texto': filtrar_produtos(Produto.objects.all(), 'cadeira ergo').explain().splitlines(),
+                        'prefixo_sku': filtrar_produtos(Produto.objects.all(), 'BENCH-BUSCA-00012').explain().splitlines(),
+                    }
+                raise _Rollback
+        except _Rollback:
+            pass
+        self.stdout.write(json.dumps(resultado, indent=2))
+
+    def _consulta(self, aleatorio, produtos):
+        # Mistura do que chega do PDV: prefixos de uma ou duas palavras e prefixos de SKU.
+        tipo = aleatorio.random()
+        if tipo < 0.4:
+            return aleatorio.choice(PALAVRAS)[:aleatorio.randint(2, 6)]
+        if tipo < 0.8:
+            primeira, segunda = aleatorio.sample(PALAVRAS, 2)
+            return f'{primeira} {segunda[:aleatorio.randint(2, 5)]}'
+        return f'BENCH-BUSCA-{aleatorio.randrange(produtos):07d}'[:aleatorio.randint(14, 19)]
+
+    def _icontains(self, texto):
+        filtro = Q()
+        for termo in texto.split():
+            filtro &= Q(nome__icontains=termo) | Q(sku__icontains=termo) | Q(descricao__icontains=termo) | Q(categoria__nome__icontains=termo)
+        return list(Produto.objects.filter(filtro).values('id', 'sku', 'nome')[:LIMITE_SUGESTOES])
+
+    def _medir(self, buscar, consultas):
+        tempos = []
+        for texto in consultas:
+            inicio = time.perf_counter()
+            buscar(texto)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        tempos.sort()
+        return {
+            'consultas': len(tempos),
+            'p50_ms': round(statistics.median(tempos), 2),
+            'p95_ms': round(tempos[max(0, int(len(tempos) * 0.95) - 1)], 2),
+            'p99_ms': round(tempos[max(0, int(len(tempos) * 0.99) - 1)], 2),
+        }
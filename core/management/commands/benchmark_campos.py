@@ -0,0 +1,108 @@
+import json
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from core.models import Armazem, Categoria, Cliente, EstoqueItem, Fornecedor, Produto
+from core.views import ClienteViewSet, EstoqueViewSet, ProdutoViewSet
+
+
+class _Rollback(Exception):
+    pass
+
+
+class _EstoqueItemAninhado(serializers.ModelSerializer):
+    # Representação anterior de /api/estoque/: produto e armazém inteiros.
+    class Meta:
+        model = EstoqueItem
+        fields = '__all__'
+        depth = 1
+
+
+CENARIOS = [
+    ('estoque', 'aninhado (anterior)', EstoqueViewSet, None),
+    ('estoque', 'padrao', EstoqueViewSet, ''),
+    ('estoque', 'expand=produto,armazem', EstoqueViewSet, 'expand=produto,armazem'),
+    ('estoque', 'fields=produto,quantidade', EstoqueViewSet, 'fields=produto,quantidade'),
+    ('produtos', 'padrao', ProdutoViewSet, ''),
+    ('produtos', 'fields=id,sku,preco_venda', ProdutoViewSet, 'fields=id,sku,preco_venda'),
+    ('clientes', 'padrao', ClienteViewSet, ''),
+    ('clientes', 'fields=id,nome', ClienteViewSet, 'fields=id,nome'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede tamanho do JSON, tempo de consulta e de serialização de uma página de /api/estoque/, /api/produtos/ '
+        'e /api/clientes/ com e sem ?fields=/?expand=, e da representação aninhada anterior do estoque. '
+        'Dados numa transação desfeita ao final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--produtos', type=int, default=5000)
+        parser.add_argument('--armazens', type=int, default=4)
+        parser.add_argument('--pagina', type=int, default=500, help='Linhas serializadas por medição.')
+        parser.add_argument('--repeticoes', type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._popular(options)
+                resultado = {'pagina': options['pagina'], 'cenarios': {}}
+                for recurso, nome, classe, parametros in CENARIOS:
+                    medida = self._medir(classe, parametros, options)
+                    resultado['cenarios'].setdefault(recurso, {})[nome] = medida
+                raise _Rollback
+        except _Rollback:
+            pass
+        self.stdout.write(json.dumps(resultado, indent=2))
+
+    def _popular(self, options):
+        categoria = Categoria.objects.create(nome='Benchmark campos')
+        fornecedor = Fornecedor.objects.create(nome_fantasia='Benchmark campos')
+        armazens = Armazem.objects.bulk_create([
+            Armazem(nome=f'Benchmark campos {i}', localizacao=f'Rua do Benchmark, {i}') for i in range(options['armazens'])
+        ])
+        produtos = Produto.objects.bulk_create([
+            Produto(
+                nome=f'Produto {i}', sku=f'BENCH-CAMPOS-{i:07d}', descricao='Descrição longa do produto. ' * 8,
+                categoria=categoria, fornecedor=fornecedor, preco_custo=10, preco_venda=15,
+            )
+            for i in range(options['produtos'])
+        ], batch_size=5000)
+        EstoqueItem.objects.bulk_create([
+            EstoqueItem(produto=produto, armazem=armazem, quantidade=100) for produto in produtos for armazem in armazens
+        ], batch_size=5000)
+        Cliente.objects.bulk_create([
+            Cliente(nome=f'Cliente {i}', email=f'benchmark-campos-{i}@example.com', telefone='(11) 99999-0000')
+            for i in range(options['pagina'])
+        ])
+
+    def _medir(self, classe, parametros, options):
+        consultas, serializacoes, tamanho = [], [], 0
+        for _ in range(options['repeticoes']):
+            view = classe(action='list', request=Request(APIRequestFactory().get(f"/?{parametros or ''}")), format_kwarg=None, kwargs={})
+
+            inicio = time.perf_counter()
+            if parametros is None:
+                linhas = list(EstoqueItem.objects.select_related('produto', 'armazem').order_by('id')[:options['pagina']])
+            else:
+                linhas = list(view.filter_queryset(view.get_queryset())[:options['pagina']])
+            meio = time.perf_counter()
+            serializer = _EstoqueItemAninhado(linhas, many=True) if parametros is None else view.get_serializer(linhas, many=True)
+            conteudo = JSONRenderer().render(serializer.data)
+            fim = time.perf_counter()
+
+            consultas.append((meio - inicio) * 1000)
+            serializacoes.append((fim - meio) * 1000)
+            tamanho = len(conteudo)
+        return {
+            'bytes': tamanho,
+            'bytes_por_linha': round(tamanho / options['pagina']),
+            'consulta_ms': round(statistics.median(consultas), 2),
+            'serializacao_ms': round(statistics.median(serializacoes), 2),
+        }
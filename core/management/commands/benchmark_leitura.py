@@ -0,0 +1,78 @@
+import json
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from core.leitura import Projecao, RenderizadorJSONRapido, orjson
+from core.models import Armazem, Categoria, EstoqueItem, Fornecedor, MovimentacaoEstoque, Produto
+from core.serializers import EstoqueItemSerializer, MovimentacaoEstoqueSerializer, ProdutoSerializer
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara o caminho normal (modelos + ModelSerializer + JSONRenderer) com a leitura rápida '
+        '(values() + Projecao + orjson) em páginas de estoque, produtos e histórico de movimentações, '
+        'em linhas por segundo. Dados numa transação desfeita ao final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--produtos', type=int, default=5000)
+        parser.add_argument('--armazens', type=int, default=4)
+        parser.add_argument('--linhas', type=int, default=5000, help='Linhas por página medida.')
+        parser.add_argument('--repeticoes', type=int, default=10)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                produto_historico = self._popular(options)
+                limite = options['linhas']
+                cenarios = {
+                    'estoque': (EstoqueItemSerializer, EstoqueItem.objects.order_by('id')),
+                    'produtos': (ProdutoSerializer, Produto.objects.select_related('categoria', 'fornecedor').prefetch_related('itens_de_estoque').order_by('id')),
+                    'historico': (MovimentacaoEstoqueSerializer, MovimentacaoEstoque.objects.filter(produto=produto_historico).select_related('responsavel').order_by('-data_movimentacao', '-id')),
+                }
+                resultado = {'linhas': limite, 'orjson': orjson is not None, 'cenarios': {}}
+                for nome, (classe, queryset) in cenarios.items():
+                    normal = self._medir(options, lambda: JSONRenderer().render(classe(list(queryset[:limite]), many=True).data))
+                    projecao = Projecao.criar(classe())
+                    rapido = self._medir(options, lambda: RenderizadorJSONRapido().render(projecao.converter(list(projecao.valores(queryset)[:limite]))))
+                    resultado['cenarios'][nome] = {
+                        'serializer': normal,
+                        'leitura_rapida': rapido,
+                        'aceleracao': round(normal['ms'] / rapido['ms'], 1),
+                    }
+                raise _Rollback
+        except _Rollback:
+            pass
+        self.stdout.write(json.dumps(resultado, indent=2))
+
+    def _popular(self, options):
+        categoria = Categoria.objects.create(nome='Benchmark leitura')
+        fornecedor = Fornecedor.objects.create(nome_fantasia='Benchmark leitura')
+        armazens = Armazem.objects.bulk_create([Armazem(nome=f'Benchmark leitura {i}') for i in range(options['armazens'])])
+        produtos = Produto.objects.bulk_create([
+            Produto(nome=f'Produto {i}', sku=f'BENCH-LEITURA-{i:07d}', categoria=categoria, fornecedor=fornecedor, preco_custo=10, preco_venda=15)
+            for i in range(options['produtos'])
+        ], batch_size=5000)
+        EstoqueItem.objects.bulk_create([
+            EstoqueItem(produto=produto, armazem=armazem, quantidade=100) for produto in produtos for armazem in armazens
+        ], batch_size=5000)
+        MovimentacaoEstoque.objects.bulk_create([
+            MovimentacaoEstoque(produto=produtos[0], armazem=armazens[i % len(armazens)], quantidade=1, tipo='ENTRADA', motivo='Benchmark')
+            for i in range(options['linhas'])
+        ], batch_size=5000)
+        return produtos[0]
+
+    def _medir(self, options, executar):
+        tempos = []
+        for _ in range(options['repeticoes']):
+            inicio = time.perf_counter()
+            conteudo = executar()
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        ms = statistics.median(tempos)
+        return {'ms': round(ms, 2), 'linhas_por_s': round(options['linhas'] / ms * 1000), 'bytes': len(conteudo)}
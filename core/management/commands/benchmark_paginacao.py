@@ -0,0 +1,69 @@
+import json
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from core.models import Armazem, MovimentacaoEstoque, Produto
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compara paginação por OFFSET e por cursor (keyset) no histórico de movimentações em profundidades crescentes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--linhas', type=int, default=1_000_000, help='Movimentações sintéticas a inserir (ex: 10000000).')
+        parser.add_argument('--tamanho-pagina', type=int, default=100)
+        parser.add_argument('--repeticoes', type=int, default=5)
+        parser.add_argument('--manter', action='store_true', help='Mantém as linhas sintéticas no banco ao final.')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                resultados = self.executar(options)
+                if not options['manter']:
+                    raise _Rollback
+        except _Rollback:
+            pass
+        self.stdout.write(json.dumps(resultados, indent=2))
+
+    def _medir(self, funcao, repeticoes):
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            funcao()
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        return round(statistics.median(tempos), 3)
+
+    def executar(self, options):
+        linhas, tamanho = options['linhas'], options['tamanho_pagina']
+        produto, _ = Produto.objects.get_or_create(sku='BENCH-PAGINACAO', defaults={'nome': 'Benchmark de paginação'})
+        armazem, _ = Armazem.objects.get_or_create(nome='Benchmark de paginação')
+
+        lote = 10_000
+        for inicio in range(0, linhas, lote):
+            MovimentacaoEstoque.objects.bulk_create(
+                MovimentacaoEstoque(produto=produto, armazem=armazem, quantidade=1, tipo='ENTRADA', motivo='benchmark')
+                for _ in range(min(lote, linhas - inicio))
+            )
+        self.stderr.write(f"{linhas} movimentações inseridas.")
+
+        queryset = MovimentacaoEstoque.objects.filter(produto=produto).order_by('-data_movimentacao', '-id')
+        resultados = {'linhas': linhas, 'tamanho_pagina': tamanho, 'tempos_ms': []}
+
+        profundidades = sorted({0, linhas // 100, linhas // 10, linhas // 2, max(linhas - tamanho, 0)})
+        for deslocamento in profundidades:
+            tempo_offset = self._medir(lambda: list(queryset[deslocamento:deslocamento + tamanho]), options['repeticoes'])
+
+            if deslocamento:
+                data, pk = queryset.values_list('data_movimentacao', 'id')[deslocamento - 1]
+                pagina = queryset.filter(Q(data_movimentacao__lte=data) & (Q(data_movimentacao__lt=data) | Q(id__lt=pk)))
+            else:
+                pagina = queryset
+            tempo_keyset = self._medir(lambda: list(pagina[:tamanho]), options['repeticoes'])
+
+            resultados['tempos_ms'].append({'deslocamento': deslocamento, 'offset': tempo_offset, 'keyset': tempo_keyset})
+        return resultados
@@ -0,0 +1,51 @@
+import json
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from core.models import Cliente, Fornecedor, Produto
+from core.serializers import PedidoCompraSerializer, PedidoVendaSerializer
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Mede tempo e número de consultas da criação de pedidos de compra e venda com quantidades crescentes de linhas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--linhas', type=int, nargs='+', default=[10, 100, 500, 2000])
+
+    def handle(self, *args, **options):
+        resultados = []
+        try:
+            with transaction.atomic():
+                maximo = max(options['linhas'])
+                Produto.objects.bulk_create(
+                    Produto(nome=f'Benchmark {i}', sku=f'BENCH-PEDIDO-{i}') for i in range(maximo)
+                )
+                produto_ids = list(Produto.objects.filter(sku__startswith='BENCH-PEDIDO-').values_list('id', flat=True))
+                cliente = Cliente.objects.create(nome='Benchmark', email='benchmark-pedidos@example.com')
+                fornecedor = Fornecedor.objects.create(nome_fantasia='Benchmark')
+
+                for quantidade in options['linhas']:
+                    itens = [{'produto': produto_id, 'quantidade': 1, 'preco_unitario': '1.00'} for produto_id in produto_ids[:quantidade]]
+                    resultados.append({
+                        'linhas': quantidade,
+                        'venda': self._medir(PedidoVendaSerializer, {'cliente': cliente.id, 'itens_para_criar': itens}),
+                        'compra': self._medir(PedidoCompraSerializer, {'fornecedor': fornecedor.id, 'itens': itens}),
+                    })
+                raise _Rollback
+        except _Rollback:
+            pass
+        self.stdout.write(json.dumps(resultados, indent=2))
+
+    def _medir(self, serializer_class, dados):
+        with CaptureQueriesContext(connection) as consultas:
+            inicio = time.perf_counter()
+            serializer = serializer_class(data=dados)
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            decorrido = time.perf_counter() - inicio
+        return {'ms': round(decorrido * 1000, 2), 'consultas': len(consultas)}
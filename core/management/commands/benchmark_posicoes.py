@@ -0,0 +1,116 @@
+import json
+import random
+import statistics
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from core.models import Armazem, EstoqueItem, MovimentacaoEstoque, PosicaoEstoque, Produto
+from core.posicoes import fim_do_dia, posicoes_em, registrar_posicoes
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara a consulta de estoque em uma data (checkpoint diário + delta) com o reprocessamento '
+        'de todo o histórico, para um armazém inteiro. Dados numa transação desfeita ao final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--itens', type=int, default=1000, help='Produtos no armazém.')
+        parser.add_argument('--dias', type=int, default=365)
+        parser.add_argument('--movimentacoes-por-dia', type=int, default=2, help='Média por item por dia.')
+        parser.add_argument('--consultas', type=int, default=20)
+        parser.add_argument('--semente', type=int, default=42)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                resultado = self.executar(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+        self.stdout.write(json.dumps(resultado, indent=2))
+        if not resultado['resultados_iguais']:
+            raise CommandError('A consulta por checkpoint divergiu do reprocessamento completo.')
+
+    def executar(self, options):
+        aleatorio = random.Random(options['semente'])
+        itens, dias = options['itens'], options['dias']
+        armazem = Armazem.objects.create(nome='Benchmark posições')
+        Produto.objects.bulk_create([Produto(nome=f'Benchmark {i}', sku=f'BENCH-POSICAO-{i:07d}') for i in range(itens)])
+        produtos = list(Produto.objects.filter(sku__startswith='BENCH-POSICAO-').order_by('sku').values_list('id', flat=True))
+
+        hoje = timezone.localdate()
+        primeiro_dia = hoje - timedelta(days=dias)
+        saldos = dict.fromkeys(produtos, 0)
+        posicoes, movimentacoes, total = [], [], 0
+        for dia in range(dias):
+            inicio_dia = fim_do_dia(primeiro_dia + timedelta(days=dia - 1))
+            for produto_id in produtos:
+                for _ in range(aleatorio.randint(0, 2 * options['movimentacoes_por_dia'])):
+                    quantidade = aleatorio.randint(1, 20) if aleatorio.random() < 0.6 or saldos[produto_id] < 20 else -aleatorio.randint(1, 20)
+                    saldos[produto_id] += quantidade
+                    movimentacoes.append(MovimentacaoEstoque(
+                        produto_id=produto_id, armazem=armazem, quantidade=quantidade, tipo='ENTRADA' if quantidade > 0 else 'SAIDA',
+                        data_movimentacao=inicio_dia + timedelta(seconds=aleatorio.randrange(86400)),
+                    ))
+                posicoes.append(PosicaoEstoque(produto_id=produto_id, armazem=armazem, momento=fim_do_dia(primeiro_dia + timedelta(days=dia)), quantidade=saldos[produto_id]))
+            if len(movimentacoes) >= 50_000 or dia == dias - 1:
+                # auto_now_add sobrescreveria a data no bulk_create: grava e corrige a data em seguida.
+                datas = [movimentacao.data_movimentacao for movimentacao in movimentacoes]
+                criadas = MovimentacaoEstoque.objects.bulk_create(movimentacoes)
+                for movimentacao, data in zip(criadas, datas):
+                    movimentacao.data_movimentacao = data
+                MovimentacaoEstoque.objects.bulk_update(criadas, ['data_movimentacao'], batch_size=5000)
+                PosicaoEstoque.objects.bulk_create(posicoes, batch_size=5000)
+                total += len(movimentacoes)
+                movimentacoes, posicoes = [], []
+        EstoqueItem.objects.bulk_create([EstoqueItem(produto_id=produto_id, armazem=armazem, quantidade=saldo) for produto_id, saldo in saldos.items()])
+        self.stderr.write(f"{total} movimentações e {itens * dias} checkpoints inseridos.")
+
+        # O último checkpoint é refeito pelo caminho real (comando diário), para medir o custo do job.
+        PosicaoEstoque.objects.filter(armazem=armazem, momento=fim_do_dia(hoje - timedelta(days=1))).delete()
+        inicio = time.perf_counter()
+        registrar_posicoes(fim_do_dia(hoje - timedelta(days=1)))
+        checkpoint_ms = (time.perf_counter() - inicio) * 1000
+
+        alvos = [
+            fim_do_dia(primeiro_dia + timedelta(days=aleatorio.randrange(dias - 1))) + timedelta(seconds=aleatorio.randrange(86400))
+            for _ in range(options['consultas'])
+        ]
+        do_armazem = EstoqueItem.objects.filter(armazem=armazem)
+        tempos_checkpoint, tempos_completo, iguais = [], [], True
+        for alvo in alvos:
+            inicio = time.perf_counter()
+            por_checkpoint = {linha['produto_id']: linha['quantidade'] for linha in posicoes_em(alvo, do_armazem)}
+            tempos_checkpoint.append((time.perf_counter() - inicio) * 1000)
+
+            inicio = time.perf_counter()
+            completo = dict(
+                MovimentacaoEstoque.objects.filter(armazem=armazem, data_movimentacao__lt=alvo)
+                .values('produto_id').annotate(total=Sum('quantidade')).order_by().values_list('produto_id', 'total')
+            )
+            tempos_completo.append((time.perf_counter() - inicio) * 1000)
+            iguais = iguais and all(por_checkpoint[produto_id] == completo.get(produto_id, 0) for produto_id in produtos)
+
+        return {
+            'itens': itens,
+            'dias': dias,
+            'movimentacoes': total,
+            'checkpoint_diario_ms': round(checkpoint_ms, 1),
+            'armazem_inteiro_ms': {
+                'checkpoint_mais_delta': self._resumo(tempos_checkpoint),
+                'reprocessamento_completo': self._resumo(tempos_completo),
+            },
+            'resultados_iguais': iguais,
+        }
+
+    def _resumo(self, tempos):
+        tempos = sorted(tempos)
+        return {'p50': round(statistics.median(tempos), 1), 'p95': round(tempos[max(int(len(tempos) * 0.95) - 1, 0)], 1)}
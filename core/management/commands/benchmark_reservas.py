@@ -0,0 +1,104 @@
+import json
+import queue
+import statistics
+import threading
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.exceptions import ValidationError
+from core.models import Armazem, Cliente, EstoqueItem, PedidoVenda, Produto
+from core.serializers import PedidoVendaSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Teste de carga das reservas: várias threads criam pedidos concorrentes do mesmo SKU. '
+        'Confere que nada é reservado além do estoque e mede a vazão. Os dados criados são apagados ao final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pedidos', type=int, default=200)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--estoque', type=int, default=100)
+        parser.add_argument('--quantidade', type=int, default=1, help='Unidades por pedido.')
+
+    def handle(self, *args, **options):
+        # As threads precisam enxergar os dados umas das outras, então tudo é gravado de fato e apagado no fim.
+        armazem = Armazem.objects.create(nome='Benchmark reservas')
+        produto = Produto.objects.create(nome='Benchmark reservas', sku=f'BENCH-RESERVA-{time.time_ns()}')
+        cliente = Cliente.objects.create(nome='Benchmark', email=f'benchmark-reservas-{time.time_ns()}@example.com')
+        EstoqueItem.objects.create(produto=produto, armazem=armazem, quantidade=options['estoque'])
+        try:
+            resultado = self._executar(options, armazem, produto, cliente)
+        finally:
+            PedidoVenda.objects.filter(cliente=cliente).delete()
+            EstoqueItem.objects.filter(armazem=armazem).delete()
+            produto.delete()
+            cliente.delete()
+            armazem.delete()
+
+        self.stdout.write(json.dumps(resultado, indent=2))
+        if resultado['sobrerreserva'] or resultado['reservado'] != resultado['aceitos'] * options['quantidade']:
+            raise CommandError('Reservas inconsistentes com o estoque.')
+
+    def _executar(self, options, armazem, produto, cliente):
+        fila = queue.Queue()
+        for _ in range(options['pedidos']):
+            fila.put(None)
+        dados = {
+            'cliente': cliente.id,
+            'armazem': armazem.id,
+            'itens_para_criar': [{'produto': produto.id, 'quantidade': options['quantidade'], 'preco_unitario': '1.00'}],
+        }
+        latencias, contagem, trava = [], {'aceitos': 0, 'recusados': 0, 'erros': 0}, threading.Lock()
+        barreira = threading.Barrier(options['threads'])
+
+        def trabalhar():
+            try:
+                barreira.wait()
+                while True:
+                    try:
+                        fila.get_nowait()
+                    except queue.Empty:
+                        return
+                    inicio = time.perf_counter()
+                    try:
+                        serializer = PedidoVendaSerializer(data=dados)
+                        serializer.is_valid(raise_exception=True)
+                        serializer.save()
+                        chave = 'aceitos'
+                    except ValidationError:
+                        chave = 'recusados'
+                    except Exception:
+                        chave = 'erros'
+                    with trava:
+                        contagem[chave] += 1
+                        latencias.append(time.perf_counter() - inicio)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=trabalhar) for _ in range(options['threads'])]
+        inicio = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duracao = time.perf_counter() - inicio
+
+        item = EstoqueItem.objects.get(produto=produto, armazem=armazem)
+        latencias.sort()
+        return {
+            'pedidos': options['pedidos'],
+            'threads': options['threads'],
+            'estoque': item.quantidade,
+            'reservado': item.reservado,
+            **contagem,
+            'sobrerreserva': item.reservado > item.quantidade,
+            'duracao_segundos': round(duracao, 3),
+            'pedidos_por_segundo': round(options['pedidos'] / duracao, 1) if duracao else None,
+            'latencia_ms': {
+                'p50': round(statistics.median(latencias) * 1000, 2),
+                'p95': round(latencias[int(len(latencias) * 0.95) - 1] * 1000, 2),
+                'max': round(latencias[-1] * 1000, 2),
+            } if latencias else None,
+        }
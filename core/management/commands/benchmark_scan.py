@@ -0,0 +1,70 @@
+import json
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from core.indice_sku import IndiceSku
+from core.models import Produto
+from core.serializers import ProdutoSerializer
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede a resolução de SKU do scan: índice em memória aquecido, lote com o índice frio '
+        '(uma consulta) e o caminho antigo (consulta + ProdutoSerializer). Dados numa transação desfeita ao final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--produtos', type=int, default=100_000)
+        parser.add_argument('--leituras', type=int, default=10_000)
+        parser.add_argument('--lote', type=int, default=500)
+        parser.add_argument('--semente', type=int, default=42)
+
+    def handle(self, *args, **options):
+        aleatorio = random.Random(options['semente'])
+        try:
+            with transaction.atomic():
+                for lote in range(0, options['produtos'], 10_000):
+                    Produto.objects.bulk_create([
+                        Produto(nome=f'Benchmark {i}', sku=f'BENCH-SCAN-{i:07d}', preco_venda=aleatorio.randint(100, 99999) / 100)
+                        for i in range(lote, min(lote + 10_000, options['produtos']))
+                    ])
+                skus = [f'BENCH-SCAN-{aleatorio.randrange(options["produtos"]):07d}' for _ in range(options['leituras'])]
+
+                indice = IndiceSku()
+                inicio = time.perf_counter()
+                indice.aquecer()
+                aquecimento = time.perf_counter() - inicio
+
+                frio = IndiceSku()
+                with CaptureQueriesContext(connection) as consultas:
+                    inicio = time.perf_counter()
+                    frio.buscar_varios(skus[:options['lote']])
+                    lote_frio = time.perf_counter() - inicio
+
+                resultado = {
+                    'produtos': options['produtos'],
+                    'aquecimento_s': round(aquecimento, 2),
+                    'indice_quente_us': self._medir(indice.buscar, skus),
+                    'lote_frio': {'skus': options['lote'], 'ms': round(lote_frio * 1000, 2), 'consultas': len(consultas)},
+                    'serializer_us': self._medir(lambda sku: ProdutoSerializer(Produto.objects.get(sku=sku)).data, skus[:1000]),
+                }
+                raise _Rollback
+        except _Rollback:
+            pass
+        self.stdout.write(json.dumps(resultado, indent=2))
+
+    def _medir(self, buscar, skus):
+        tempos = []
+        for sku in skus:
+            inicio = time.perf_counter()
+            buscar(sku)
+            tempos.append((time.perf_counter() - inicio) * 1_000_000)
+        tempos.sort()
+        return {'p50': round(statistics.median(tempos), 1), 'p95': round(tempos[int(len(tempos) * 0.95) - 1], 1), 'p99': round(tempos[int(len(tempos) * 0.99) - 1], 1)}
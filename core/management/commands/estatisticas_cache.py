@@ -0,0 +1,10 @@
+import json
+from django.core.management.base import BaseCommand
+from core.cache_respostas import estatisticas
+
+
+class Command(BaseCommand):
+    help = 'Mostra acertos e falhas do cache de respostas do catálogo por recurso.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(estatisticas(), indent=2))
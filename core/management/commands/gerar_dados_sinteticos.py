@@ -0,0 +1,56 @@
+import json
+import time
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from core.sinteticos import TAMANHO_LOTE_SINTETICO, GeradorDados
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera dados sintéticos reproduzíveis (mesma --semente, mesmos dados) para benchmarks, com inserção em massa '
+        '(COPY no PostgreSQL). Ex.: --produtos 1000000 --armazens 100 --movimentacoes 50000000 --pedidos 1000000. '
+        'Use um banco dedicado: os dados não são apagados ao final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--semente', type=int, default=42)
+        parser.add_argument('--categorias', type=int, default=50)
+        parser.add_argument('--fornecedores', type=int, default=500)
+        parser.add_argument('--produtos', type=int, default=10_000)
+        parser.add_argument('--armazens', type=int, default=10)
+        parser.add_argument('--clientes', type=int, default=5_000)
+        parser.add_argument('--movimentacoes', type=int, default=100_000)
+        parser.add_argument('--pedidos', type=int, default=10_000, help='Pedidos de venda.')
+        parser.add_argument('--pedidos-compra', type=int, default=None, help='Padrão: um décimo de --pedidos.')
+        parser.add_argument('--itens-por-pedido', type=int, default=5, help='Máximo de itens por pedido de venda (compras: o dobro).')
+        parser.add_argument('--dias', type=int, default=365, help='Período coberto pelo histórico.')
+        parser.add_argument('--tamanho-lote', type=int, default=TAMANHO_LOTE_SINTETICO)
+        parser.add_argument('--sem-metricas', action='store_true', help='Não reconstrói os resumos do dashboard ao final.')
+
+    def handle(self, *args, **options):
+        if options['armazens'] < 1 and options['produtos']:
+            raise CommandError('Informe ao menos um armazém.')
+
+        def progredir(etapa, quantidade, segundos):
+            taxa = f" ({quantidade / segundos:,.0f}/s)" if segundos else ''
+            self.stderr.write(f"{etapa}: {quantidade} linha(s) em {segundos:.1f}s{taxa}")
+
+        gerador = GeradorDados(options['semente'], options['dias'], options['tamanho_lote'], progredir)
+        inicio = time.perf_counter()
+        try:
+            gerador.gerar(
+                categorias=options['categorias'],
+                fornecedores=options['fornecedores'],
+                produtos=options['produtos'],
+                armazens=options['armazens'],
+                clientes=options['clientes'],
+                movimentacoes=options['movimentacoes'],
+                pedidos=options['pedidos'],
+                pedidos_compra=options['pedidos'] // 10 if options['pedidos_compra'] is None else options['pedidos_compra'],
+                itens_por_pedido=options['itens_por_pedido'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        if not options['sem_metricas']:
+            call_command('recalcular_metricas', stdout=self.stderr)
+        self.stdout.write(json.dumps({'semente': options['semente'], 'duracao_segundos': round(time.perf_counter() - inicio, 1)}))
@@ -0,0 +1,29 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from core.importacao import FORMATOS_IMPORTACAO, TAMANHO_LOTE_IMPORTACAO, ImportadorCatalogo, ler_linhas
+
+
+class Command(BaseCommand):
+    help = 'Importa um catálogo de produtos (CSV ou NDJSON) com upsert pelo SKU, reportando o progresso em linhas/s.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo')
+        parser.add_argument('--formato', choices=FORMATOS_IMPORTACAO, help='Padrão: deduzido pela extensão do arquivo.')
+        parser.add_argument('--tamanho-lote', type=int, default=TAMANHO_LOTE_IMPORTACAO)
+
+    def handle(self, *args, **options):
+        formato = options['formato'] or options['arquivo'].rsplit('.', 1)[-1].lower()
+        if formato not in FORMATOS_IMPORTACAO:
+            raise CommandError(f"Formato inválido. Use --formato com um de: {', '.join(FORMATOS_IMPORTACAO)}.")
+
+        importador = ImportadorCatalogo(tamanho_lote=options['tamanho_lote'], ao_progredir=self._progresso)
+        try:
+            with open(options['arquivo'], 'rb') as arquivo:
+                resultado = importador.importar(ler_linhas(arquivo, formato))
+        except OSError as e:
+            raise CommandError(str(e))
+        self.stdout.write(json.dumps(resultado, indent=2, ensure_ascii=False, default=str))
+
+    def _progresso(self, resumo, decorrido):
+        taxa = resumo['linhas'] / decorrido if decorrido else 0
+        self.stderr.write(f"{resumo['linhas']} linhas ({taxa:.0f} linhas/s): {resumo['criados']} criados, {resumo['atualizados']} atualizados, {resumo['erros']} erros.")
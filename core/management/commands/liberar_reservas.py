@@ -0,0 +1,23 @@
+import time
+from django.core.management.base import BaseCommand
+from core.reservas import liberar_reservas_expiradas
+
+
+class Command(BaseCommand):
+    help = 'Devolve ao estoque disponível as reservas de pedidos que expiraram.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Continua varrendo indefinidamente.')
+        parser.add_argument('--intervalo', type=float, default=30, help='Segundos entre as varreduras no modo --loop.')
+        parser.add_argument('--limite', type=int, default=1000, help='Máximo de reservas liberadas por varredura.')
+
+    def handle(self, *args, **options):
+        while True:
+            liberadas = liberar_reservas_expiradas(limite=options['limite'])
+            if liberadas:
+                self.stdout.write(f"{liberadas} reserva(s) expirada(s) liberada(s).")
+            if not options['loop']:
+                break
+            # Uma varredura cheia indica fila acumulada: segue sem esperar.
+            if liberadas < options['limite']:
+                time.sleep(options['intervalo'])
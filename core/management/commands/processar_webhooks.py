@@ -0,0 +1,22 @@
+import time
+from django.core.management.base import BaseCommand
+from core.webhooks import processar_outbox
+
+
+class Command(BaseCommand):
+    help = 'Envia os webhooks pendentes da fila de saída (outbox), incluindo as novas tentativas agendadas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Continua processando a fila indefinidamente.')
+        parser.add_argument('--intervalo', type=float, default=5, help='Segundos entre as varreduras no modo --loop.')
+        parser.add_argument('--limite', type=int, default=500, help='Máximo de eventos reservados por varredura.')
+
+    def handle(self, *args, **options):
+        while True:
+            enviados, falhas = processar_outbox(limite=options['limite'])
+            if enviados or falhas:
+                self.stdout.write(f"{enviados} webhook(s) enviados, {falhas} com falha.")
+            if not options['loop']:
+                break
+            if not (enviados or falhas):
+                time.sleep(options['intervalo'])
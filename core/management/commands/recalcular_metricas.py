@@ -0,0 +1,132 @@
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, Sum, DecimalField
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils.dateparse import parse_date
+from core.metricas import obter_metricas
+from core.models import EstoqueItem, ItemPedidoCompra, ItemPedidoVenda, MovimentacaoEstoque, PedidoCompra, PedidoVenda, ResumoDiario, ResumoDiarioProduto
+
+
+def _valor(campo_quantidade, campo_preco):
+    return Sum(F(campo_quantidade) * F(campo_preco), output_field=DecimalField())
+
+
+def _filtrar_periodo(queryset, campo, desde, ate):
+    if desde:
+        queryset = queryset.filter(**{f'{campo}__date__gte': desde})
+    if ate:
+        queryset = queryset.filter(**{f'{campo}__date__lte': ate})
+    return queryset
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói os resumos do dashboard a partir do histórico e/ou compara-os com as agregações ao vivo.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Primeiro dia (AAAA-MM-DD) a reconstruir. Padrão: todo o histórico.')
+        parser.add_argument('--ate', help='Último dia (AAAA-MM-DD) a reconstruir. Padrão: hoje.')
+        parser.add_argument('--verificar', action='store_true', help='Apenas compara os resumos com as agregações ao vivo, sem reconstruir.')
+
+    def handle(self, *args, **options):
+        desde = self._data(options['desde'], '--desde')
+        ate = self._data(options['ate'], '--ate')
+
+        if not options['verificar']:
+            self.reconstruir(desde, ate)
+        self.verificar()
+
+    def _data(self, valor, nome):
+        if not valor:
+            return None
+        data = parse_date(valor)
+        if data is None:
+            raise CommandError(f'{nome} deve estar no formato AAAA-MM-DD.')
+        return data
+
+    @transaction.atomic
+    def reconstruir(self, desde, ate):
+        resumos = ResumoDiario.objects.all()
+        resumos_produto = ResumoDiarioProduto.objects.all()
+        if desde:
+            resumos = resumos.filter(data__gte=desde)
+            resumos_produto = resumos_produto.filter(data__gte=desde)
+        if ate:
+            resumos = resumos.filter(data__lte=ate)
+            resumos_produto = resumos_produto.filter(data__lte=ate)
+        resumos.delete()
+        resumos_produto.delete()
+
+        por_dia = {}
+
+        def dia(data):
+            return por_dia.setdefault(data, ResumoDiario(data=data, total_vendas=Decimal('0'), total_compras=Decimal('0'), variacao_inventario=Decimal('0')))
+
+        vendas = _filtrar_periodo(
+            ItemPedidoVenda.objects.filter(pedido_venda__status='DESPACHADO'), 'pedido_venda__data_despacho', desde, ate
+        ).annotate(
+            data=TruncDate('pedido_venda__data_despacho')
+        ).values('data', 'produto_id').annotate(
+            quantidade_vendida=Sum('quantidade'),
+            valor_vendido=_valor('quantidade', 'preco_unitario')
+        ).order_by()
+
+        linhas_produto = []
+        for venda in vendas:
+            dia(venda['data']).total_vendas += venda['valor_vendido']
+            linhas_produto.append(ResumoDiarioProduto(**venda))
+
+        compras = _filtrar_periodo(
+            ItemPedidoCompra.objects.filter(pedido_compra__status='RECEBIDO'), 'pedido_compra__data_recebimento', desde, ate
+        ).annotate(
+            data=TruncDate('pedido_compra__data_recebimento')
+        ).values('data').annotate(total=_valor('quantidade', 'preco_unitario')).order_by()
+        for compra in compras:
+            dia(compra['data']).total_compras += compra['total']
+
+        # Movimentações valorizadas ao preço de custo atual: reavaliações anteriores de preço não ficam no histórico.
+        movimentacoes = _filtrar_periodo(
+            MovimentacaoEstoque.objects.all(), 'data_movimentacao', desde, ate
+        ).annotate(
+            data=TruncDate('data_movimentacao')
+        ).values('data').annotate(total=_valor('quantidade', 'produto__preco_custo')).order_by()
+        for movimentacao in movimentacoes:
+            dia(movimentacao['data']).variacao_inventario += movimentacao['total']
+
+        ResumoDiario.objects.bulk_create(por_dia.values(), batch_size=1000)
+        ResumoDiarioProduto.objects.bulk_create(linhas_produto, batch_size=1000)
+        self.stdout.write(f"{len(por_dia)} resumo(s) diário(s) e {len(linhas_produto)} resumo(s) por produto reconstruídos.")
+
+    def verificar(self):
+        metricas = obter_metricas()
+
+        ao_vivo = {
+            'total_vendas': PedidoVenda.objects.filter(status='DESPACHADO').aggregate(
+                total=Coalesce(Sum(F('itens__quantidade') * F('itens__preco_unitario')), 0, output_field=DecimalField())
+            )['total'],
+            'total_compras': PedidoCompra.objects.filter(status='RECEBIDO').aggregate(
+                total=Coalesce(Sum(F('itens__quantidade') * F('itens__preco_unitario')), 0, output_field=DecimalField())
+            )['total'],
+            'valor_total_inventario': EstoqueItem.objects.aggregate(
+                total=Coalesce(Sum(F('quantidade') * F('produto__preco_custo')), 0, output_field=DecimalField())
+            )['total'],
+            'top_5_produtos_vendidos': list(ItemPedidoVenda.objects.filter(
+                pedido_venda__status='DESPACHADO'
+            ).values('produto__nome').annotate(total_vendido=Sum('quantidade')).order_by('-total_vendido')[:5]),
+        }
+
+        divergencias = []
+        for metrica, valor in ao_vivo.items():
+            resumido = metricas[metrica]
+            if metrica == 'top_5_produtos_vendidos':
+                igual = sorted(item['total_vendido'] for item in valor) == sorted(item['total_vendido'] for item in resumido)
+            else:
+                # Em centavos: no SQLite as somas de produtos decimais voltam como ponto flutuante.
+                igual = round(Decimal(valor), 2) == round(Decimal(resumido), 2)
+            self.stdout.write(f"{metrica}: ao vivo={valor} resumo={resumido} {'OK' if igual else 'DIVERGENTE'}")
+            if not igual:
+                divergencias.append(metrica)
+
+        if divergencias:
+            raise CommandError(f"Resumos divergentes: {', '.join(divergencias)}. Rode o comando sem --verificar para reconstruí-los.")
+        self.stdout.write(self.style.SUCCESS('Resumos conferem com as agregações ao vivo.'))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from core.cache_respostas import invalidar_linhas
+from core.models import Produto
+from core.services import soma_estoque_do_produto
+
+
+class Command(BaseCommand):
+    help = 'Compara Produto.estoque_total com a soma dos itens de estoque e, com --corrigir, repara as divergências.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corrigir', action='store_true', help='Regrava o total dos produtos divergentes.')
+        parser.add_argument('--limite', type=int, default=50, help='Quantas divergências listar.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            divergentes = Produto.objects.annotate(soma=soma_estoque_do_produto()).exclude(estoque_total=F('soma'))
+            if options['corrigir']:
+                divergentes = divergentes.select_for_update(of=('self',))
+            linhas = list(divergentes.order_by('id').values_list('id', 'sku', 'estoque_total', 'soma'))
+
+            for produto_id, sku, total, soma in linhas[:options['limite']]:
+                self.stdout.write(f"Produto {produto_id} ({sku}): estoque_total={total}, soma dos itens={soma}")
+            if not linhas:
+                self.stdout.write(self.style.SUCCESS('Nenhuma divergência encontrada.'))
+                return
+
+            if not options['corrigir']:
+                raise CommandError(f"{len(linhas)} produto(s) divergente(s). Rode com --corrigir para reparar.")
+
+            corrigidos = Produto.objects.filter(id__in=[linha[0] for linha in linhas]).update(estoque_total=soma_estoque_do_produto())
+            invalidar_linhas('produto', [linha[0] for linha in linhas])
+        self.stdout.write(self.style.SUCCESS(f"{corrigidos} produto(s) corrigido(s)."))
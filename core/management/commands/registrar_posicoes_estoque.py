@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from core.posicoes import DetalheCompactado, fim_do_dia, registrar_posicoes
+
+
+class Command(BaseCommand):
+    help = 'Grava os checkpoints diários de estoque (PosicaoEstoque) usados nas consultas de estoque em uma data. Rodar uma vez por dia.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data', metavar='AAAA-MM-DD', help='Dia fechado pelo checkpoint (padrão: ontem).')
+        parser.add_argument('--dias', type=int, default=1, help='Quantos dias, terminando em --data, gravar (para preencher um período).')
+
+    def handle(self, *args, **options):
+        if options['data']:
+            try:
+                ultimo = datetime.strptime(options['data'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Use --data no formato AAAA-MM-DD.')
+        else:
+            ultimo = timezone.localdate() - timedelta(days=1)
+        if fim_do_dia(ultimo) > timezone.now():
+            raise CommandError('O dia informado ainda não terminou.')
+
+        for atras in range(options['dias'] - 1, -1, -1):
+            dia = ultimo - timedelta(days=atras)
+            try:
+                gravados = registrar_posicoes(fim_do_dia(dia))
+            except DetalheCompactado as e:
+                raise CommandError(str(e))
+            self.stdout.write(f"{dia}: {gravados} posição(ões) gravada(s).")
@@ -0,0 +1,166 @@
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F, Sum, Case, When, Value, DecimalField, PositiveBigIntegerField
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from .models import Produto, EstoqueItem, ResumoDiario, ResumoDiarioProduto
+
+
+def _acumular(modelo, chave, **incrementos):
+    incrementos = {campo: valor for campo, valor in incrementos.items() if valor}
+    if not incrementos:
+        return
+    expressoes = {campo: F(campo) + valor for campo, valor in incrementos.items()}
+    with transaction.atomic():
+        if not modelo.objects.filter(**chave).update(**expressoes):
+            modelo.objects.get_or_create(**chave)
+            modelo.objects.filter(**chave).update(**expressoes)
+
+
+def registrar_variacao_estoque(variacoes, data=None):
+    """Acumula no resumo do dia a variação do valor do inventário para {produto_id: delta_quantidade}."""
+    variacoes = {produto_id: delta for produto_id, delta in variacoes.items() if delta}
+    if not variacoes:
+        return
+    precos = Produto.objects.filter(id__in=variacoes.keys()).values_list('id', 'preco_custo')
+    valor = sum((variacoes[produto_id] * preco for produto_id, preco in precos), Decimal('0'))
+    _acumular(ResumoDiario, {'data': data or timezone.localdate()}, variacao_inventario=valor)
+
+
+def registrar_reavaliacao(produto_id, preco_anterior, preco_novo, data=None):
+    registrar_reavaliacoes({produto_id: (preco_anterior, preco_novo)}, data)
+
+
+def registrar_reavaliacoes(precos, data=None):
+    """Acumula a reavaliação do inventário para {produto_id: (preço anterior, preço novo)} com uma única agregação."""
+    diferencas = {}
+    for produto_id, (preco_anterior, preco_novo) in precos.items():
+        diferenca = Decimal(str(preco_novo)) - Decimal(str(preco_anterior))
+        if diferenca:
+            diferencas[produto_id] = diferenca
+    if not diferencas:
+        return
+    quantidades = EstoqueItem.objects.filter(produto_id__in=diferencas.keys()).values_list('produto_id').annotate(total=Sum('quantidade')).order_by()
+    valor = sum((total * diferencas[produto_id] for produto_id, total in quantidades), Decimal('0'))
+    _acumular(ResumoDiario, {'data': data or timezone.localdate()}, variacao_inventario=valor)
+
+
+def registrar_venda(itens, data=None):
+    """
+    Acumula uma venda despachada. `itens` são tuplas (produto_id, quantidade, preco_unitario).
+    Usa um número fixo de consultas, independente da quantidade de linhas do pedido.
+    """
+    data = data or timezone.localdate()
+    por_produto = {}
+    for produto_id, quantidade, preco_unitario in itens:
+        quantidade_atual, valor_atual = por_produto.get(produto_id, (0, Decimal('0')))
+        por_produto[produto_id] = (quantidade_atual + quantidade, valor_atual + quantidade * preco_unitario)
+    if not por_produto:
+        return
+
+    with transaction.atomic():
+        ResumoDiarioProduto.objects.bulk_create(
+            [ResumoDiarioProduto(data=data, produto_id=produto_id) for produto_id in por_produto],
+            ignore_conflicts=True
+        )
+        resumos = ResumoDiarioProduto.objects.filter(data=data, produto_id__in=por_produto.keys())
+        # Trava as linhas em ordem de produto_id antes do UPDATE para que vendas concorrentes não entrem em deadlock.
+        list(resumos.select_for_update().order_by('produto_id').values_list('id', flat=True))
+        resumos.update(
+            quantidade_vendida=F('quantidade_vendida') + Case(
+                *[When(produto_id=produto_id, then=Value(quantidade)) for produto_id, (quantidade, _) in por_produto.items()],
+                default=Value(0),
+                output_field=PositiveBigIntegerField()
+            ),
+            valor_vendido=F('valor_vendido') + Case(
+                *[When(produto_id=produto_id, then=Value(valor)) for produto_id, (_, valor) in por_produto.items()],
+                default=Value(Decimal('0')),
+                output_field=DecimalField(max_digits=16, decimal_places=2)
+            )
+        )
+        _acumular(ResumoDiario, {'data': data}, total_vendas=sum((valor for _, valor in por_produto.values()), Decimal('0')))
+
+
+def registrar_compra(itens, data=None):
+    """Acumula uma compra recebida. `itens` são tuplas (produto_id, quantidade, preco_unitario)."""
+    total = sum((quantidade * preco_unitario for _, quantidade, preco_unitario in itens), Decimal('0'))
+    _acumular(ResumoDiario, {'data': data or timezone.localdate()}, total_compras=total)
+
+
+def _consultas_metricas(data_inicio=None, data_fim=None):
+    resumos = ResumoDiario.objects.all()
+    resumos_produto = ResumoDiarioProduto.objects.all()
+    if data_inicio:
+        resumos = resumos.filter(data__gte=data_inicio)
+        resumos_produto = resumos_produto.filter(data__gte=data_inicio)
+    if data_fim:
+        resumos = resumos.filter(data__lte=data_fim)
+        resumos_produto = resumos_produto.filter(data__lte=data_fim)
+
+    totais = {
+        'total_vendas': Coalesce(Sum('total_vendas'), 0, output_field=DecimalField()),
+        'total_compras': Coalesce(Sum('total_compras'), 0, output_field=DecimalField()),
+    }
+
+    # O valor do inventário é um saldo: soma de todas as variações até o fim do período.
+    inventario = ResumoDiario.objects.all()
+    if data_fim:
+        inventario = inventario.filter(data__lte=data_fim)
+    saldo = {'total': Coalesce(Sum('variacao_inventario'), 0, output_field=DecimalField())}
+
+    top_5_produtos = resumos_produto.values(
+        'produto__nome'
+    ).annotate(
+        total_vendido=Sum('quantidade_vendida')
+    ).order_by(
+        '-total_vendido'
+    )[:5]
+    return resumos, totais, inventario, saldo, top_5_produtos
+
+
+def _montar_metricas(totais, valor_inventario, top_5_produtos):
+    return {
+        'total_vendas': totais['total_vendas'],
+        'total_compras': totais['total_compras'],
+        'valor_total_inventario': valor_inventario,
+        'top_5_produtos_vendidos': top_5_produtos,
+    }
+
+
+def periodo_das_metricas(parametros):
+    """
+    Lê data_inicio/data_fim (AAAA-MM-DD) dos parâmetros da requisição, para as views do dashboard.
+    Retorna (datas, erro): erro é a mensagem para o 400 quando uma data é malformada ou não existe.
+    """
+    datas = {}
+    for parametro in ('data_inicio', 'data_fim'):
+        valor = parametros.get(parametro)
+        if not valor:
+            continue
+        try:
+            datas[parametro] = parse_date(valor)
+        except ValueError:
+            datas[parametro] = None
+        if datas[parametro] is None:
+            return None, f'{parametro} deve ser uma data válida no formato AAAA-MM-DD.'
+    return datas, None
+
+
+def obter_metricas(data_inicio=None, data_fim=None):
+    resumos, totais, inventario, saldo, top_5_produtos = _consultas_metricas(data_inicio, data_fim)
+    return _montar_metricas(
+        resumos.aggregate(**totais),
+        inventario.aggregate(**saldo)['total'],
+        list(top_5_produtos),
+    )
+
+
+async def aobter_metricas(data_inicio=None, data_fim=None):
+    """obter_metricas com o ORM assíncrono, para as views assíncronas."""
+    resumos, totais, inventario, saldo, top_5_produtos = _consultas_metricas(data_inicio, data_fim)
+    return _montar_metricas(
+        await resumos.aaggregate(**totais),
+        (await inventario.aaggregate(**saldo))['total'],
+        [linha async for linha in top_5_produtos],
+    )
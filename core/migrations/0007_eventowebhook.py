@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-17 19:45
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_cliente_pedidovenda_itempedidovenda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoWebhook',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=50)),
+                ('url', models.URLField(max_length=500)),
+                ('payload', models.JSONField()),
+                ('chave_deduplicacao', models.CharField(blank=True, help_text='Eventos com a mesma chave dentro da janela de deduplicação são descartados.', max_length=255)),
+                ('status', models.CharField(choices=[('PENDENTE', 'Pendente'), ('ENVIADO', 'Enviado'), ('FALHOU', 'Falhou')], default='PENDENTE', max_length=20)),
+                ('tentativas', models.PositiveIntegerField(default=0)),
+                ('proxima_tentativa', models.DateTimeField(default=django.utils.timezone.now)),
+                ('lote', models.CharField(blank=True, max_length=32)),
+                ('ultimo_erro', models.TextField(blank=True)),
+                ('data_criacao', models.DateTimeField(auto_now_add=True)),
+                ('data_envio', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Evento de Webhook',
+                'verbose_name_plural': 'Eventos de Webhook',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'proxima_tentativa'], name='core_evento_status_d28d88_idx'), models.Index(fields=['chave_deduplicacao', 'data_criacao'], name='core_evento_chave_d_77718e_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-17 19:46
+
+from django.db import migrations, models
+
+
+def preencher_abaixo_minimo(apps, schema_editor):
+    EstoqueItem = apps.get_model('core', 'EstoqueItem')
+    Produto = apps.get_model('core', 'Produto')
+    EstoqueItem.objects.update(abaixo_minimo=models.Exists(
+        Produto.objects.filter(pk=models.OuterRef('produto_id'), estoque_minimo__gte=models.OuterRef('quantidade'))
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_eventowebhook'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='estoqueitem',
+            name='abaixo_minimo',
+            field=models.BooleanField(default=False, editable=False, help_text='Mantido automaticamente: quantidade <= estoque mínimo do produto.'),
+        ),
+        migrations.AddIndex(
+            model_name='estoqueitem',
+            index=models.Index(condition=models.Q(('abaixo_minimo', True)), fields=['armazem', 'produto'], name='estoqueitem_baixo_estoque_idx'),
+        ),
+        migrations.RunPython(preencher_abaixo_minimo, migrations.RunPython.noop),
+    ]
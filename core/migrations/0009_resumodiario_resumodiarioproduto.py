@@ -0,0 +1,45 @@
+# Generated by Django 5.2.4 on 2026-10-17 19:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_estoqueitem_abaixo_minimo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(unique=True)),
+                ('total_vendas', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('total_compras', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('variacao_inventario', models.DecimalField(decimal_places=2, default=0, help_text='Variação do valor do inventário (a preço de custo) no dia.', max_digits=16)),
+            ],
+            options={
+                'verbose_name': 'Resumo Diário',
+                'verbose_name_plural': 'Resumos Diários',
+                'ordering': ['-data'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumoDiarioProduto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('quantidade_vendida', models.PositiveBigIntegerField(default=0)),
+                ('valor_vendido', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumos_diarios', to='core.produto')),
+            ],
+            options={
+                'verbose_name': 'Resumo Diário por Produto',
+                'verbose_name_plural': 'Resumos Diários por Produto',
+                'ordering': ['-data'],
+                'unique_together': {('data', 'produto')},
+            },
+        ),
+    ]
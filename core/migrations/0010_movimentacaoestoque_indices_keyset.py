@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-17 19:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_resumodiario_resumodiarioproduto'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimentacaoestoque',
+            index=models.Index(fields=['-data_movimentacao', '-id'], name='mov_data_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimentacaoestoque',
+            index=models.Index(fields=['produto', '-data_movimentacao', '-id'], name='mov_produto_data_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimentacaoestoque',
+            index=models.Index(fields=['armazem', '-data_movimentacao', '-id'], name='mov_armazem_data_id_idx'),
+        ),
+    ]
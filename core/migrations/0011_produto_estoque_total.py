@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-17 20:11
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def preencher_estoque_total(apps, schema_editor):
+    Produto = apps.get_model('core', 'Produto')
+    EstoqueItem = apps.get_model('core', 'EstoqueItem')
+    Produto.objects.update(estoque_total=Coalesce(models.Subquery(
+        EstoqueItem.objects.filter(produto_id=models.OuterRef('pk')).values('produto_id').annotate(total=models.Sum('quantidade')).values('total')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_movimentacaoestoque_indices_keyset'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produto',
+            name='estoque_total',
+            field=models.IntegerField(db_index=True, default=0, editable=False, help_text='Mantido automaticamente: soma das quantidades em todos os armazéns.'),
+        ),
+        migrations.RunPython(preencher_estoque_total, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.4 on 2026-10-17 20:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_produto_estoque_total'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservaEstoque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantidade', models.PositiveIntegerField()),
+                ('expira_em', models.DateTimeField(blank=True, help_text='Vazio para reservas firmes (pedido pago).', null=True)),
+                ('data_criacao', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Reserva de Estoque',
+                'verbose_name_plural': 'Reservas de Estoque',
+            },
+        ),
+        migrations.AddField(
+            model_name='estoqueitem',
+            name='reservado',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Quantidade retida por reservas de pedidos de venda; o disponível é quantidade - reservado.'),
+        ),
+        migrations.AddField(
+            model_name='pedidovenda',
+            name='armazem',
+            field=models.ForeignKey(blank=True, help_text='Armazém em que os itens ficam reservados até o despacho.', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='pedidos_venda', to='core.armazem'),
+        ),
+        migrations.AddConstraint(
+            model_name='estoqueitem',
+            constraint=models.CheckConstraint(condition=models.Q(('reservado', 0), ('reservado__lte', models.F('quantidade')), _connector='OR'), name='estoqueitem_reservado_lte_quantidade'),
+        ),
+        migrations.AddField(
+            model_name='reservaestoque',
+            name='armazem',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='reservas', to='core.armazem'),
+        ),
+        migrations.AddField(
+            model_name='reservaestoque',
+            name='pedido_venda',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='core.pedidovenda'),
+        ),
+        migrations.AddField(
+            model_name='reservaestoque',
+            name='produto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='reservas', to='core.produto'),
+        ),
+        migrations.AddIndex(
+            model_name='reservaestoque',
+            index=models.Index(condition=models.Q(('expira_em__isnull', False)), fields=['expira_em'], name='reserva_expira_em_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='reservaestoque',
+            unique_together={('pedido_venda', 'produto', 'armazem')},
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_reservas_estoque'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='armazem',
+            name='prioridade',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Na alocação automática por prioridade, armazéns com valor menor são usados primeiro.'),
+        ),
+    ]
@@ -0,0 +1,84 @@
+from django.db import migrations
+
+# SQLite (desenvolvimento): índice FTS5 de conteúdo externo sobre core_produto, mantido por gatilhos,
+# para que bulk_create/upserts da importação também fiquem indexados.
+SQLITE_CRIAR = [
+    """
+    CREATE VIRTUAL TABLE core_produto_busca USING fts5(
+        nome, sku, descricao, content='core_produto', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER core_produto_busca_ai AFTER INSERT ON core_produto BEGIN
+        INSERT INTO core_produto_busca(rowid, nome, sku, descricao) VALUES (new.id, new.nome, new.sku, new.descricao);
+    END
+    """,
+    """
+    CREATE TRIGGER core_produto_busca_ad AFTER DELETE ON core_produto BEGIN
+        INSERT INTO core_produto_busca(core_produto_busca, rowid, nome, sku, descricao) VALUES ('delete', old.id, old.nome, old.sku, old.descricao);
+    END
+    """,
+    """
+    CREATE TRIGGER core_produto_busca_au AFTER UPDATE OF nome, sku, descricao ON core_produto BEGIN
+        INSERT INTO core_produto_busca(core_produto_busca, rowid, nome, sku, descricao) VALUES ('delete', old.id, old.nome, old.sku, old.descricao);
+        INSERT INTO core_produto_busca(rowid, nome, sku, descricao) VALUES (new.id, new.nome, new.sku, new.descricao);
+    END
+    """,
+    "INSERT INTO core_produto_busca(core_produto_busca) VALUES ('rebuild')",
+]
+SQLITE_REMOVER = [
+    'DROP TRIGGER IF EXISTS core_produto_busca_au',
+    'DROP TRIGGER IF EXISTS core_produto_busca_ad',
+    'DROP TRIGGER IF EXISTS core_produto_busca_ai',
+    'DROP TABLE IF EXISTS core_produto_busca',
+]
+
+
+def _indices_postgres():
+    from django.contrib.postgres.indexes import GinIndex, OpClass
+    from django.contrib.postgres.search import SearchVector
+    # Precisa ser idêntico a core.busca.vetor_busca().
+    vetor = (
+        SearchVector('nome', weight='A', config='portuguese')
+        + SearchVector('sku', weight='A', config='portuguese')
+        + SearchVector('descricao', weight='C', config='portuguese')
+    )
+    return [
+        GinIndex(vetor, name='produto_busca_gin'),
+        GinIndex(OpClass('sku', name='gin_trgm_ops'), name='produto_sku_trgm'),
+    ]
+
+
+def criar_indices(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        Produto = apps.get_model('core', 'Produto')
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for indice in _indices_postgres():
+            schema_editor.add_index(Produto, indice)
+    elif vendor == 'sqlite':
+        for sql in SQLITE_CRIAR:
+            schema_editor.execute(sql)
+
+
+def remover_indices(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        Produto = apps.get_model('core', 'Produto')
+        for indice in _indices_postgres():
+            schema_editor.remove_index(Produto, indice)
+    elif vendor == 'sqlite':
+        for sql in SQLITE_REMOVER:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_armazem_prioridade'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indices, remover_indices),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.4 on 2026-10-17 20:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_busca_produtos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoteMovimentacoesCompactadas',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(help_text='Primeiro dia do mês.')),
+                ('linhas', models.PositiveIntegerField()),
+                ('conteudo', models.BinaryField()),
+                ('data_criacao', models.DateTimeField(auto_now_add=True)),
+                ('armazem', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.armazem')),
+            ],
+            options={
+                'verbose_name': 'Lote de Movimentações Compactadas',
+                'verbose_name_plural': 'Lotes de Movimentações Compactadas',
+                'ordering': ['-mes'],
+                'unique_together': {('mes', 'armazem')},
+            },
+        ),
+        migrations.CreateModel(
+            name='MovimentacaoEstoqueArquivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('quantidade', models.IntegerField()),
+                ('data_movimentacao', models.DateTimeField()),
+                ('tipo', models.CharField(choices=[('ENTRADA', 'Entrada'), ('SAIDA', 'Saida'), ('AJUSTE', 'Ajuste')], max_length=20)),
+                ('motivo', models.CharField(blank=True, max_length=255)),
+                ('armazem', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.armazem')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.produto')),
+                ('responsavel', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Movimentação de Estoque Arquivada',
+                'verbose_name_plural': 'Movimentações de Estoque Arquivadas',
+                'ordering': ['-data_movimentacao'],
+                'indexes': [models.Index(fields=['-data_movimentacao', '-id'], name='movarq_data_id_idx'), models.Index(fields=['produto', '-data_movimentacao', '-id'], name='movarq_produto_data_id_idx'), models.Index(fields=['armazem', '-data_movimentacao', '-id'], name='movarq_armazem_data_id_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumoMensalMovimentacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(help_text='Primeiro dia do mês.')),
+                ('tipo', models.CharField(choices=[('ENTRADA', 'Entrada'), ('SAIDA', 'Saida'), ('AJUSTE', 'Ajuste')], max_length=20)),
+                ('quantidade', models.IntegerField()),
+                ('movimentacoes', models.PositiveIntegerField()),
+                ('armazem', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.armazem')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.produto')),
+            ],
+            options={
+                'verbose_name': 'Resumo Mensal de Movimentações',
+                'verbose_name_plural': 'Resumos Mensais de Movimentações',
+                'ordering': ['-mes'],
+                'indexes': [models.Index(fields=['produto', '-mes'], name='resumomensal_produto_mes_idx')],
+                'unique_together': {('mes', 'produto', 'armazem', 'tipo')},
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-17 20:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_arquivo_movimentacoes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PosicaoEstoque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('momento', models.DateTimeField()),
+                ('quantidade', models.IntegerField()),
+                ('armazem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.armazem')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.produto')),
+            ],
+            options={
+                'verbose_name': 'Posição de Estoque',
+                'verbose_name_plural': 'Posições de Estoque',
+                'ordering': ['-momento'],
+                'unique_together': {('produto', 'armazem', 'momento')},
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+
+
+def _indice_postgres():
+    from django.contrib.postgres.indexes import OpClass
+    from django.db.models import Index, TextField
+    from django.db.models.functions import Cast, Upper
+    # sku__istartswith compila para UPPER("sku"::text) LIKE UPPER(...): nem o GIN do tsvector nem o de
+    # trigramas atendem esse LIKE, e o btree do unique só atende LIKE na collation "C". Este atende.
+    return Index(OpClass(Upper(Cast('sku', output_field=TextField())), name='text_pattern_ops'), name='produto_sku_prefixo')
+
+
+def criar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('core', 'Produto'), _indice_postgres())
+
+
+def remover_indice(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('core', 'Produto'), _indice_postgres())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_posicoes_estoque'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-17 21:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_produto_sku_prefixo'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='eventowebhook',
+            name='core_evento_chave_d_77718e_idx',
+        ),
+        migrations.AddField(
+            model_name='eventowebhook',
+            name='janela',
+            field=models.BigIntegerField(blank=True, help_text='Número da janela de deduplicação (segundos desde a época / WEBHOOK_JANELA_DEDUPLICACAO).', null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='eventowebhook',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'FALHOU'), _negated=True), fields=('chave_deduplicacao', 'janela'), name='evento_webhook_dedup_unico'),
+        ),
+    ]
@@ -0,0 +1,113 @@
+from django.db import migrations, models
+
+# Cada item que entra ou sai de abaixo_minimo (ou muda de armazém) soma ou subtrai 1 na linha do seu
+# armazém. Nos gatilhos, e não na aplicação: os UPDATEs de saldo calculam o indicador no próprio SQL.
+SOMAR = (
+    "INSERT INTO core_contagembaixoestoque (armazem, itens) VALUES ({armazem}, {delta}) "
+    "ON CONFLICT (armazem) DO UPDATE SET itens = core_contagembaixoestoque.itens + {delta}"
+)
+
+SQLITE_CRIAR = [
+    f"""
+    CREATE TRIGGER core_estoqueitem_baixo_ai AFTER INSERT ON core_estoqueitem WHEN new.abaixo_minimo BEGIN
+        {SOMAR.format(armazem='new.armazem_id', delta=1)};
+    END
+    """,
+    f"""
+    CREATE TRIGGER core_estoqueitem_baixo_ad AFTER DELETE ON core_estoqueitem WHEN old.abaixo_minimo BEGIN
+        {SOMAR.format(armazem='old.armazem_id', delta=-1)};
+    END
+    """,
+    f"""
+    CREATE TRIGGER core_estoqueitem_baixo_au AFTER UPDATE OF abaixo_minimo, armazem_id ON core_estoqueitem
+    WHEN old.abaixo_minimo != new.abaixo_minimo OR old.armazem_id != new.armazem_id BEGIN
+        {SOMAR.format(armazem='old.armazem_id', delta='-old.abaixo_minimo')};
+        {SOMAR.format(armazem='new.armazem_id', delta='new.abaixo_minimo')};
+    END
+    """,
+]
+SQLITE_REMOVER = [
+    'DROP TRIGGER IF EXISTS core_estoqueitem_baixo_au',
+    'DROP TRIGGER IF EXISTS core_estoqueitem_baixo_ad',
+    'DROP TRIGGER IF EXISTS core_estoqueitem_baixo_ai',
+]
+
+POSTGRES_CRIAR = [
+    f"""
+    CREATE FUNCTION core_contar_baixo_estoque() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            IF OLD.abaixo_minimo THEN
+                {SOMAR.format(armazem='OLD.armazem_id', delta=-1)};
+            END IF;
+        END IF;
+        IF TG_OP IN ('UPDATE', 'INSERT') THEN
+            IF NEW.abaixo_minimo THEN
+                {SOMAR.format(armazem='NEW.armazem_id', delta=1)};
+            END IF;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER core_estoqueitem_baixo_ai AFTER INSERT ON core_estoqueitem
+    FOR EACH ROW WHEN (NEW.abaixo_minimo) EXECUTE FUNCTION core_contar_baixo_estoque()
+    """,
+    """
+    CREATE TRIGGER core_estoqueitem_baixo_ad AFTER DELETE ON core_estoqueitem
+    FOR EACH ROW WHEN (OLD.abaixo_minimo) EXECUTE FUNCTION core_contar_baixo_estoque()
+    """,
+    """
+    CREATE TRIGGER core_estoqueitem_baixo_au AFTER UPDATE OF abaixo_minimo, armazem_id ON core_estoqueitem
+    FOR EACH ROW WHEN (OLD.abaixo_minimo IS DISTINCT FROM NEW.abaixo_minimo OR OLD.armazem_id IS DISTINCT FROM NEW.armazem_id)
+    EXECUTE FUNCTION core_contar_baixo_estoque()
+    """,
+]
+POSTGRES_REMOVER = [
+    'DROP TRIGGER IF EXISTS core_estoqueitem_baixo_au ON core_estoqueitem',
+    'DROP TRIGGER IF EXISTS core_estoqueitem_baixo_ad ON core_estoqueitem',
+    'DROP TRIGGER IF EXISTS core_estoqueitem_baixo_ai ON core_estoqueitem',
+    'DROP FUNCTION IF EXISTS core_contar_baixo_estoque()',
+]
+
+
+def criar_gatilhos(apps, schema_editor):
+    EstoqueItem = apps.get_model('core', 'EstoqueItem')
+    ContagemBaixoEstoque = apps.get_model('core', 'ContagemBaixoEstoque')
+    ContagemBaixoEstoque.objects.bulk_create(
+        ContagemBaixoEstoque(armazem=armazem, itens=itens)
+        for armazem, itens in EstoqueItem.objects.filter(abaixo_minimo=True).order_by()
+        .values_list('armazem_id').annotate(itens=models.Count('id'))
+    )
+    comandos = {'postgresql': POSTGRES_CRIAR, 'sqlite': SQLITE_CRIAR}.get(schema_editor.connection.vendor, [])
+    for sql in comandos:
+        schema_editor.execute(sql)
+
+
+def remover_gatilhos(apps, schema_editor):
+    comandos = {'postgresql': POSTGRES_REMOVER, 'sqlite': SQLITE_REMOVER}.get(schema_editor.connection.vendor, [])
+    for sql in comandos:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_eventowebhook_janela'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContagemBaixoEstoque',
+            fields=[
+                ('armazem', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('itens', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Contagem de Baixo Estoque',
+                'verbose_name_plural': 'Contagens de Baixo Estoque',
+            },
+        ),
+        migrations.RunPython(criar_gatilhos, remover_gatilhos),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_contagembaixoestoque'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MesRestaurado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(help_text='Primeiro dia do mês.', unique=True)),
+                ('data_restauracao', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Mês Restaurado',
+                'verbose_name_plural': 'Meses Restaurados',
+                'ordering': ['-mes'],
+            },
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 class Categoria(models.Model):
@@ -43,6 +44,7 @@ class Produto(models.Model):
     unidade_medida = models.CharField(max_length=20, default='unidade', help_text='Ex: unidade, kg, litro, metro.')
     estoque_minimo = models.PositiveIntegerField(default=0, help_text="Quantidade mínima em estoque para gerar um alerta.")
     unididade_minimo = models.PositiveIntegerField(default=0, help_text='Quantidade mínima em estoque para gerar um alerta.')
+    estoque_total = models.IntegerField(default=0, db_index=True, editable=False, help_text='Mantido automaticamente: soma das quantidades em todos os armazéns.')
 
     data_criacao = models.DateTimeField(auto_now_add=True)
     data_atualizaçao = models.DateTimeField(auto_now=True)
@@ -58,6 +60,7 @@ class Produto(models.Model):
 class Armazem(models.Model):
     nome = models.CharField(max_length=100, unique=True)
     localizacao = models.CharField(max_length=255, blank=True)
+    prioridade = models.PositiveSmallIntegerField(default=0, help_text='Na alocação automática por prioridade, armazéns com valor menor são usados primeiro.')
 
     class Meta:
         verbose_name = "Armazém"
@@ -71,15 +74,45 @@ class EstoqueItem(models.Model):
     produto = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='itens_de_estoque')
     armazem = models.ForeignKey(Armazem, on_delete=models.CASCADE, related_name='itens_de_estoque')
     quantidade = models.IntegerField(default=0)
+    abaixo_minimo = models.BooleanField(default=False, editable=False, help_text='Mantido automaticamente: quantidade <= estoque mínimo do produto.')
+    reservado = models.PositiveIntegerField(default=0, editable=False, help_text='Quantidade retida por reservas de pedidos de venda; o disponível é quantidade - reservado.')
 
     class Meta:
         unique_together = ('produto', 'armazem')
         verbose_name = "Item de Estoque"
         verbose_name_plural = "Itens de Estoques"
+        indexes = [
+            models.Index(fields=['armazem', 'produto'], condition=models.Q(abaixo_minimo=True), name='estoqueitem_baixo_estoque_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(condition=models.Q(reservado=0) | models.Q(reservado__lte=models.F('quantidade')), name='estoqueitem_reservado_lte_quantidade'),
+        ]
 
     def __str__(self):
         return f"{self.produto.sku} em {self.armazem.nome}: {self.quantidade}"
 
+class ContagemBaixoEstoque(models.Model):
+    # Mantida por gatilhos no banco (migração 0019) a cada item que entra ou sai de abaixo_minimo,
+    # qualquer que seja o caminho de escrita. Uma linha por armazém, sem FK: a exclusão em cascata
+    # de um armazém não conflita com os gatilhos dos seus itens.
+    armazem = models.BigIntegerField(primary_key=True)
+    itens = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Contagem de Baixo Estoque'
+        verbose_name_plural = 'Contagens de Baixo Estoque'
+
+    @classmethod
+    def total(cls):
+        return cls.objects.aggregate(total=models.Sum('itens'))['total'] or 0
+
+    @classmethod
+    async def atotal(cls):
+        return (await cls.objects.aaggregate(total=models.Sum('itens')))['total'] or 0
+
+    def __str__(self):
+        return f"Armazém {self.armazem}: {self.itens} itens abaixo do mínimo"
+
 class MovimentacaoEstoque(models.Model):
     TIPO_MOVIMENTACAO = (
         ('ENTRADA', 'Entrada'),
@@ -99,10 +132,104 @@ class MovimentacaoEstoque(models.Model):
         verbose_name = 'Movimentação de Estoque'
         verbose_name_plural = 'Movimentações de Estoque'
         ordering = ['-data_movimentacao']
+        indexes = [
+            models.Index(fields=['-data_movimentacao', '-id'], name='mov_data_id_idx'),
+            models.Index(fields=['produto', '-data_movimentacao', '-id'], name='mov_produto_data_id_idx'),
+            models.Index(fields=['armazem', '-data_movimentacao', '-id'], name='mov_armazem_data_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.tipo} de {self.quantidade} x {self.produto.sku}"
     
+class MovimentacaoEstoqueArquivada(models.Model):
+    """
+    Movimentações fora da janela quente, movidas de MovimentacaoEstoque (com o mesmo id)
+    pelo comando arquivar_movimentacoes. Toda linha aqui é mais antiga que qualquer linha
+    da tabela quente, o que permite paginar as duas em sequência.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    produto = models.ForeignKey(Produto, on_delete=models.PROTECT, related_name='+')
+    armazem = models.ForeignKey(Armazem, on_delete=models.PROTECT, related_name='+')
+    quantidade = models.IntegerField()
+    data_movimentacao = models.DateTimeField()
+    responsavel = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    tipo = models.CharField(max_length=20, choices=MovimentacaoEstoque.TIPO_MOVIMENTACAO)
+    motivo = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        verbose_name = 'Movimentação de Estoque Arquivada'
+        verbose_name_plural = 'Movimentações de Estoque Arquivadas'
+        ordering = ['-data_movimentacao']
+        indexes = [
+            models.Index(fields=['-data_movimentacao', '-id'], name='movarq_data_id_idx'),
+            models.Index(fields=['produto', '-data_movimentacao', '-id'], name='movarq_produto_data_id_idx'),
+            models.Index(fields=['armazem', '-data_movimentacao', '-id'], name='movarq_armazem_data_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} de {self.quantidade} (arquivada)"
+
+class ResumoMensalMovimentacao(models.Model):
+    """Totais por mês, produto, armazém e tipo dos meses compactados (o detalhe fica em LoteMovimentacoesCompactadas)."""
+    mes = models.DateField(help_text='Primeiro dia do mês.')
+    produto = models.ForeignKey(Produto, on_delete=models.PROTECT, related_name='+')
+    armazem = models.ForeignKey(Armazem, on_delete=models.PROTECT, related_name='+')
+    tipo = models.CharField(max_length=20, choices=MovimentacaoEstoque.TIPO_MOVIMENTACAO)
+    quantidade = models.IntegerField()
+    movimentacoes = models.PositiveIntegerField()
+
+    class Meta:
+        verbose_name = 'Resumo Mensal de Movimentações'
+        verbose_name_plural = 'Resumos Mensais de Movimentações'
+        ordering = ['-mes']
+        unique_together = ('mes', 'produto', 'armazem', 'tipo')
+        indexes = [models.Index(fields=['produto', '-mes'], name='resumomensal_produto_mes_idx')]
+
+class LoteMovimentacoesCompactadas(models.Model):
+    """Detalhe de um mês compactado de um armazém: NDJSON comprimido com gzip, restaurável pelo comando."""
+    mes = models.DateField(help_text='Primeiro dia do mês.')
+    armazem = models.ForeignKey(Armazem, on_delete=models.PROTECT, related_name='+')
+    linhas = models.PositiveIntegerField()
+    conteudo = models.BinaryField()
+    data_criacao = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Lote de Movimentações Compactadas'
+        verbose_name_plural = 'Lotes de Movimentações Compactadas'
+        ordering = ['-mes']
+        unique_together = ('mes', 'armazem')
+
+class MesRestaurado(models.Model):
+    """Mês descomprimido de volta para o arquivo: fica fora da compactação periódica até ser recompactado pelo comando."""
+    mes = models.DateField(unique=True, help_text='Primeiro dia do mês.')
+    data_restauracao = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Mês Restaurado'
+        verbose_name_plural = 'Meses Restaurados'
+        ordering = ['-mes']
+
+class PosicaoEstoque(models.Model):
+    """
+    Checkpoint da quantidade de um item de estoque: a soma das movimentações anteriores a
+    `momento`. Gravado pelo comando registrar_posicoes_estoque só quando a quantidade mudou
+    desde o checkpoint anterior (e ao menos uma vez por mês), e usado por core.posicoes
+    como ponto de partida das consultas "estoque em uma data".
+    """
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='+')
+    armazem = models.ForeignKey(Armazem, on_delete=models.CASCADE, related_name='+')
+    momento = models.DateTimeField()
+    quantidade = models.IntegerField()
+
+    class Meta:
+        verbose_name = 'Posição de Estoque'
+        verbose_name_plural = 'Posições de Estoque'
+        ordering = ['-momento']
+        unique_together = ('produto', 'armazem', 'momento')
+
+    def __str__(self):
+        return f"{self.produto_id} em {self.armazem_id} até {self.momento}: {self.quantidade}"
+
 class PedidoCompra(models.Model):
     STATUS_PEDIDO = (
         ('PENDENTE', 'Pendente'),
@@ -161,6 +288,7 @@ class PedidoVenda(models.Model):
     data_pedido = models.DateTimeField(auto_now_add=True)
     data_despacho = models.DateTimeField(null=True, blank=True)
     responsavel_venda = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='vendas_realizadas')
+    armazem = models.ForeignKey(Armazem, on_delete=models.PROTECT, null=True, blank=True, related_name='pedidos_venda', help_text='Armazém em que os itens ficam reservados até o despacho.')
     
     class Meta:
         ordering = ['-data_pedido']
@@ -177,4 +305,94 @@ class ItemPedidoVenda(models.Model):
     preco_unitario = models.DecimalField(max_digits=10, decimal_places=2, help_text="Preço de venda do produto no momento da venda.")
 
     def __str__(self):
-        return f"{self.quantidade} x {self.produto.nome} na Venda #{self.pedido_venda.id}"
\ No newline at end of file
+        return f"{self.quantidade} x {self.produto.nome} na Venda #{self.pedido_venda.id}"
+
+
+class ReservaEstoque(models.Model):
+    pedido_venda = models.ForeignKey(PedidoVenda, on_delete=models.CASCADE, related_name='reservas')
+    produto = models.ForeignKey(Produto, on_delete=models.PROTECT, related_name='reservas')
+    armazem = models.ForeignKey(Armazem, on_delete=models.PROTECT, related_name='reservas')
+    quantidade = models.PositiveIntegerField()
+    expira_em = models.DateTimeField(null=True, blank=True, help_text='Vazio para reservas firmes (pedido pago).')
+    data_criacao = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Reserva de Estoque'
+        verbose_name_plural = 'Reservas de Estoque'
+        unique_together = ('pedido_venda', 'produto', 'armazem')
+        indexes = [
+            models.Index(fields=['expira_em'], condition=models.Q(expira_em__isnull=False), name='reserva_expira_em_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantidade} x {self.produto_id} reservados para a Venda #{self.pedido_venda_id}"
+
+
+class EventoWebhook(models.Model):
+    STATUS_EVENTO = (
+        ('PENDENTE', 'Pendente'),
+        ('ENVIADO', 'Enviado'),
+        ('FALHOU', 'Falhou'),
+    )
+
+    tipo = models.CharField(max_length=50)
+    url = models.URLField(max_length=500)
+    payload = models.JSONField()
+    chave_deduplicacao = models.CharField(max_length=255, blank=True, help_text='Eventos com a mesma chave dentro da janela de deduplicação são descartados.')
+    janela = models.BigIntegerField(null=True, blank=True, help_text='Número da janela de deduplicação (segundos desde a época / WEBHOOK_JANELA_DEDUPLICACAO).')
+    status = models.CharField(max_length=20, choices=STATUS_EVENTO, default='PENDENTE')
+    tentativas = models.PositiveIntegerField(default=0)
+    proxima_tentativa = models.DateTimeField(default=timezone.now)
+    lote = models.CharField(max_length=32, blank=True)
+    ultimo_erro = models.TextField(blank=True)
+    data_criacao = models.DateTimeField(auto_now_add=True)
+    data_envio = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Evento de Webhook'
+        verbose_name_plural = 'Eventos de Webhook'
+        indexes = [
+            models.Index(fields=['status', 'proxima_tentativa']),
+        ]
+        constraints = [
+            # Uma chave por janela: transações concorrentes não enfileiram o mesmo alerta duas vezes.
+            # Eventos que falharam saem da restrição e não impedem um novo alerta.
+            models.UniqueConstraint(
+                fields=['chave_deduplicacao', 'janela'],
+                condition=~models.Q(status='FALHOU'),
+                name='evento_webhook_dedup_unico',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} #{self.id} ({self.status})"
+
+class ResumoDiario(models.Model):
+    data = models.DateField(unique=True)
+    total_vendas = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    total_compras = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    variacao_inventario = models.DecimalField(max_digits=16, decimal_places=2, default=0, help_text='Variação do valor do inventário (a preço de custo) no dia.')
+
+    class Meta:
+        ordering = ['-data']
+        verbose_name = 'Resumo Diário'
+        verbose_name_plural = 'Resumos Diários'
+
+    def __str__(self):
+        return f"Resumo de {self.data}"
+
+class ResumoDiarioProduto(models.Model):
+    data = models.DateField()
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='resumos_diarios')
+    quantidade_vendida = models.PositiveBigIntegerField(default=0)
+    valor_vendido = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('data', 'produto')
+        ordering = ['-data']
+        verbose_name = 'Resumo Diário por Produto'
+        verbose_name_plural = 'Resumos Diários por Produto'
+
+    def __str__(self):
+        return f"{self.produto_id} em {self.data}: {self.quantidade_vendida}"
@@ -0,0 +1,113 @@
+import base64
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class PaginacaoPadrao(PageNumberPagination):
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'PAGINACAO_TAMANHO_MAXIMO', 500)
+
+
+class PaginacaoKeyset(BasePagination):
+    """
+    Paginação por cursor (keyset) em ordem decrescente de (campo_ordenacao, id).
+
+    Cada página é um WHERE (data, id) < (cursor) ORDER BY data DESC, id DESC LIMIT n,
+    resolvido pelo índice composto correspondente: o custo de uma página não cresce
+    com a profundidade, ao contrário de OFFSET. Só há navegação para frente.
+
+    Aceita também uma lista de querysets (camadas, ex.: tabela quente e arquivo) em que
+    cada camada só tem linhas mais antigas que as da anterior; a página continua na
+    camada seguinte quando a atual se esgota.
+    """
+    campo_ordenacao = None
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    mensagem_cursor_invalido = 'Cursor inválido.'
+
+    def get_page_size(self, request):
+        try:
+            tamanho = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(tamanho, 1), self.max_page_size)
+
+    def _decodificar_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            valor, pk = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').rsplit('|', 1)
+            valor = parse_datetime(valor)
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise ValidationError({self.cursor_query_param: self.mensagem_cursor_invalido})
+        if valor is None:
+            raise ValidationError({self.cursor_query_param: self.mensagem_cursor_invalido})
+        return valor, pk
+
+    def _codificar_cursor(self, objeto):
+        # Instâncias ou linhas de values() (leitura rápida).
+        if isinstance(objeto, dict):
+            valor, pk = objeto[self.campo_ordenacao], objeto['id']
+        else:
+            valor, pk = getattr(objeto, self.campo_ordenacao), objeto.pk
+        return base64.urlsafe_b64encode(f"{valor.isoformat()}|{pk}".encode('utf-8')).decode('ascii')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        tamanho = self.get_page_size(request)
+        campo = self.campo_ordenacao
+
+        cursor = self._decodificar_cursor(request)
+        resultados = []
+        for camada in queryset if isinstance(queryset, (list, tuple)) else [queryset]:
+            camada = camada.order_by(f'-{campo}', '-id')
+            if cursor is not None:
+                valor, pk = cursor
+                # O primeiro termo (campo <= valor) dá ao banco um limite de faixa no índice; o OR desempata por id.
+                camada = camada.filter(Q(**{f'{campo}__lte': valor}) & (Q(**{f'{campo}__lt': valor}) | Q(id__lt=pk)))
+            resultados += camada[:tamanho + 1 - len(resultados)]
+            if len(resultados) > tamanho:
+                break
+
+        self.proximo = self._codificar_cursor(resultados[tamanho - 1]) if len(resultados) > tamanho else None
+        return resultados[:tamanho]
+
+    def get_next_link(self):
+        if self.proximo is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.proximo)
+
+    def get_first_link(self):
+        return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'first': self.get_first_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'first': {'type': 'string', 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class PaginacaoMovimentacoes(PaginacaoKeyset):
+    campo_ordenacao = 'data_movimentacao'
@@ -1,5 +1,41 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 from rest_framework.permissions import BasePermission
 
+GRUPO_GERENTES = 'Gerentes'
+
+
+def _chave_papeis(usuario_id):
+    return f'papeis:usuario:{usuario_id}'
+
+
+def papeis_do_usuario(usuario):
+    """
+    Nomes dos grupos do usuário, lidos do cache (e memorizados na requisição).
+
+    O cache é invalidado pelos sinais de core.signals quando os grupos do usuário mudam;
+    o TTL (PAPEIS_CACHE_TIMEOUT) limita a defasagem quando o backend de cache não é
+    compartilhado entre processos.
+    """
+    papeis = getattr(usuario, '_papeis', None)
+    if papeis is None:
+        chave = _chave_papeis(usuario.pk)
+        papeis = cache.get(chave)
+        if papeis is None:
+            papeis = frozenset(usuario.groups.values_list('name', flat=True))
+            cache.set(chave, papeis, getattr(settings, 'PAPEIS_CACHE_TIMEOUT', 300))
+        usuario._papeis = papeis
+    return papeis
+
+
+def invalidar_papeis(usuario_ids):
+    # Após o commit: invalidado antes, uma leitura concorrente guardaria de novo os papéis antigos até o TTL.
+    chaves = [_chave_papeis(usuario_id) for usuario_id in usuario_ids]
+    if chaves:
+        transaction.on_commit(lambda: cache.delete_many(chaves))
+
+
 class IsGerente(BasePermission):
     def has_permission(self, request, view):
-        return request.user and request.user.is_authenticated and request.user.groups.filter(name='Gerentes').exists()
\ No newline at end of file
+        return bool(request.user and request.user.is_authenticated and GRUPO_GERENTES in papeis_do_usuario(request.user))
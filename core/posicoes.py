@@ -0,0 +1,163 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db import transaction
+from django.db.models import DateTimeField, F, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .arquivamento import inicio_do_mes
+from .models import EstoqueItem, LoteMovimentacoesCompactadas, MovimentacaoEstoque, MovimentacaoEstoqueArquivada, PosicaoEstoque, ResumoMensalMovimentacao
+
+TAMANHO_LOTE_POSICOES = 2000
+_INICIO = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class DetalheCompactado(Exception):
+    def __init__(self, mes):
+        super().__init__(
+            f"As movimentações de {mes:%Y-%m} estão compactadas. "
+            f"Restaure o mês com 'arquivar_movimentacoes --restaurar {mes:%Y-%m}' para consultar este período."
+        )
+        self.mes = mes
+
+
+def fim_do_dia(data):
+    """Momento que fecha o dia `data`: meia-noite (local) do dia seguinte."""
+    return timezone.make_aware(datetime.combine(data + timedelta(days=1), datetime.min.time()))
+
+
+def _soma_movimentacoes(**filtros):
+    """Soma das movimentações do item (tabela quente + arquivo) que atendem aos filtros, como expressão correlacionada."""
+    total = Value(0)
+    for modelo in (MovimentacaoEstoque, MovimentacaoEstoqueArquivada):
+        soma = modelo.objects.filter(
+            produto_id=OuterRef('produto_id'), armazem_id=OuterRef('armazem_id'), **filtros
+        ).order_by().values('produto_id').annotate(total=Sum('quantidade')).values('total')
+        total = total + Coalesce(Subquery(soma, output_field=IntegerField()), 0)
+    return total
+
+
+def _checkpoints(**filtros):
+    return PosicaoEstoque.objects.filter(produto_id=OuterRef('produto_id'), armazem_id=OuterRef('armazem_id'), **filtros).order_by('-momento')
+
+
+def conferir_detalhe(desde, alvo):
+    """Levanta DetalheCompactado se algum mês entre `desde` (None = início) e `alvo` já foi compactado."""
+    lotes = LoteMovimentacoesCompactadas.objects.filter(mes__lt=timezone.localtime(alvo).date())
+    if desde is not None:
+        lotes = lotes.filter(mes__gte=inicio_do_mes(referencia=desde).date())
+    mes = lotes.order_by('mes').values_list('mes', flat=True).first()
+    if mes is not None:
+        raise DetalheCompactado(mes)
+
+
+def _meses_compactados(alvo):
+    """[(início, fim)] dos meses compactados que começam antes de `alvo`, em ordem."""
+    meses = []
+    for mes in LoteMovimentacoesCompactadas.objects.order_by('mes').values_list('mes', flat=True).distinct():
+        inicio = timezone.make_aware(datetime(mes.year, mes.month, 1))
+        if inicio >= alvo:
+            break
+        meses.append((inicio, inicio_do_mes(-1, inicio)))
+    return meses
+
+
+def _sem_checkpoints_dentro(meses):
+    """Exclui os checkpoints no meio de um mês compactado: de lá até o fim do mês não há detalhe para somar."""
+    condicao, faixa = Q(), None
+    for inicio, fim in meses + [(None, None)]:
+        if faixa and faixa[1] == inicio:
+            faixa = (faixa[0], fim)
+            continue
+        if faixa:
+            condicao |= Q(momento__gt=faixa[0], momento__lt=faixa[1])
+        faixa = (inicio, fim)
+    return condicao
+
+
+def posicoes_em(alvo, itens=None):
+    """
+    Quantidade de cada item de estoque (por padrão, todos) em `alvo`: a soma das
+    movimentações anteriores a `alvo`. Parte do checkpoint mais recente de cada item e
+    soma só as movimentações entre ele e `alvo`, em vez de reprocessar todo o histórico;
+    itens sem checkpoint são somados desde o início.
+
+    Os itens são agrupados pelo momento do checkpoint (poucos valores distintos, já que os
+    checkpoints são diários) e cada grupo soma o seu intervalo em uma consulta agrupada por
+    tabela, sem subconsultas correlacionadas por movimentação. O arquivo só é lido quando o
+    intervalo o alcança. Meses compactados inteiros no intervalo entram pelos totais de
+    ResumoMensalMovimentacao; só um `alvo` no meio de um mês compactado levanta
+    DetalheCompactado. Retorna [{'produto_id', 'armazem_id', 'quantidade'}] ordenado por
+    armazém e produto.
+    """
+    compactados = _meses_compactados(alvo)
+    for inicio, fim in compactados:
+        if alvo < fim:
+            raise DetalheCompactado(inicio.date())
+
+    itens = EstoqueItem.objects.all() if itens is None else itens
+    checkpoints = _checkpoints(momento__lte=alvo).exclude(_sem_checkpoints_dentro(compactados))
+    linhas = list(itens.annotate(
+        base_momento=Subquery(checkpoints.values('momento')[:1], output_field=DateTimeField()),
+        base_quantidade=Subquery(checkpoints.values('quantidade')[:1], output_field=IntegerField()),
+    ).order_by('armazem_id', 'produto_id').values_list('produto_id', 'armazem_id', 'base_momento', 'base_quantidade'))
+    if not linhas:
+        return []
+
+    quantidades, por_base = {}, {}
+    for produto_id, armazem_id, base, quantidade in linhas:
+        quantidades[(produto_id, armazem_id)] = quantidade or 0
+        por_base.setdefault(base or _INICIO, []).append((produto_id, armazem_id))
+    fim_do_arquivo = MovimentacaoEstoqueArquivada.objects.aggregate(fim=Max('data_movimentacao'))['fim']
+
+    for base, chaves in por_base.items():
+        modelos = [MovimentacaoEstoque] if fim_do_arquivo is None or fim_do_arquivo < base else [MovimentacaoEstoque, MovimentacaoEstoqueArquivada]
+        # Sem checkpoint dentro de um mês compactado, cada mês compactado do intervalo está inteiro nele.
+        meses = [inicio.date() for inicio, _ in compactados if inicio >= base]
+        for inicio in range(0, len(chaves), TAMANHO_LOTE_POSICOES):
+            parte = set(chaves[inicio:inicio + TAMANHO_LOTE_POSICOES])
+            filtros = {'produto_id__in': {produto_id for produto_id, _ in parte}, 'armazem_id__in': {armazem_id for _, armazem_id in parte}}
+            consultas = [
+                modelo.objects.filter(**filtros, data_movimentacao__gte=base, data_movimentacao__lt=alvo)
+                for modelo in modelos
+            ]
+            if meses:
+                consultas.append(ResumoMensalMovimentacao.objects.filter(**filtros, mes__in=meses))
+            for consulta in consultas:
+                somas = consulta.order_by().values('produto_id', 'armazem_id').annotate(total=Sum('quantidade')).values_list('produto_id', 'armazem_id', 'total')
+                for produto_id, armazem_id, total in somas:
+                    # O filtro por produto e por armazém também traz combinações de outros grupos.
+                    if (produto_id, armazem_id) in parte:
+                        quantidades[(produto_id, armazem_id)] += total
+    return [{'produto_id': produto_id, 'armazem_id': armazem_id, 'quantidade': quantidade} for (produto_id, armazem_id), quantidade in quantidades.items()]
+
+
+def registrar_posicoes(momento, tamanho_lote=TAMANHO_LOTE_POSICOES):
+    """
+    Grava o checkpoint de `momento` para os itens cuja quantidade mudou desde o anterior (ou
+    que não têm checkpoint neste mês). A quantidade vem do saldo atual menos as movimentações
+    a partir de `momento` (lidos na mesma consulta), e não de uma soma do histórico. Retorna quantos gravou.
+    """
+    conferir_detalhe(momento, timezone.now())
+    anteriores = _checkpoints(momento__lt=momento)
+    itens = EstoqueItem.objects.annotate(
+        quantidade_em=F('quantidade') - _soma_movimentacoes(data_movimentacao__gte=momento),
+        ultima_quantidade=Subquery(anteriores.values('quantidade')[:1], output_field=IntegerField()),
+        ultimo_momento=Subquery(anteriores.values('momento')[:1], output_field=DateTimeField()),
+    ).order_by('id').values_list('id', 'produto_id', 'armazem_id', 'quantidade_em', 'ultima_quantidade', 'ultimo_momento')
+
+    mes = inicio_do_mes(referencia=momento)
+    total, ultimo_id = 0, 0
+    with transaction.atomic():
+        while True:
+            lote = list(itens.filter(id__gt=ultimo_id)[:tamanho_lote])
+            if not lote:
+                return total
+            ultimo_id = lote[-1][0]
+            posicoes = [
+                PosicaoEstoque(produto_id=produto_id, armazem_id=armazem_id, momento=momento, quantidade=quantidade)
+                for _, produto_id, armazem_id, quantidade, ultima_quantidade, ultimo_momento in lote
+                if ultimo_momento is None or ultimo_momento < mes or ultima_quantidade != quantidade
+            ]
+            PosicaoEstoque.objects.bulk_create(
+                posicoes, update_conflicts=True, unique_fields=['produto', 'armazem', 'momento'], update_fields=['quantidade']
+            )
+            total += len(posicoes)
@@ -0,0 +1,143 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Case, When, Value, IntegerField
+from django.utils import timezone
+from .models import EstoqueItem, ReservaEstoque
+from .services import EstoqueInsuficiente, _ordenar_linhas, _por_produto, registrar_saidas_pedido
+
+
+def _validade():
+    return timezone.now() + timedelta(minutes=getattr(settings, 'RESERVA_VALIDADE_MINUTOS', 30))
+
+
+def _linhas_do_pedido(pedido):
+    return _ordenar_linhas(pedido.itens.values_list('produto_id', 'quantidade'))
+
+
+def _liberar(reservas, pular_travadas=False):
+    """Devolve ao disponível as reservas do queryset e as apaga. Retorna quantas foram liberadas."""
+    linhas = list(reservas.select_for_update(skip_locked=pular_travadas).values_list('id', 'produto_id', 'armazem_id', 'quantidade'))
+    if not linhas:
+        return 0
+
+    por_item = {}
+    for _, produto_id, armazem_id, quantidade in linhas:
+        por_item[(produto_id, armazem_id)] = por_item.get((produto_id, armazem_id), 0) + quantidade
+    condicao = Q()
+    for produto_id, armazem_id in por_item:
+        condicao |= Q(produto_id=produto_id, armazem_id=armazem_id)
+
+    # Mesma ordem de travamento das reservas e baixas (por produto), para não haver deadlock.
+    list(EstoqueItem.objects.select_for_update().filter(condicao).order_by('produto_id', 'armazem_id').values_list('id', flat=True))
+    EstoqueItem.objects.filter(condicao).update(reservado=F('reservado') - Case(
+        *[When(produto_id=produto_id, armazem_id=armazem_id, then=Value(quantidade)) for (produto_id, armazem_id), quantidade in por_item.items()],
+        default=Value(0),
+        output_field=IntegerField()
+    ))
+    ReservaEstoque.objects.filter(id__in=[linha[0] for linha in linhas]).delete()
+    return len(linhas)
+
+
+def reservar_pedido(pedido, firme=False):
+    """
+    Reserva as linhas do pedido no armazém do pedido, numa transação e com um número
+    fixo de consultas: os itens são travados em ordem de produto, o disponível
+    (quantidade - reservado) é conferido em memória e um único UPDATE condicional soma
+    as quantidades a `reservado`. Reservas firmes não expiram; as demais valem
+    RESERVA_VALIDADE_MINUTOS. Levanta EstoqueItem.DoesNotExist ou EstoqueInsuficiente,
+    e nesse caso nada fica reservado.
+    """
+    if pedido.armazem_id is None:
+        return
+    linhas = _linhas_do_pedido(pedido)
+    if not linhas:
+        return
+    armazem_id = pedido.armazem_id
+    produto_ids = [produto_id for produto_id, _ in linhas]
+
+    with transaction.atomic():
+        # Reservas vencidas destes itens não devem bloquear a nova, mesmo que a varredura ainda não tenha passado.
+        _liberar(ReservaEstoque.objects.filter(armazem_id=armazem_id, produto_id__in=produto_ids, expira_em__lte=timezone.now()), pular_travadas=True)
+
+        disponiveis = {
+            produto_id: quantidade - reservado
+            for produto_id, quantidade, reservado in EstoqueItem.objects.select_for_update().filter(
+                armazem_id=armazem_id, produto_id__in=produto_ids
+            ).order_by('produto_id').values_list('produto_id', 'quantidade', 'reservado')
+        }
+        for produto_id, quantidade in linhas:
+            if produto_id not in disponiveis:
+                raise EstoqueItem.DoesNotExist('Um dos produtos não existe no estoque do armazém informado')
+            if disponiveis[produto_id] < quantidade:
+                raise EstoqueInsuficiente(produto_id, armazem_id)
+
+        condicao = Q()
+        for produto_id, quantidade in linhas:
+            condicao |= Q(produto_id=produto_id, quantidade__gte=F('reservado') + quantidade)
+        atualizados = EstoqueItem.objects.filter(condicao, armazem_id=armazem_id).update(
+            reservado=F('reservado') + _por_produto(linhas, 'produto_id')
+        )
+        if atualizados != len(linhas):
+            raise EstoqueInsuficiente(None, armazem_id)
+
+        expira_em = None if firme else _validade()
+        ReservaEstoque.objects.bulk_create([
+            ReservaEstoque(pedido_venda=pedido, produto_id=produto_id, armazem_id=armazem_id, quantidade=quantidade, expira_em=expira_em)
+            for produto_id, quantidade in linhas
+        ])
+
+
+def liberar_reservas(pedido):
+    with transaction.atomic():
+        return _liberar(pedido.reservas.all())
+
+
+def confirmar_reservas(pedido):
+    """
+    Torna firmes as reservas de um pedido pago. Se expiraram ou não cobrem mais os
+    itens, o pedido é reservado de novo (podendo levantar EstoqueInsuficiente).
+    """
+    with transaction.atomic():
+        reservas = list(pedido.reservas.select_for_update().values_list('produto_id', 'armazem_id', 'quantidade', 'expira_em'))
+        agora = timezone.now()
+        vigentes = (
+            all(armazem_id == pedido.armazem_id and (expira_em is None or expira_em > agora) for _, armazem_id, _, expira_em in reservas)
+            and sorted((produto_id, quantidade) for produto_id, _, quantidade, _ in reservas) == _linhas_do_pedido(pedido)
+        )
+        if vigentes:
+            pedido.reservas.update(expira_em=None)
+        else:
+            _liberar(pedido.reservas.all())
+            reservar_pedido(pedido, firme=True)
+
+
+def desconfirmar_reservas(pedido):
+    """Pedido que deixou de estar pago: as reservas firmes voltam a vencer em RESERVA_VALIDADE_MINUTOS."""
+    return pedido.reservas.filter(expira_em__isnull=True).update(expira_em=_validade())
+
+
+def consumir_reservas(pedido, responsavel, motivo):
+    """
+    Baixa o estoque de um pedido a partir das suas reservas, sem nova checagem de
+    disponibilidade. Retorna {armazem_id: {produto_id: saldo}} (vazio se o pedido
+    não tem reservas).
+    """
+    with transaction.atomic():
+        por_armazem = {}
+        for produto_id, armazem_id, quantidade in pedido.reservas.select_for_update().order_by('armazem_id', 'produto_id').values_list('produto_id', 'armazem_id', 'quantidade'):
+            por_armazem.setdefault(armazem_id, []).append((produto_id, quantidade))
+        saldos = {
+            armazem_id: registrar_saidas_pedido(linhas, armazem_id, responsavel, motivo, reservado=True)
+            for armazem_id, linhas in por_armazem.items()
+        }
+        if saldos:
+            pedido.reservas.all().delete()
+    return saldos
+
+
+def liberar_reservas_expiradas(limite=1000):
+    """Varredura das reservas vencidas. Linhas travadas por outra transação ficam para a próxima passada."""
+    with transaction.atomic():
+        vencidas = ReservaEstoque.objects.filter(expira_em__lte=timezone.now()).order_by('expira_em')[:limite]
+        return _liberar(vencidas, pular_travadas=True)
@@ -1,17 +1,29 @@
+from django.db import transaction
 from rest_framework import serializers
-from .models import Categoria, Fornecedor, Produto, Armazem, EstoqueItem, MovimentacaoEstoque, PedidoCompra, ItemPedidoCompra, Cliente, PedidoVenda, ItemPedidoVenda
+from .campos import CamposDinamicosMixin
+from .models import Categoria, Fornecedor, Produto, Armazem, EstoqueItem, MovimentacaoEstoque, PedidoCompra, ItemPedidoCompra, Cliente, PedidoVenda, ItemPedidoVenda, ReservaEstoque
+from .reservas import confirmar_reservas, desconfirmar_reservas, liberar_reservas, reservar_pedido
+from .services import EstoqueInsuficiente
 
-class CategoriaSerializer(serializers.ModelSerializer):
+class CategoriaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Categoria
         fields = ['id', 'nome', 'descricao']
 
-class ForncedorSerializer(serializers.ModelSerializer):
+class ForncedorSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Fornecedor
         fields = '__all__'
 
-class ProdutoSerializer(serializers.ModelSerializer):
+def estoque_por_armazem_dos_produtos(produto_ids):
+    # Mesma representação de ProdutoSerializer.get_estoque_por_armazem, em uma consulta para a página inteira.
+    estoque = {produto_id: [] for produto_id in produto_ids}
+    itens = EstoqueItem.objects.filter(produto_id__in=produto_ids).order_by('armazem_id').values_list('produto_id', 'armazem_id', 'quantidade')
+    for produto_id, armazem_id, quantidade in itens:
+        estoque[produto_id].append({'armazem': armazem_id, 'quantidade': quantidade})
+    return estoque
+
+class ProdutoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     categoria = serializers.StringRelatedField(read_only=True)
     categoria_id = serializers.PrimaryKeyRelatedField(
         queryset=Categoria.objects.all(), source='categoria', write_only=True
@@ -22,6 +34,11 @@ class ProdutoSerializer(serializers.ModelSerializer):
         queryset=Fornecedor.objects.all(), source='fornecedor', write_only=True, required=False
     )
 
+    estoque_por_armazem = serializers.SerializerMethodField()
+    dependencias = {'estoque_por_armazem': ['itens_de_estoque']}
+    fontes_rapidas = {'categoria': 'categoria__nome', 'fornecedor': 'fornecedor__nome_fantasia'}
+    relacionados_rapidos = {'estoque_por_armazem': estoque_por_armazem_dos_produtos}
+
     class Meta:
         model = Produto
         fields = [
@@ -37,29 +54,48 @@ class ProdutoSerializer(serializers.ModelSerializer):
             'preco_venda',
             'unidade_medida',
             'estoque_minimo',
+            'estoque_total',
+            'estoque_por_armazem',
             'data_criacao'
         ]
         read_only_fields = ['data_criacao']
 
-class ArmazemSerializer(serializers.ModelSerializer):
+    def get_estoque_por_armazem(self, obj):
+        return [{'armazem': item.armazem_id, 'quantidade': item.quantidade} for item in obj.itens_de_estoque.all()]
+
+class ArmazemSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Armazem
         fields = '__all__'
 
-class EstoqueItemSerializer(serializers.ModelSerializer):
+class ProdutoResumoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Produto
+        fields = ['id', 'nome', 'sku', 'preco_venda', 'unidade_medida', 'estoque_minimo']
+
+class ArmazemResumoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Armazem
+        fields = ['id', 'nome']
+
+class EstoqueItemSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    # Plano por padrão (ids das relações); ?expand=produto,armazem traz os resumos aninhados.
+    expansoes = {'produto': ProdutoResumoSerializer, 'armazem': ArmazemResumoSerializer}
+
     class Meta:
         model = EstoqueItem
-        fields = '__all__'
-        depth = 1
+        fields = ['id', 'produto', 'armazem', 'quantidade', 'reservado', 'abaixo_minimo']
 
-class MovimentacaoEstoqueSerializer(serializers.ModelSerializer):
+class MovimentacaoEstoqueSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     responsavel = serializers.StringRelatedField(read_only=True)
+    expansoes = {'produto': ProdutoResumoSerializer, 'armazem': ArmazemResumoSerializer}
+    fontes_rapidas = {'responsavel': 'responsavel__username'}
 
     class Meta:
         model = MovimentacaoEstoque
         fields = '__all__'
 
-class RelatorioBaixoEstoqueSerializer(serializers.Serializer):
+class RelatorioBaixoEstoqueSerializer(CamposDinamicosMixin, serializers.Serializer):
     produto_id = serializers.IntegerField()
     produto_nome = serializers.CharField(source='produto.nome')
     produto_sku = serializers.CharField(source='produto.sku') 
@@ -67,12 +103,25 @@ class RelatorioBaixoEstoqueSerializer(serializers.Serializer):
     quantidade_atual = serializers.IntegerField(source='quantidade')
     armazem_nome = serializers.CharField(source='armazem.nome')
 
+TAMANHO_LOTE_ITENS = 1000
+
+def _validar_produtos_dos_itens(itens):
+    # Uma única consulta valida os produtos de todas as linhas, em vez de um PrimaryKeyRelatedField por linha.
+    produto_ids = {item['produto_id'] for item in itens}
+    existentes = set(Produto.objects.filter(id__in=produto_ids).values_list('id', flat=True))
+    faltantes = sorted(produto_ids - existentes)
+    if faltantes:
+        raise serializers.ValidationError(f"Produto(s) inexistente(s): {', '.join(map(str, faltantes))}.")
+    return itens
+
 class ItemPedidoCompraSerializer(serializers.ModelSerializer):
+    produto = serializers.IntegerField(source='produto_id')
+
     class Meta:
         model = ItemPedidoCompra
         fields = ['produto', 'quantidade', 'preco_unitario']
 
-class PedidoCompraSerializer(serializers.ModelSerializer):
+class PedidoCompraSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     itens = ItemPedidoCompraSerializer(many=True)
     fornecedor_nome = serializers.CharField(source='fornecedor.nome_fantasia', read_only=True)
     responsavel_nome = serializers.CharField(source='responsavel_pedido.username', read_only=True)
@@ -82,26 +131,54 @@ class PedidoCompraSerializer(serializers.ModelSerializer):
         fields = ['id', 'fornecedor', 'fornecedor_nome', 'status', 'data_pedido', 'data_recebimento', 'responsavel_pedido', 'responsavel_nome', 'itens']
         read_only_fields = ['responsavel_pedido']
 
+    def validate_itens(self, itens):
+        if self.instance is not None and self.instance.status == 'RECEBIDO':
+            raise serializers.ValidationError('Os itens de um pedido já recebido não podem ser alterados.')
+        return _validar_produtos_dos_itens(itens)
+
+    def _criar_itens(self, pedido, itens_data):
+        ItemPedidoCompra.objects.bulk_create(
+            [ItemPedidoCompra(pedido_compra=pedido, **item_data) for item_data in itens_data],
+            batch_size=TAMANHO_LOTE_ITENS
+        )
+
     def create(self, validated_data):
         itens_data = validated_data.pop('itens')
-        pedido = PedidoCompra.objects.create(**validated_data)
-        for item_data in itens_data:
-            ItemPedidoCompra.objects.create(pedido_compra=pedido, **item_data)
+        with transaction.atomic():
+            pedido = PedidoCompra.objects.create(**validated_data)
+            self._criar_itens(pedido, itens_data)
+        return pedido
+
+    def update(self, instance, validated_data):
+        itens_data = validated_data.pop('itens', None)
+        with transaction.atomic():
+            pedido = super().update(instance, validated_data)
+            if itens_data is not None:
+                pedido.itens.all().delete()
+                self._criar_itens(pedido, itens_data)
         return pedido
     
-class ClienteSerializer(serializers.ModelSerializer):
+class ClienteSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Cliente
         fields = '__all__'
 
 class ItemPedidoVendaSerializer(serializers.ModelSerializer):
+    produto = serializers.IntegerField(source='produto_id')
+
     class Meta:
         model = ItemPedidoVenda
         fields = ['produto', 'quantidade', 'preco_unitario']
 
-class PedidoVendaSerializer(serializers.ModelSerializer):
+class ReservaEstoqueSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ReservaEstoque
+        fields = ['produto', 'armazem', 'quantidade', 'expira_em']
+
+class PedidoVendaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     itens = ItemPedidoVendaSerializer(many=True, read_only=True)
     itens_para_criar = ItemPedidoVendaSerializer(many=True, write_only=True)
+    reservas = ReservaEstoqueSerializer(many=True, read_only=True)
     cliente_nome = serializers.CharField(source='cliente.nome', read_only=True)
     responsavel_nome = serializers.CharField(source='responsavel_venda.username', read_only=True)
     
@@ -109,18 +186,79 @@ class PedidoVendaSerializer(serializers.ModelSerializer):
         model = PedidoVenda
         fields = [
             'id', 'cliente', 'cliente_nome', 'status', 'data_pedido', 'data_despacho',
-            'responsavel_venda', 'responsavel_nome',
+            'responsavel_venda', 'responsavel_nome', 'armazem',
             'itens',
-            'itens_para_criar'
+            'itens_para_criar',
+            'reservas'
         ]
         read_only_fields = ['responsavel_venda']
 
+    def validate_itens_para_criar(self, itens):
+        if self.instance is not None and self.instance.status == 'DESPACHADO':
+            raise serializers.ValidationError('Os itens de um pedido já despachado não podem ser alterados.')
+        return _validar_produtos_dos_itens(itens)
+
+    def validate_status(self, valor):
+        atual = self.instance.status if self.instance is not None else None
+        # O despacho baixa o estoque e consome as reservas: só acontece pela ação despachar_pedido.
+        if valor == 'DESPACHADO' and atual != 'DESPACHADO':
+            raise serializers.ValidationError('Use a ação despachar_pedido para despachar o pedido.')
+        if atual == 'DESPACHADO' and valor != 'DESPACHADO':
+            raise serializers.ValidationError('O status de um pedido já despachado não pode ser alterado.')
+        return valor
+
+    def validate_armazem(self, armazem):
+        if self.instance is not None and self.instance.status == 'DESPACHADO' and armazem != self.instance.armazem:
+            raise serializers.ValidationError('O armazém de um pedido já despachado não pode ser alterado.')
+        return armazem
+
+    def _reservar(self, pedido, liberar=False, confirmar=False):
+        try:
+            if liberar:
+                liberar_reservas(pedido)
+            if confirmar:
+                confirmar_reservas(pedido)
+            else:
+                reservar_pedido(pedido, firme=pedido.status == 'PAGO')
+        except EstoqueItem.DoesNotExist:
+            raise serializers.ValidationError({'armazem': 'Um dos produtos não existe no estoque do armazém informado.'})
+        except EstoqueInsuficiente as e:
+            produto = Produto.objects.filter(pk=e.produto_id).only('nome').first()
+            raise serializers.ValidationError({'itens_para_criar': f'Estoque insuficiente para o produto {produto.nome}.' if produto else str(e)})
+
+    def _criar_itens(self, pedido, itens_data):
+        ItemPedidoVenda.objects.bulk_create(
+            [ItemPedidoVenda(pedido_venda=pedido, **item_data) for item_data in itens_data],
+            batch_size=TAMANHO_LOTE_ITENS
+        )
+
     def create(self, validated_data):
         itens_data = validated_data.pop('itens_para_criar')
-        pedido = PedidoVenda.objects.create(**validated_data)
+        with transaction.atomic():
+            pedido = PedidoVenda.objects.create(**validated_data)
+            self._criar_itens(pedido, itens_data)
+            # A checagem de disponibilidade acontece aqui, uma vez: o despacho só consome a reserva.
+            self._reservar(pedido)
+        return pedido
 
-        for item_data in itens_data:
-            ItemPedidoVenda.objects.create(pedido_venda=pedido, **item_data)
+    def update(self, instance, validated_data):
+        itens_data = validated_data.pop('itens_para_criar', None)
+        status_anterior, armazem_anterior = instance.status, instance.armazem_id
+        with transaction.atomic():
+            pedido = super().update(instance, validated_data)
+            if itens_data is not None:
+                pedido.itens.all().delete()
+                self._criar_itens(pedido, itens_data)
 
+            if pedido.status == 'DESPACHADO':
+                pass
+            elif pedido.status == 'CANCELADO' or pedido.armazem_id is None:
+                liberar_reservas(pedido)
+            elif itens_data is not None or pedido.armazem_id != armazem_anterior:
+                self._reservar(pedido, liberar=True)
+            elif pedido.status == 'PAGO' and status_anterior != 'PAGO':
+                self._reservar(pedido, confirmar=True)
+            elif status_anterior == 'PAGO' and pedido.status != 'PAGO':
+                desconfirmar_reservas(pedido)
         return pedido
 
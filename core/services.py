@@ -0,0 +1,375 @@
+from django.db import transaction
+from django.db.models import F, Q, Case, When, Value, IntegerField, Exists, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from .models import Produto, Armazem, EstoqueItem, MovimentacaoEstoque
+from .metricas import registrar_variacao_estoque
+from .cache_respostas import invalidar_linhas
+
+MODO_TUDO_OU_NADA = 'TUDO_OU_NADA'
+MODO_MELHOR_ESFORCO = 'MELHOR_ESFORCO'
+MODOS_LOTE = (MODO_TUDO_OU_NADA, MODO_MELHOR_ESFORCO)
+
+TAMANHO_LOTE_BULK = 1000
+
+
+class EstoqueInsuficiente(Exception):
+    def __init__(self, produto_id, armazem_id, mensagem='Estoque insuficiente.'):
+        super().__init__(mensagem)
+        self.produto_id = produto_id
+        self.armazem_id = armazem_id
+
+
+def _abaixo_minimo_apos(delta):
+    # Avaliado dentro do próprio UPDATE: o lado direito do SET enxerga o saldo anterior,
+    # por isso o delta entra na comparação com o estoque mínimo do produto.
+    return Exists(Produto.objects.filter(pk=OuterRef('produto_id'), estoque_minimo__gte=OuterRef('quantidade') + delta))
+
+
+def soma_estoque_do_produto():
+    """Soma ao vivo das quantidades do produto em todos os armazéns (para anotar/atualizar Produto)."""
+    return Coalesce(Subquery(
+        EstoqueItem.objects.filter(produto_id=OuterRef('pk')).values('produto_id').annotate(total=Sum('quantidade')).values('total')
+    ), 0)
+
+
+def _registrar_variacoes(variacoes):
+    """Propaga {produto_id: delta_quantidade} para o total denormalizado do produto e para as métricas."""
+    variacoes = {produto_id: delta for produto_id, delta in variacoes.items() if delta}
+    if not variacoes:
+        return
+    Produto.objects.filter(id__in=variacoes.keys()).update(
+        estoque_total=F('estoque_total') + _por_produto(sorted(variacoes.items()), 'pk')
+    )
+    registrar_variacao_estoque(variacoes)
+    # O estoque faz parte da resposta dos produtos: só as páginas com estes produtos saem do cache.
+    invalidar_linhas('produto', variacoes)
+
+
+def registrar_entrada(produto_id, armazem_id, quantidade, responsavel, motivo, tipo='ENTRADA'):
+    """
+    Soma `quantidade` ao item de estoque com um UPDATE atômico
+    (quantidade = quantidade + n), criando o item se ele ainda não existir.
+    Retorna o saldo resultante.
+    """
+    with transaction.atomic():
+        atualizados = EstoqueItem.objects.filter(
+            produto_id=produto_id, armazem_id=armazem_id
+        ).update(quantidade=F('quantidade') + quantidade, abaixo_minimo=_abaixo_minimo_apos(quantidade))
+
+        if not atualizados:
+            item, created = EstoqueItem.objects.get_or_create(
+                produto_id=produto_id,
+                armazem_id=armazem_id,
+                defaults={'quantidade': quantidade}
+            )
+            if not created:
+                EstoqueItem.objects.filter(pk=item.pk).update(quantidade=F('quantidade') + quantidade, abaixo_minimo=_abaixo_minimo_apos(quantidade))
+
+        nova_quantidade = EstoqueItem.objects.values_list('quantidade', flat=True).get(
+            produto_id=produto_id, armazem_id=armazem_id
+        )
+
+        MovimentacaoEstoque.objects.create(
+            produto_id=produto_id,
+            armazem_id=armazem_id,
+            quantidade=quantidade,
+            responsavel=responsavel,
+            tipo=tipo,
+            motivo=motivo
+        )
+        _registrar_variacoes({produto_id: quantidade})
+    return nova_quantidade
+
+
+def registrar_saida(produto_id, armazem_id, quantidade, responsavel, motivo, tipo='SAIDA'):
+    """
+    Subtrai `quantidade` com um UPDATE condicional
+    (quantidade = quantidade - n WHERE quantidade - reservado >= n), de modo que duas saídas
+    concorrentes nunca vendem o mesmo saldo nem o que está reservado para pedidos. Levanta EstoqueItem.DoesNotExist se
+    o produto não existe no armazém e EstoqueInsuficiente se o saldo não basta.
+    Retorna o saldo resultante.
+    """
+    with transaction.atomic():
+        atualizados = EstoqueItem.objects.filter(
+            produto_id=produto_id, armazem_id=armazem_id, quantidade__gte=F('reservado') + quantidade
+        ).update(quantidade=F('quantidade') - quantidade, abaixo_minimo=_abaixo_minimo_apos(-quantidade))
+
+        if not atualizados:
+            if not EstoqueItem.objects.filter(produto_id=produto_id, armazem_id=armazem_id).exists():
+                raise EstoqueItem.DoesNotExist('Este produto não existe no estoque deste armazém.')
+            raise EstoqueInsuficiente(produto_id, armazem_id)
+
+        nova_quantidade = EstoqueItem.objects.values_list('quantidade', flat=True).get(
+            produto_id=produto_id, armazem_id=armazem_id
+        )
+
+        MovimentacaoEstoque.objects.create(
+            produto_id=produto_id,
+            armazem_id=armazem_id,
+            quantidade=-quantidade,
+            responsavel=responsavel,
+            tipo=tipo,
+            motivo=motivo
+        )
+        _registrar_variacoes({produto_id: -quantidade})
+    return nova_quantidade
+
+
+def _ordenar_linhas(linhas):
+    # Ordem determinística de travamento: pedidos com os mesmos produtos
+    # sempre bloqueiam as linhas de EstoqueItem na mesma sequência, evitando deadlock.
+    agregadas = {}
+    for produto_id, quantidade in linhas:
+        agregadas[produto_id] = agregadas.get(produto_id, 0) + quantidade
+    return sorted(agregadas.items())
+
+
+def _por_produto(linhas, campo, sinal=1):
+    return Case(
+        *[When(**{campo: produto_id}, then=Value(sinal * quantidade)) for produto_id, quantidade in linhas],
+        default=Value(0),
+        output_field=IntegerField()
+    )
+
+
+def _criar_movimentacoes(linhas, armazem_id, responsavel, motivo, tipo, sinal):
+    MovimentacaoEstoque.objects.bulk_create([
+        MovimentacaoEstoque(
+            produto_id=produto_id,
+            armazem_id=armazem_id,
+            quantidade=sinal * quantidade,
+            responsavel=responsavel,
+            tipo=tipo,
+            motivo=motivo
+        )
+        for produto_id, quantidade in linhas
+    ], batch_size=TAMANHO_LOTE_BULK)
+
+
+def registrar_entradas_pedido(linhas, armazem_id, responsavel, motivo):
+    """
+    Dá entrada em várias linhas (produto_id, quantidade) de um pedido com um número
+    fixo de consultas: os itens que faltam são criados em lote e todos os saldos
+    sobem num único UPDATE. Retorna {produto_id: saldo}.
+    """
+    linhas = _ordenar_linhas(linhas)
+    if not linhas:
+        return {}
+    produto_ids = [produto_id for produto_id, _ in linhas]
+
+    with transaction.atomic():
+        existentes = set(EstoqueItem.objects.select_for_update().filter(
+            armazem_id=armazem_id, produto_id__in=produto_ids
+        ).order_by('produto_id').values_list('produto_id', flat=True))
+
+        faltantes = [produto_id for produto_id in produto_ids if produto_id not in existentes]
+        if faltantes:
+            EstoqueItem.objects.bulk_create(
+                [EstoqueItem(produto_id=produto_id, armazem_id=armazem_id, quantidade=0) for produto_id in faltantes],
+                ignore_conflicts=True
+            )
+
+        EstoqueItem.objects.filter(armazem_id=armazem_id, produto_id__in=produto_ids).update(
+            quantidade=F('quantidade') + _por_produto(linhas, 'produto_id'),
+            abaixo_minimo=_abaixo_minimo_apos(_por_produto(linhas, 'pk'))
+        )
+        saldos = dict(EstoqueItem.objects.filter(
+            armazem_id=armazem_id, produto_id__in=produto_ids
+        ).values_list('produto_id', 'quantidade'))
+
+        _criar_movimentacoes(linhas, armazem_id, responsavel, motivo, 'ENTRADA', 1)
+        _registrar_variacoes(dict(linhas))
+    return saldos
+
+
+def registrar_saidas_pedido(linhas, armazem_id, responsavel, motivo, reservado=False):
+    """
+    Dá baixa em várias linhas (produto_id, quantidade) de um pedido numa única
+    transação e com um número fixo de consultas: os itens são lidos e travados de
+    uma vez, validados em memória e decrementados num único UPDATE condicional.
+    Se alguma linha falhar, nada é baixado. Retorna {produto_id: saldo}.
+
+    Sem reserva, só o saldo disponível (quantidade - reservado) pode ser baixado.
+    Com `reservado=True` as linhas consomem uma reserva já feita: quantidade e
+    reservado descem juntos.
+    """
+    linhas = _ordenar_linhas(linhas)
+    if not linhas:
+        return {}
+    produto_ids = [produto_id for produto_id, _ in linhas]
+
+    with transaction.atomic():
+        itens = {
+            produto_id: (saldo, reservas)
+            for produto_id, saldo, reservas in EstoqueItem.objects.select_for_update().filter(
+                armazem_id=armazem_id, produto_id__in=produto_ids
+            ).order_by('produto_id').values_list('produto_id', 'quantidade', 'reservado')
+        }
+
+        for produto_id, quantidade in linhas:
+            if produto_id not in itens:
+                raise EstoqueItem.DoesNotExist('Um dos produtos não existe no estoque do armazém informado')
+            saldo, reservas = itens[produto_id]
+            if (reservas if reservado else saldo - reservas) < quantidade:
+                raise EstoqueInsuficiente(produto_id, armazem_id)
+
+        # A condição por linha mantém o UPDATE seguro mesmo em bancos sem SELECT ... FOR UPDATE.
+        condicao = Q()
+        for produto_id, quantidade in linhas:
+            if reservado:
+                condicao |= Q(produto_id=produto_id, reservado__gte=quantidade)
+            else:
+                condicao |= Q(produto_id=produto_id, quantidade__gte=F('reservado') + quantidade)
+        alteracoes = {
+            'quantidade': F('quantidade') - _por_produto(linhas, 'produto_id'),
+            'abaixo_minimo': _abaixo_minimo_apos(_por_produto(linhas, 'pk', sinal=-1)),
+        }
+        if reservado:
+            alteracoes['reservado'] = F('reservado') - _por_produto(linhas, 'produto_id')
+        atualizados = EstoqueItem.objects.filter(condicao, armazem_id=armazem_id).update(**alteracoes)
+        if atualizados != len(linhas):
+            raise EstoqueInsuficiente(None, armazem_id)
+
+        _criar_movimentacoes(linhas, armazem_id, responsavel, motivo, 'SAIDA', -1)
+        _registrar_variacoes({produto_id: -quantidade for produto_id, quantidade in linhas})
+    return {produto_id: itens[produto_id][0] - quantidade for produto_id, quantidade in linhas}
+
+
+def _validar_linha(linha):
+    if not isinstance(linha, dict):
+        return None, 'Linha inválida.'
+
+    tipo = str(linha.get('tipo', '')).upper()
+    if tipo not in ('ENTRADA', 'SAIDA'):
+        return None, 'O tipo deve ser ENTRADA ou SAIDA.'
+
+    try:
+        produto_id = int(linha.get('produto_id'))
+        armazem_id = int(linha.get('armazem_id'))
+        quantidade = int(linha.get('quantidade', 0))
+    except (TypeError, ValueError):
+        return None, 'produto_id, armazem_id e quantidade devem ser números inteiros.'
+
+    if quantidade <= 0:
+        return None, 'A quantidade deve ser positiva.'
+
+    motivo = linha.get('motivo') or ('Entrada em lote' if tipo == 'ENTRADA' else 'Saída em lote')
+    return {
+        'tipo': tipo,
+        'produto_id': produto_id,
+        'armazem_id': armazem_id,
+        'quantidade': quantidade,
+        'motivo': motivo,
+    }, None
+
+
+def aplicar_movimentacoes_em_lote(linhas, responsavel, modo=MODO_TUDO_OU_NADA):
+    """
+    Aplica uma lista de entradas/saídas numa única transação.
+
+    Os itens de estoque que as entradas vão criar são inseridos antes (ignorando
+    conflitos com um lote concorrente), os afetados são lidos e travados de uma vez,
+    os saldos são calculados em memória na ordem das linhas e gravados com
+    bulk_update. Retorna (aplicado, resultados), com um resultado por linha.
+    """
+    validadas = [_validar_linha(linha) for linha in linhas]
+    validas = [dados for dados, erro in validadas if dados is not None]
+
+    produto_ids = {dados['produto_id'] for dados in validas}
+    armazem_ids = {dados['armazem_id'] for dados in validas}
+
+    with transaction.atomic():
+        estoque_minimo = dict(Produto.objects.filter(id__in=produto_ids).values_list('id', 'estoque_minimo'))
+        produtos_existentes = set(estoque_minimo)
+        armazens_existentes = set(Armazem.objects.filter(id__in=armazem_ids).values_list('id', flat=True))
+
+        # Como em registrar_entradas_pedido: dois lotes que criam o mesmo item não podem violar o unique_together.
+        a_criar = {
+            (dados['produto_id'], dados['armazem_id']) for dados in validas
+            if dados['tipo'] == 'ENTRADA' and dados['produto_id'] in produtos_existentes and dados['armazem_id'] in armazens_existentes
+        }
+        if a_criar:
+            EstoqueItem.objects.bulk_create(
+                [EstoqueItem(produto_id=produto_id, armazem_id=armazem_id, quantidade=0) for produto_id, armazem_id in sorted(a_criar)],
+                batch_size=TAMANHO_LOTE_BULK, ignore_conflicts=True
+            )
+
+        itens = {
+            (item.produto_id, item.armazem_id): item
+            for item in EstoqueItem.objects.select_for_update().filter(
+                produto_id__in=produtos_existentes, armazem_id__in=armazens_existentes
+            ).order_by('id')
+        }
+
+        alterados = {}
+        movimentacoes = []
+        resultados = []
+        houve_erro = False
+
+        for indice, (dados, erro) in enumerate(validadas):
+            if erro is None:
+                chave = (dados['produto_id'], dados['armazem_id'])
+                item = itens.get(chave)
+
+                if dados['produto_id'] not in produtos_existentes:
+                    erro = 'Produto não encontrado.'
+                elif dados['armazem_id'] not in armazens_existentes:
+                    erro = 'Armazém não encontrado.'
+                elif dados['tipo'] == 'SAIDA' and item is None:
+                    erro = 'Este produto não existe no estoque deste armazém.'
+                elif dados['tipo'] == 'SAIDA' and item.quantidade - item.reservado < dados['quantidade']:
+                    erro = 'Estoque insuficiente.'
+
+            if erro is not None:
+                houve_erro = True
+                resultados.append({'linha': indice, 'sucesso': False, 'erro': erro})
+                continue
+
+            alterados[chave] = item
+
+            if dados['tipo'] == 'ENTRADA':
+                item.quantidade += dados['quantidade']
+                quantidade_movimentada = dados['quantidade']
+            else:
+                item.quantidade -= dados['quantidade']
+                quantidade_movimentada = -dados['quantidade']
+
+            movimentacoes.append(MovimentacaoEstoque(
+                produto_id=dados['produto_id'],
+                armazem_id=dados['armazem_id'],
+                quantidade=quantidade_movimentada,
+                responsavel=responsavel,
+                tipo=dados['tipo'],
+                motivo=dados['motivo']
+            ))
+            resultados.append({
+                'linha': indice,
+                'sucesso': True,
+                'produto_id': dados['produto_id'],
+                'armazem_id': dados['armazem_id'],
+                'nova_quantidade': item.quantidade,
+            })
+
+        if houve_erro and modo == MODO_TUDO_OU_NADA:
+            for resultado in resultados:
+                if resultado['sucesso']:
+                    resultado.pop('nova_quantidade')
+                    resultado['sucesso'] = False
+                    resultado['erro'] = 'Lote cancelado por erro em outra linha.'
+            # Desfaz os itens vazios criados acima.
+            transaction.set_rollback(True)
+            return False, resultados
+
+        for item in alterados.values():
+            item.abaixo_minimo = item.quantidade <= estoque_minimo[item.produto_id]
+
+        if alterados:
+            EstoqueItem.objects.bulk_update(alterados.values(), ['quantidade', 'abaixo_minimo'], batch_size=TAMANHO_LOTE_BULK)
+        MovimentacaoEstoque.objects.bulk_create(movimentacoes, batch_size=TAMANHO_LOTE_BULK)
+
+        variacoes = {}
+        for movimentacao in movimentacoes:
+            variacoes[movimentacao.produto_id] = variacoes.get(movimentacao.produto_id, 0) + movimentacao.quantidade
+        _registrar_variacoes(variacoes)
+
+    return True, resultados
@@ -0,0 +1,109 @@
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import m2m_changed, post_delete, pre_delete, pre_save, post_save
+from django.db.models import F
+from django.dispatch import receiver
+from .models import Armazem, Categoria, EstoqueItem, Fornecedor, Produto
+from .cache_respostas import DEPENDENCIAS, invalidar_respostas
+from .indice_sku import invalidar_indice_sku
+from .metricas import registrar_reavaliacao
+from .autenticacao import revogar_tokens
+from .permissions import invalidar_papeis
+
+
+@receiver(pre_save, sender=EstoqueItem)
+def calcular_abaixo_minimo(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Quem salva com o produto em mãos (EstoqueItem(produto=produto)) já passa o estoque mínimo; só os demais consultam.
+    if EstoqueItem.produto.is_cached(instance):
+        estoque_minimo = instance.produto.estoque_minimo
+    else:
+        estoque_minimo = Produto.objects.values_list('estoque_minimo', flat=True).get(pk=instance.produto_id)
+    instance.abaixo_minimo = instance.quantidade <= estoque_minimo
+
+
+@receiver(post_delete, sender=EstoqueItem)
+def descontar_estoque_total(sender, instance, **kwargs):
+    # Os caminhos de movimentação mantêm o total; a exclusão de um item (admin, armazém removido) também precisa.
+    if instance.quantidade:
+        Produto.objects.filter(pk=instance.produto_id).update(estoque_total=F('estoque_total') - instance.quantidade)
+
+
+@receiver(pre_save, sender=Produto)
+def guardar_valores_anteriores(sender, instance, raw=False, **kwargs):
+    instance._valores_anteriores = None
+    if raw or instance.pk is None:
+        return
+    instance._valores_anteriores = Produto.objects.filter(pk=instance.pk).values('estoque_minimo', 'preco_custo', 'sku').first()
+
+
+@receiver(post_save, sender=Produto)
+def sincronizar_produto(sender, instance, created, raw=False, **kwargs):
+    anteriores = getattr(instance, '_valores_anteriores', None)
+    if created or raw or anteriores is None:
+        return
+
+    # Só reescreve as linhas cujo indicador realmente mudou com o novo estoque mínimo.
+    if anteriores['estoque_minimo'] != instance.estoque_minimo:
+        itens = EstoqueItem.objects.filter(produto=instance)
+        itens.filter(quantidade__lte=instance.estoque_minimo, abaixo_minimo=False).update(abaixo_minimo=True)
+        itens.filter(quantidade__gt=instance.estoque_minimo, abaixo_minimo=True).update(abaixo_minimo=False)
+
+    registrar_reavaliacao(instance.pk, anteriores['preco_custo'], instance.preco_custo)
+
+
+def _papeis_alterados(usuario_ids):
+    usuario_ids = list(usuario_ids)
+    invalidar_papeis(usuario_ids)
+    revogar_tokens(usuario_ids)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidar_papeis_do_vinculo(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        _papeis_alterados([instance.pk])
+    elif action == 'pre_clear':
+        # Os vínculos ainda existem aqui: os ids são lidos agora, e a invalidação roda após o commit.
+        _papeis_alterados(instance.user_set.values_list('pk', flat=True))
+    else:
+        _papeis_alterados(pk_set)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidar_papeis_do_grupo(sender, instance, raw=False, **kwargs):
+    # Renomear ou excluir um grupo muda os papéis de todos os seus membros.
+    if not raw and instance.pk:
+        _papeis_alterados(instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def revogar_tokens_do_usuario(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    # Desativação, troca de senha ou de is_staff invalidam as claims dos tokens já emitidos.
+    if created or raw or update_fields == frozenset({'last_login'}):
+        return
+    revogar_tokens([instance.pk])
+
+
+@receiver(post_save, sender=Produto)
+@receiver(post_delete, sender=Produto)
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+@receiver(post_save, sender=Fornecedor)
+@receiver(post_delete, sender=Fornecedor)
+@receiver(post_save, sender=Armazem)
+@receiver(post_delete, sender=Armazem)
+def invalidar_respostas_do_catalogo(sender, **kwargs):
+    invalidar_respostas(*DEPENDENCIAS[sender.__name__])
+
+
+@receiver(post_save, sender=Produto)
+@receiver(post_delete, sender=Produto)
+def invalidar_indice_sku_do_produto(sender, instance, raw=False, **kwargs):
+    if not raw:
+        # O SKU anterior também sai do índice, caso tenha mudado.
+        anteriores = getattr(instance, '_valores_anteriores', None) or {}
+        invalidar_indice_sku([instance.sku, anteriores.get('sku')])
@@ -0,0 +1,241 @@
+import csv
+import io
+import random
+import time
+from array import array
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from .cache_respostas import RECURSOS, invalidar_respostas
+from .indice_sku import invalidar_indice_sku
+from .models import (
+    Armazem, Categoria, Cliente, EstoqueItem, Fornecedor, ItemPedidoCompra, ItemPedidoVenda, MovimentacaoEstoque,
+    PedidoCompra, PedidoVenda, Produto,
+)
+from .services import soma_estoque_do_produto
+
+TAMANHO_LOTE_SINTETICO = 10_000
+
+PRODUTOS = ('Parafuso', 'Porca', 'Arruela', 'Cabo', 'Tomada', 'Lâmpada', 'Martelo', 'Chave', 'Broca', 'Fita', 'Cola', 'Tinta',
+            'Pincel', 'Serra', 'Alicate', 'Mangueira', 'Torneira', 'Disjuntor', 'Interruptor', 'Luva', 'Prego', 'Lixa', 'Trena', 'Cadeado')
+MATERIAIS = ('aço', 'inox', 'latão', 'plástico', 'madeira', 'cobre', 'alumínio', 'borracha', 'PVC', 'nylon')
+ACABAMENTOS = ('zincado', 'galvanizado', 'branco', 'preto', 'reforçado', 'profissional', 'industrial', 'compacto')
+UNIDADES = ('unidade', 'unidade', 'unidade', 'caixa', 'metro', 'kg', 'litro')
+STATUS_VENDA = (('DESPACHADO', 70), ('PAGO', 10), ('AGUARDANDO_PAGAMENTO', 10), ('CARRINHO', 5), ('CANCELADO', 5))
+STATUS_COMPRA = (('RECEBIDO', 60), ('APROVADO', 20), ('PENDENTE', 15), ('CANCELADO', 5))
+
+
+def _sortear_status(aleatorio, pesos):
+    return aleatorio.choices([status for status, _ in pesos], weights=[peso for _, peso in pesos])[0]
+
+
+def inserir_em_massa(modelo, campos, linhas, tamanho_lote=TAMANHO_LOTE_SINTETICO):
+    """
+    Insere tuplas cruas (com id) em lotes: COPY no PostgreSQL, executemany nos demais.
+    Não passa pelo ORM (nem por auto_now_add e sinais), então datas e totais vêm prontos.
+    """
+    opcoes = modelo._meta
+    tabela = connection.ops.quote_name(opcoes.db_table)
+    colunas = ', '.join(connection.ops.quote_name(opcoes.get_field(campo).column) for campo in campos)
+    total, lote = 0, []
+
+    def gravar(lote):
+        with transaction.atomic(), connection.cursor() as cursor:
+            if connection.vendor == 'postgresql' and hasattr(cursor.cursor, 'copy_expert'):
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(lote)
+                buffer.seek(0)
+                cursor.cursor.copy_expert(f'COPY {tabela} ({colunas}) FROM STDIN WITH (FORMAT csv)', buffer)
+            else:
+                cursor.executemany(f"INSERT INTO {tabela} ({colunas}) VALUES ({', '.join(['%s'] * len(campos))})", lote)
+
+    for linha in linhas:
+        lote.append(linha)
+        if len(lote) >= tamanho_lote:
+            gravar(lote)
+            total += len(lote)
+            lote = []
+    if lote:
+        gravar(lote)
+        total += len(lote)
+    return total
+
+
+def _proximo_id(modelo):
+    return (modelo.objects.aggregate(maior=Max('id'))['maior'] or 0) + 1
+
+
+class GeradorDados:
+    """
+    Gera um conjunto de dados sintético e reproduzível (mesma semente, mesmos dados) em
+    escala: catálogo, armazéns, itens de estoque, histórico de movimentações coerente com
+    os saldos (nenhum saldo negativo, Produto.estoque_total e abaixo_minimo corretos),
+    clientes e pedidos de venda e compra com itens. Os SKUs levam a semente
+    (SINT-<semente>-...), então duas sementes convivem no mesmo banco.
+    """
+
+    def __init__(self, semente=42, dias=365, tamanho_lote=TAMANHO_LOTE_SINTETICO, ao_progredir=None):
+        self.semente = semente
+        self.aleatorio = random.Random(semente)
+        self.dias = dias
+        self.tamanho_lote = tamanho_lote
+        self.ao_progredir = ao_progredir
+        self.agora = timezone.now().replace(microsecond=0)
+        self.inicio = self.agora - timedelta(days=dias)
+        self.prefixo = f'SINT-{semente}'
+
+    def _data(self, momento):
+        return connection.ops.adapt_datetimefield_value(momento)
+
+    def _momento_aleatorio(self):
+        return self.inicio + timedelta(seconds=self.aleatorio.randrange(self.dias * 86400))
+
+    def _progresso(self, etapa, quantidade, inicio):
+        if self.ao_progredir:
+            self.ao_progredir(etapa, quantidade, time.perf_counter() - inicio)
+
+    def _inserir(self, etapa, modelo, campos, linhas):
+        inicio = time.perf_counter()
+        total = inserir_em_massa(modelo, campos, linhas, self.tamanho_lote)
+        self._progresso(etapa, total, inicio)
+        return total
+
+    def gerar(self, categorias=50, fornecedores=500, produtos=10_000, armazens=10, clientes=5_000,
+              movimentacoes=100_000, pedidos=10_000, pedidos_compra=1_000, itens_por_pedido=5):
+        if Produto.objects.filter(sku__startswith=f'{self.prefixo}-').exists():
+            raise ValueError(f"Já existem dados da semente {self.semente} neste banco; use outra semente ou um banco limpo.")
+        aleatorio, criado = self.aleatorio, self._data(self.inicio)
+
+        id_categoria = _proximo_id(Categoria)
+        self._inserir('categorias', Categoria, ('id', 'nome', 'descricao'), (
+            (id_categoria + i, f'{self.prefixo} Categoria {i}', None) for i in range(categorias)
+        ))
+        id_fornecedor = _proximo_id(Fornecedor)
+        self._inserir('fornecedores', Fornecedor, ('id', 'nome_fantasia', 'cnpj', 'email', 'data_criacao'), (
+            (id_fornecedor + i, f'{self.prefixo} Fornecedor {i}', f'{self.semente:04d}{i:010d}', f'fornecedor{i}@sintetico.example', criado)
+            for i in range(fornecedores)
+        ))
+        id_armazem = _proximo_id(Armazem)
+        self._inserir('armazens', Armazem, ('id', 'nome', 'localizacao', 'prioridade'), (
+            (id_armazem + i, f'{self.prefixo} Armazém {i}', f'Região {i % 5}', i) for i in range(armazens)
+        ))
+
+        id_produto = _proximo_id(Produto)
+        precos_venda, precos_custo, minimos = array('l'), array('l'), array('l')
+
+        def linhas_produtos():
+            for i in range(produtos):
+                custo = aleatorio.randint(50, 50_000)
+                venda = int(custo * aleatorio.uniform(1.2, 2.5))
+                minimo = aleatorio.choice((0, 5, 10, 20, 50))
+                precos_custo.append(custo)
+                precos_venda.append(venda)
+                minimos.append(minimo)
+                nome = f'{aleatorio.choice(PRODUTOS)} {aleatorio.choice(MATERIAIS)} {aleatorio.choice(ACABAMENTOS)} {aleatorio.randint(1, 100)}mm'
+                yield (
+                    id_produto + i, nome, f'{self.prefixo}-{i:08d}',
+                    id_categoria + aleatorio.randrange(categorias) if categorias else None,
+                    f'{nome} para uso geral.', id_fornecedor + aleatorio.randrange(fornecedores) if fornecedores else None,
+                    Decimal(custo) / 100, Decimal(venda) / 100, aleatorio.choice(UNIDADES), minimo, 0, 0, criado, criado,
+                )
+        self._inserir('produtos', Produto, (
+            'id', 'nome', 'sku', 'categoria', 'descricao', 'fornecedor', 'preco_custo', 'preco_venda',
+            'unidade_medida', 'estoque_minimo', 'unididade_minimo', 'estoque_total', 'data_criacao', 'data_atualizaçao',
+        ), linhas_produtos())
+
+        # Cada produto fica em 1 a 3 armazéns; as movimentações caem nesses itens, em ordem cronológica.
+        itens_produto, itens_armazem = array('l'), array('l')
+        for indice in range(produtos):
+            for armazem in aleatorio.sample(range(armazens), min(armazens, aleatorio.randint(1, 3))):
+                itens_produto.append(indice)
+                itens_armazem.append(armazem)
+        saldos = array('q', bytes(8 * len(itens_produto)))
+        id_movimentacao = _proximo_id(MovimentacaoEstoque)
+        passo = self.dias * 86400 / max(movimentacoes, 1)
+
+        def linhas_movimentacoes():
+            for i in range(movimentacoes):
+                item = aleatorio.randrange(len(saldos))
+                indice, armazem = itens_produto[item], itens_armazem[item]
+                quantidade = aleatorio.randint(1, 50)
+                if aleatorio.random() < 0.4 and saldos[item] >= quantidade:
+                    tipo, quantidade, motivo = 'SAIDA', -quantidade, 'Venda (sintético)'
+                elif aleatorio.random() < 0.05:
+                    tipo, motivo = 'AJUSTE', 'Ajuste de inventário (sintético)'
+                else:
+                    tipo, motivo = 'ENTRADA', 'Compra (sintético)'
+                saldos[item] += quantidade
+                momento = self.inicio + timedelta(seconds=i * passo + aleatorio.random() * passo)
+                yield id_movimentacao + i, id_produto + indice, id_armazem + armazem, quantidade, self._data(momento), None, tipo, motivo
+        if len(saldos):
+            self._inserir('movimentacoes', MovimentacaoEstoque, (
+                'id', 'produto', 'armazem', 'quantidade', 'data_movimentacao', 'responsavel', 'tipo', 'motivo',
+            ), linhas_movimentacoes())
+
+        id_item = _proximo_id(EstoqueItem)
+        self._inserir('itens_estoque', EstoqueItem, ('id', 'produto', 'armazem', 'quantidade', 'abaixo_minimo', 'reservado'), (
+            (id_item + i, id_produto + indice, id_armazem + armazem, saldos[i], saldos[i] <= minimos[indice], 0)
+            for i, (indice, armazem) in enumerate(zip(itens_produto, itens_armazem))
+        ))
+        inicio = time.perf_counter()
+        Produto.objects.filter(sku__startswith=f'{self.prefixo}-').update(estoque_total=soma_estoque_do_produto())
+        self._progresso('estoque_total', produtos, inicio)
+
+        id_cliente = _proximo_id(Cliente)
+        self._inserir('clientes', Cliente, ('id', 'nome', 'email', 'data_cadastro'), (
+            (id_cliente + i, f'Cliente {i}', f'cliente{i}@{self.prefixo.lower()}.example', criado) for i in range(clientes)
+        ))
+
+        if clientes and produtos:
+            self._gerar_pedidos(
+                PedidoVenda, ItemPedidoVenda, 'pedido_venda', pedidos, itens_por_pedido, STATUS_VENDA, precos_venda, id_produto,
+                ('id', 'cliente', 'status', 'data_pedido', 'data_despacho', 'responsavel_venda', 'armazem'),
+                lambda pedido_id, status, momento: (
+                    pedido_id, id_cliente + aleatorio.randrange(clientes), status, self._data(momento),
+                    self._data(momento + timedelta(days=1)) if status == 'DESPACHADO' else None, None, None,
+                ),
+                quantidades=(1, 5),
+            )
+        if fornecedores and produtos:
+            self._gerar_pedidos(
+                PedidoCompra, ItemPedidoCompra, 'pedido_compra', pedidos_compra, 2 * itens_por_pedido, STATUS_COMPRA, precos_custo, id_produto,
+                ('id', 'fornecedor', 'status', 'data_pedido', 'data_recebimento', 'responsavel_pedido'),
+                lambda pedido_id, status, momento: (
+                    pedido_id, id_fornecedor + aleatorio.randrange(fornecedores), status, self._data(momento),
+                    self._data(momento + timedelta(days=3)) if status == 'RECEBIDO' else None, None,
+                ),
+                quantidades=(10, 100),
+            )
+        self._reiniciar_sequencias()
+        invalidar_respostas(*RECURSOS)
+        invalidar_indice_sku()
+
+    def _reiniciar_sequencias(self):
+        # Os ids foram gravados explicitamente: as sequências (PostgreSQL) precisam seguir o maior id.
+        modelos = [Categoria, Fornecedor, Armazem, Produto, MovimentacaoEstoque, EstoqueItem, Cliente, PedidoVenda, ItemPedidoVenda, PedidoCompra, ItemPedidoCompra]
+        comandos = connection.ops.sequence_reset_sql(no_style(), modelos)
+        if comandos:
+            with connection.cursor() as cursor:
+                for comando in comandos:
+                    cursor.execute(comando)
+
+    def _gerar_pedidos(self, modelo, modelo_item, campo_pedido, quantidade, maximo_itens, pesos, precos, id_produto, campos, linha_pedido, quantidades):
+        # Pedidos e itens saem juntos, um bloco por vez, para não acumular os itens em memória.
+        aleatorio = self.aleatorio
+        id_pedido, id_item = _proximo_id(modelo), _proximo_id(modelo_item)
+        inicio, total_itens = time.perf_counter(), 0
+        for bloco in range(0, quantidade, self.tamanho_lote):
+            pedidos, itens = [], []
+            for pedido_id in range(id_pedido + bloco, id_pedido + min(bloco + self.tamanho_lote, quantidade)):
+                for _ in range(aleatorio.randint(1, maximo_itens)):
+                    indice = aleatorio.randrange(len(precos))
+                    itens.append((id_item + total_itens + len(itens), pedido_id, id_produto + indice, aleatorio.randint(*quantidades), Decimal(precos[indice]) / 100))
+                pedidos.append(linha_pedido(pedido_id, _sortear_status(aleatorio, pesos), self._momento_aleatorio()))
+            inserir_em_massa(modelo, campos, pedidos, self.tamanho_lote)
+            inserir_em_massa(modelo_item, ('id', campo_pedido, 'produto', 'quantidade', 'preco_unitario'), itens, self.tamanho_lote)
+            total_itens += len(itens)
+        self._progresso(campo_pedido, quantidade, inicio)
+        self._progresso(f'itens_{campo_pedido}', total_itens, inicio)
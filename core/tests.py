@@ -1,3 +1,1483 @@
-from django.test import TestCase
+import json
+import threading
+from datetime import timedelta
+from unittest import mock, skipIf, skipUnless
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import StringIO
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import QuerySet
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from .views import EstoqueViewSet, ProdutoViewSet
+from .models import Categoria, Fornecedor, Produto, Armazem, EstoqueItem, MovimentacaoEstoque, PedidoCompra, ItemPedidoCompra, Cliente, PedidoVenda, ItemPedidoVenda, EventoWebhook, ResumoDiario, ReservaEstoque, ContagemBaixoEstoque
+from .models import LoteMovimentacoesCompactadas, MovimentacaoEstoqueArquivada, PosicaoEstoque, ResumoMensalMovimentacao
+from .arquivamento import arquivar_movimentacoes, compactar_meses, inicio_do_mes
+from .posicoes import DetalheCompactado, posicoes_em, registrar_posicoes
+from .indice_sku import IndiceSku, _geracao_atual, indice_sku, invalidar_indice_sku
+from .autenticacao import CLAIM_EMITIDO_EM, ObterTokenSerializer
+from .leitura import RenderizadorJSONRapido
+from .instrumentacao import InstrumentacaoMiddleware, registro as registro_instrumentacao
+from .permissions import IsGerente, papeis_do_usuario
+from .reservas import liberar_reservas_expiradas
+from .services import EstoqueInsuficiente, registrar_entrada, registrar_saida
+from .webhooks import enfileirar_webhooks_baixo_estoque, processar_outbox
+
+
+@override_settings(WEBHOOK_BAIXO_ESTOQUE_URL=None)
+class DespachoConcorrenteTests(TransactionTestCase):
+    PEDIDOS = 20
+    ESTOQUE_INICIAL = 10
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.armazem = Armazem.objects.create(nome='Central')
+        self.produto = Produto.objects.create(nome='Produto', sku='SKU-1', categoria=Categoria.objects.create(nome='Geral'))
+        EstoqueItem.objects.create(produto=self.produto, armazem=self.armazem, quantidade=self.ESTOQUE_INICIAL)
+
+        cliente = Cliente.objects.create(nome='Cliente', email='cliente@example.com')
+        self.pedidos = []
+        for _ in range(self.PEDIDOS):
+            pedido = PedidoVenda.objects.create(cliente=cliente, status='PAGO', responsavel_venda=self.usuario)
+            ItemPedidoVenda.objects.create(pedido_venda=pedido, produto=self.produto, quantidade=1, preco_unitario=10)
+            self.pedidos.append(pedido)
+
+    def test_despachos_paralelos_nao_vendem_alem_do_estoque(self):
+        barreira = threading.Barrier(self.PEDIDOS)
+        respostas = []
+
+        def despachar(pedido):
+            cliente = APIClient()
+            cliente.force_authenticate(self.usuario)
+            try:
+                barreira.wait()
+                resposta = cliente.post(f'/api/pedidos/venda/{pedido.id}/despachar_pedido/', {'armazem_id': self.armazem.id}, format='json')
+                respostas.append(resposta.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=despachar, args=(pedido,)) for pedido in self.pedidos]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        item = EstoqueItem.objects.get(produto=self.produto, armazem=self.armazem)
+        despachados = PedidoVenda.objects.filter(status='DESPACHADO').count()
+
+        self.assertEqual(len(respostas), self.PEDIDOS)
+        self.assertEqual(despachados, self.ESTOQUE_INICIAL)
+        self.assertEqual(respostas.count(200), despachados)
+        self.assertEqual(respostas.count(400), self.PEDIDOS - despachados)
+        self.assertGreaterEqual(item.quantidade, 0)
+        self.assertEqual(item.quantidade, self.ESTOQUE_INICIAL - despachados)
+        self.assertEqual(MovimentacaoEstoque.objects.filter(tipo='SAIDA').count(), despachados)
+
+    def test_mesmo_pedido_nao_e_despachado_duas_vezes(self):
+        pedido = self.pedidos[0]
+        cliente = APIClient()
+        cliente.force_authenticate(self.usuario)
+
+        primeira = cliente.post(f'/api/pedidos/venda/{pedido.id}/despachar_pedido/', {'armazem_id': self.armazem.id}, format='json')
+        segunda = cliente.post(f'/api/pedidos/venda/{pedido.id}/despachar_pedido/', {'armazem_id': self.armazem.id}, format='json')
+
+        self.assertEqual(primeira.status_code, 200)
+        self.assertEqual(segunda.status_code, 400)
+        self.assertEqual(EstoqueItem.objects.get(produto=self.produto).quantidade, self.ESTOQUE_INICIAL - 1)
+
+
+class _ServidorWebhookFalso(HTTPServer):
+    def __init__(self, status_resposta=200):
+        self.status_resposta = status_resposta
+        self.recebidos = []
+        super().__init__(('127.0.0.1', 0), _ReceptorWebhook)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}/webhook"
+
+
+class _ReceptorWebhook(BaseHTTPRequestHandler):
+    def do_POST(self):
+        corpo = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.recebidos.append(json.loads(corpo))
+        self.send_response(self.server.status_resposta)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(WEBHOOK_ENVIO_ASSINCRONO=False, WEBHOOK_TAMANHO_LOTE=2, WEBHOOK_MAX_TENTATIVAS=2, WEBHOOK_ATRASO_BASE=0)
+class OutboxWebhookTests(TestCase):
+    def setUp(self):
+        self.armazem = Armazem.objects.create(nome='Central')
+        self.itens = []
+        for i in range(3):
+            produto = Produto.objects.create(nome=f'Produto {i}', sku=f'SKU-{i}', estoque_minimo=5)
+            self.itens.append(EstoqueItem.objects.create(produto=produto, armazem=self.armazem, quantidade=1))
+
+    def _iniciar_servidor(self, status_resposta=200):
+        servidor = _ServidorWebhookFalso(status_resposta)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        self.addCleanup(servidor.server_close)
+        self.addCleanup(servidor.shutdown)
+        return servidor
+
+    def _enfileirar_todos(self, url):
+        with self.settings(WEBHOOK_BAIXO_ESTOQUE_URL=url):
+            with self.captureOnCommitCallbacks(execute=True):
+                enfileirar_webhooks_baixo_estoque(self.itens)
+
+    def test_alertas_sao_enviados_em_lotes_apos_o_commit(self):
+        servidor = self._iniciar_servidor()
+        self._enfileirar_todos(servidor.url)
+
+        self.assertEqual([len(corpo['alertas']) for corpo in servidor.recebidos], [2, 1])
+        self.assertEqual(EventoWebhook.objects.filter(status='ENVIADO').count(), 3)
+
+    def test_alerta_repetido_na_janela_e_deduplicado(self):
+        with self.settings(WEBHOOK_BAIXO_ESTOQUE_URL='http://127.0.0.1:9/webhook'):
+            self.assertEqual(len(enfileirar_webhooks_baixo_estoque(self.itens[:1])), 1)
+            self.assertEqual(len(enfileirar_webhooks_baixo_estoque(self.itens)), 2)
+            self.assertEqual(enfileirar_webhooks_baixo_estoque(self.itens), [])
+        self.assertEqual(EventoWebhook.objects.count(), 3)
+
+    def test_alerta_concorrente_na_mesma_janela_nao_duplica(self):
+        # Simula outra transação que gravou o alerta depois da consulta de deduplicação.
+        with self.settings(WEBHOOK_BAIXO_ESTOQUE_URL='http://127.0.0.1:9/webhook'):
+            enfileirar_webhooks_baixo_estoque(self.itens[:1])
+            with mock.patch('core.webhooks.EventoWebhook.objects.filter') as filtro:
+                filtro.return_value.exclude.return_value.values_list.return_value = []
+                enfileirar_webhooks_baixo_estoque(self.itens[:1])
+        self.assertEqual(EventoWebhook.objects.count(), 1)
+
+        EventoWebhook.objects.update(status='FALHOU')
+        with self.settings(WEBHOOK_BAIXO_ESTOQUE_URL='http://127.0.0.1:9/webhook'):
+            self.assertEqual(len(enfileirar_webhooks_baixo_estoque(self.itens[:1])), 1)
+        self.assertEqual(EventoWebhook.objects.count(), 2)
+
+    def test_falhas_sao_retentadas_e_depois_descartadas(self):
+        servidor = self._iniciar_servidor(status_resposta=500)
+        with self.assertLogs('core.webhooks', level='ERROR'):
+            self._enfileirar_todos(servidor.url)
+            self.assertEqual(EventoWebhook.objects.filter(status='PENDENTE', tentativas=1).count(), 3)
+            self.assertEqual(processar_outbox(), (0, 3))
+
+        self.assertEqual(EventoWebhook.objects.filter(status='FALHOU', tentativas=2).count(), 3)
+        self.assertEqual(processar_outbox(), (0, 0))
+
+
+class IndicadorBaixoEstoqueTests(TestCase):
+    def setUp(self):
+        self.armazem = Armazem.objects.create(nome='Central')
+        self.produto = Produto.objects.create(nome='Produto', sku='SKU-1', estoque_minimo=5)
+        self.item = EstoqueItem.objects.create(produto=self.produto, armazem=self.armazem, quantidade=10)
+
+    def test_indicador_acompanha_saidas_entradas_e_estoque_minimo(self):
+        self.assertFalse(self.item.abaixo_minimo)
+
+        registrar_saida(self.produto.id, self.armazem.id, 5, None, 'Teste')
+        self.item.refresh_from_db()
+        self.assertTrue(self.item.abaixo_minimo)
+
+        registrar_entrada(self.produto.id, self.armazem.id, 1, None, 'Teste')
+        self.item.refresh_from_db()
+        self.assertFalse(self.item.abaixo_minimo)
+
+        self.produto.estoque_minimo = 6
+        self.produto.save()
+        self.item.refresh_from_db()
+        self.assertTrue(self.item.abaixo_minimo)
+
+    def test_contagem_por_armazem_acompanha_o_indicador(self):
+        filial = Armazem.objects.create(nome='Filial')
+        with self.assertNumQueries(1):
+            # Com o produto em mãos, o pre_save não consulta o estoque mínimo.
+            EstoqueItem.objects.create(produto=self.produto, armazem=filial, quantidade=1)
+        self.assertEqual(ContagemBaixoEstoque.total(), 1)
+
+        registrar_saida(self.produto.id, self.armazem.id, 5, None, 'Teste')
+        self.assertEqual(dict(ContagemBaixoEstoque.objects.values_list('armazem', 'itens')), {self.armazem.id: 1, filial.id: 1})
+
+        self.produto.estoque_minimo = 0
+        self.produto.save()
+        self.assertEqual(ContagemBaixoEstoque.total(), 0)
+
+        self.produto.estoque_minimo = 5
+        self.produto.save()
+        EstoqueItem.objects.filter(armazem=filial).delete()
+        self.assertEqual(ContagemBaixoEstoque.total(), 1)
+        self.assertEqual(ContagemBaixoEstoque.total(), EstoqueItem.objects.filter(abaixo_minimo=True).count())
+
+
+@override_settings(WEBHOOK_BAIXO_ESTOQUE_URL=None)
+class MetricasDashboardTests(APITestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_authenticate(self.usuario)
+        self.armazem = Armazem.objects.create(nome='Central')
+        self.produto = Produto.objects.create(nome='Produto', sku='SKU-1', preco_custo=4)
+        fornecedor = Fornecedor.objects.create(nome_fantasia='Fornecedor')
+        self.compra = PedidoCompra.objects.create(fornecedor=fornecedor, status='APROVADO')
+        ItemPedidoCompra.objects.create(pedido_compra=self.compra, produto=self.produto, quantidade=10, preco_unitario=4)
+        self.venda = PedidoVenda.objects.create(cliente=Cliente.objects.create(nome='Cliente', email='cliente@example.com'), status='PAGO')
+        ItemPedidoVenda.objects.create(pedido_venda=self.venda, produto=self.produto, quantidade=3, preco_unitario=9)
+
+    def test_resumos_acompanham_as_operacoes_e_conferem_com_o_historico(self):
+        self.client.post(f'/api/pedidos/compra/{self.compra.id}/receber_pedido/', {'armazem_id': self.armazem.id}, format='json')
+        self.client.post(f'/api/pedidos/venda/{self.venda.id}/despachar_pedido/', {'armazem_id': self.armazem.id}, format='json')
+        self.client.post('/api/estoque/saida/', {'produto_id': self.produto.id, 'armazem_id': self.armazem.id, 'quantidade': 2}, format='json')
+        self.produto.preco_custo = 5
+        self.produto.save()
+
+        dados = self.client.get('/api/dashboard/').data
+        self.assertEqual(dados['total_vendas'], 27)
+        self.assertEqual(dados['total_compras'], 40)
+        self.assertEqual(dados['valor_total_inventario'], 25)
+        self.assertEqual(dados['top_5_produtos_vendidos'], [{'produto__nome': 'Produto', 'total_vendido': 3}])
+
+        call_command('recalcular_metricas', '--verificar', stdout=StringIO())
+        call_command('recalcular_metricas', stdout=StringIO())
+        self.assertEqual(self.client.get('/api/dashboard/').data['valor_total_inventario'], 25)
+
+    def test_periodo_invalido(self):
+        self.assertEqual(self.client.get('/api/dashboard/?data_inicio=ontem').status_code, 400)
+        resposta = self.client.get('/api/dashboard/?data_inicio=2024-02-31')
+        self.assertEqual(resposta.status_code, 400)
+        self.assertIn('data_inicio', resposta.data['erro'])
+
+
+class PaginacaoKeysetTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'senha'))
+        self.produto = Produto.objects.create(nome='Produto', sku='SKU-1')
+        armazem = Armazem.objects.create(nome='Central')
+        MovimentacaoEstoque.objects.bulk_create(
+            MovimentacaoEstoque(produto=self.produto, armazem=armazem, quantidade=i, tipo='ENTRADA') for i in range(7)
+        )
+
+    def test_percorre_historico_sem_repetir_nem_pular_com_datas_empatadas(self):
+        MovimentacaoEstoque.objects.update(data_movimentacao=MovimentacaoEstoque.objects.first().data_movimentacao)
+        ids, url = [], f'/api/produtos/{self.produto.id}/historico/?page_size=3'
+        while url:
+            resposta = self.client.get(url)
+            ids += [movimentacao['id'] for movimentacao in resposta.data['results']]
+            url = resposta.data['next']
+
+        self.assertEqual(ids, sorted(MovimentacaoEstoque.objects.values_list('id', flat=True), reverse=True))
+
+    def test_cursor_invalido(self):
+        resposta = self.client.get('/api/movimentacoes/?cursor=invalido')
+        self.assertEqual(resposta.status_code, 400)
+        self.assertIn('cursor', resposta.data)
+
+
+@override_settings(WEBHOOK_BAIXO_ESTOQUE_URL=None, CACHE_RESPOSTAS_TIMEOUT=0)
+class QuantidadeConsultasTests(APITestCase):
+    """O número de consultas de cada endpoint não pode crescer com o tamanho do resultado."""
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_authenticate(self.usuario)
+        self.armazem = Armazem.objects.create(nome='Central')
+        self.categoria = Categoria.objects.create(nome='Geral')
+        self.fornecedor = Fornecedor.objects.create(nome_fantasia='Fornecedor')
+        self.cliente = Cliente.objects.create(nome='Cliente', email='cliente@example.com')
+        self.criados = 0
+
+    def _popular(self, quantidade):
+        for _ in range(quantidade):
+            self.criados += 1
+            produto = Produto.objects.create(nome=f'Produto {self.criados}', sku=f'SKU-{self.criados}', categoria=self.categoria, fornecedor=self.fornecedor)
+            EstoqueItem.objects.create(produto=produto, armazem=self.armazem, quantidade=100)
+            MovimentacaoEstoque.objects.create(produto=produto, armazem=self.armazem, quantidade=100, tipo='ENTRADA', responsavel=self.usuario)
+            venda = PedidoVenda.objects.create(cliente=self.cliente, status='PAGO', responsavel_venda=self.usuario)
+            compra = PedidoCompra.objects.create(fornecedor=self.fornecedor, responsavel_pedido=self.usuario)
+            for _ in range(2):
+                ItemPedidoVenda.objects.create(pedido_venda=venda, produto=produto, quantidade=1, preco_unitario=1)
+                ItemPedidoCompra.objects.create(pedido_compra=compra, produto=produto, quantidade=1, preco_unitario=1)
+
+    def _contar(self, metodo, url, dados=None):
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = getattr(self.client, metodo)(url, dados, format='json')
+        self.assertLess(resposta.status_code, 300, resposta.data)
+        return len(consultas)
+
+    def test_listagens_com_numero_fixo_de_consultas(self):
+        urls = ['/api/produtos/', '/api/estoque/', '/api/movimentacoes/', '/api/pedidos/venda/', '/api/pedidos/compra/']
+        self._popular(1)
+        # Aquece o cache de papéis (IsGerente), que depende da ordem dos testes.
+        papeis_do_usuario(self.usuario)
+        poucas = {url: self._contar('get', url) for url in urls}
+        self._popular(5)
+        muitas = {url: self._contar('get', url) for url in urls}
+        self.assertEqual(poucas, muitas)
+
+    def test_despacho_com_numero_fixo_de_consultas(self):
+        def pedido_com_linhas(linhas):
+            self._popular(linhas)
+            pedido = PedidoVenda.objects.create(cliente=self.cliente, status='PAGO')
+            for produto in Produto.objects.order_by('-id')[:linhas]:
+                ItemPedidoVenda.objects.create(pedido_venda=pedido, produto=produto, quantidade=1, preco_unitario=1)
+            return f'/api/pedidos/venda/{pedido.id}/despachar_pedido/'
+
+        # O primeiro despacho do dia cria as linhas de resumo; mede-se o regime normal a partir do segundo.
+        self._contar('post', pedido_com_linhas(1), {'armazem_id': self.armazem.id})
+        uma_linha = self._contar('post', pedido_com_linhas(1), {'armazem_id': self.armazem.id})
+        varias_linhas = self._contar('post', pedido_com_linhas(8), {'armazem_id': self.armazem.id})
+        self.assertEqual(uma_linha, varias_linhas)
+
+
+@override_settings(WEBHOOK_BAIXO_ESTOQUE_URL=None)
+class MovimentacaoEmLoteConcorrenteTests(TransactionTestCase):
+    LOTES = 8
+
+    # No SQLite as transações concorrentes falham antes, ao disputar o lock de escrita do arquivo ("database is locked").
+    @skipIf(connection.vendor == 'sqlite', 'escritas concorrentes no mesmo arquivo SQLite')
+    def test_lotes_paralelos_criam_o_mesmo_item_sem_conflito(self):
+        usuario = User.objects.create_superuser('admin', 'admin@example.com', 'senha')
+        armazem = Armazem.objects.create(nome='Central')
+        produto = Produto.objects.create(nome='Produto', sku='SKU-1')
+        barreira = threading.Barrier(self.LOTES)
+        respostas = []
+
+        def lote():
+            cliente = APIClient()
+            cliente.force_authenticate(usuario)
+            try:
+                barreira.wait()
+                respostas.append(cliente.post('/api/estoque/lote/', {'movimentacoes': [
+                    {'tipo': 'ENTRADA', 'produto_id': produto.id, 'armazem_id': armazem.id, 'quantidade': 2},
+                ]}, format='json').status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=lote) for _ in range(self.LOTES)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(respostas, [200] * self.LOTES)
+        self.assertEqual(EstoqueItem.objects.get(produto=produto, armazem=armazem).quantidade, 2 * self.LOTES)
+
+
+@override_settings(WEBHOOK_BAIXO_ESTOQUE_URL=None)
+class MovimentacaoEmLoteTests(APITestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_authenticate(self.usuario)
+        self.armazem = Armazem.objects.create(nome='Central')
+        self.produtos = [Produto.objects.create(nome=sku, sku=sku, estoque_minimo=2) for sku in ('A', 'B')]
+        registrar_entrada(self.produtos[0].id, self.armazem.id, 5, self.usuario, 'Compra')
+
+    def _lote(self, linhas, modo=None):
+        return self.client.post('/api/estoque/lote/', {'movimentacoes': linhas, **({'modo': modo} if modo else {})}, format='json')
+
+    def _linha(self, tipo, produto, quantidade):
+        return {'tipo': tipo, 'produto_id': produto.id, 'armazem_id': self.armazem.id, 'quantidade': quantidade}
+
+    def _saldos(self):
+        return dict(EstoqueItem.objects.values_list('produto__sku', 'quantidade'))
+
+    def test_tudo_ou_nada_desfaz_o_lote_inteiro(self):
+        resposta = self._lote([
+            self._linha('ENTRADA', self.produtos[1], 4),
+            self._linha('SAIDA', self.produtos[0], 2),
+            self._linha('SAIDA', self.produtos[0], 10),
+        ])
+
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual((resposta.data['aplicado'], resposta.data['sucessos'], resposta.data['falhas']), (False, 0, 3))
+        self.assertEqual(resposta.data['resultados'][2]['erro'], 'Estoque insuficiente.')
+        self.assertEqual(resposta.data['resultados'][0]['erro'], 'Lote cancelado por erro em outra linha.')
+        # Nem o item que a entrada criaria fica para trás.
+        self.assertEqual(self._saldos(), {'A': 5})
+        self.assertEqual(MovimentacaoEstoque.objects.count(), 1)
+
+    def test_melhor_esforco_aplica_as_linhas_validas(self):
+        resposta = self._lote([
+            self._linha('ENTRADA', self.produtos[1], 4),
+            self._linha('SAIDA', self.produtos[0], 10),
+            self._linha('SAIDA', self.produtos[1], 3),
+            self._linha('SAIDA', self.produtos[0], 4),
+        ], modo='melhor_esforco')
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual([r['sucesso'] for r in resposta.data['resultados']], [True, False, True, True])
+        self.assertEqual(resposta.data['resultados'][1]['erro'], 'Estoque insuficiente.')
+        self.assertEqual([r.get('nova_quantidade') for r in resposta.data['resultados']], [4, None, 1, 1])
+        self.assertEqual(self._saldos(), {'A': 1, 'B': 1})
+        self.assertEqual(set(EstoqueItem.objects.filter(abaixo_minimo=True).values_list('produto__sku', flat=True)), {'A', 'B'})
+        self.assertEqual(Produto.objects.get(sku='B').estoque_total, 1)
+
+    def test_item_criado_por_outro_lote_antes_da_insercao(self):
+        # No SQLite não há escritores concorrentes: o outro lote grava o item entre a validação e a inserção.
+        inserir = EstoqueItem.objects.bulk_create
+
+        def outro_lote_primeiro(*args, **kwargs):
+            registrar_entrada(self.produtos[1].id, self.armazem.id, 3, self.usuario, 'Outro lote')
+            return inserir(*args, **kwargs)
+
+        with mock.patch.object(EstoqueItem.objects, 'bulk_create', side_effect=outro_lote_primeiro):
+            resposta = self._lote([self._linha('ENTRADA', self.produtos[1], 2), self._linha('SAIDA', self.produtos[1], 4)])
+
+        self.assertEqual(resposta.status_code, 200, resposta.data)
+        self.assertEqual(resposta.data['resultados'][1]['nova_quantidade'], 1)
+        self.assertEqual(self._saldos(), {'A': 5, 'B': 1})
+        self.assertEqual(Produto.objects.get(sku='B').estoque_total, 1)
+
+    def test_itens_sao_travados_em_ordem_de_id(self):
+        # Mesma ordem de travamento em todos os lotes: dois lotes com os mesmos itens não entram em deadlock.
+        registrar_entrada(self.produtos[1].id, self.armazem.id, 5, self.usuario, 'Compra')
+        travar = QuerySet.select_for_update
+        travados = []
+
+        def registrar(queryset, *args, **kwargs):
+            travados.append(queryset.model)
+            return travar(queryset, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'select_for_update', autospec=True, side_effect=registrar), \
+                CaptureQueriesContext(connection) as consultas:
+            self._lote([self._linha('SAIDA', self.produtos[1], 1), self._linha('SAIDA', self.produtos[0], 1)])
+
+        self.assertEqual(travados, [EstoqueItem])
+        leitura = next(c['sql'] for c in consultas.captured_queries if c['sql'].startswith('SELECT') and 'FROM "core_estoqueitem"' in c['sql'])
+        self.assertTrue(leitura.endswith('ORDER BY "core_estoqueitem"."id" ASC'), leitura)
+
+    def test_linhas_invalidas(self):
+        resposta = self._lote([
+            {'tipo': 'AJUSTE', 'produto_id': self.produtos[0].id, 'armazem_id': self.armazem.id, 'quantidade': 1},
+            {'tipo': 'ENTRADA', 'produto_id': 'x', 'armazem_id': self.armazem.id, 'quantidade': 1},
+            self._linha('ENTRADA', self.produtos[0], 0),
+            {'tipo': 'ENTRADA', 'produto_id': 999, 'armazem_id': self.armazem.id, 'quantidade': 1},
+            {'tipo': 'ENTRADA', 'produto_id': self.produtos[0].id, 'armazem_id': 999, 'quantidade': 1},
+            self._linha('SAIDA', self.produtos[1], 1),
+            'linha',
+        ], modo='MELHOR_ESFORCO')
+
+        self.assertEqual([r['erro'] for r in resposta.data['resultados']], [
+            'O tipo deve ser ENTRADA ou SAIDA.',
+            'produto_id, armazem_id e quantidade devem ser números inteiros.',
+            'A quantidade deve ser positiva.',
+            'Produto não encontrado.',
+            'Armazém não encontrado.',
+            'Este produto não existe no estoque deste armazém.',
+            'Linha inválida.',
+        ])
+        self.assertEqual(self._saldos(), {'A': 5})
+        self.assertEqual(self._lote([]).status_code, 400)
+        self.assertEqual(self._lote([self._linha('ENTRADA', self.produtos[0], 1)], modo='parcial').status_code, 400)
+
+
+class CriacaoPedidoEmLoteTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'senha'))
+        self.cliente = Cliente.objects.create(nome='Cliente', email='cliente@example.com')
+        self.produtos = [Produto.objects.create(nome=f'Produto {i}', sku=f'SKU-{i}') for i in range(20)]
+
+    def _criar(self, produtos):
+        itens = [{'produto': produto.id, 'quantidade': 1, 'preco_unitario': '2.50'} for produto in produtos]
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.post('/api/pedidos/venda/', {'cliente': self.cliente.id, 'itens_para_criar': itens}, format='json')
+        self.assertEqual(resposta.status_code, 201, resposta.data)
+        self.assertEqual(len(resposta.data['itens']), len(produtos))
+        return len(consultas)
+
+    def test_numero_de_consultas_nao_cresce_com_as_linhas(self):
+        self.assertEqual(self._criar(self.produtos[:1]), self._criar(self.produtos))
+
+    def test_produto_inexistente_e_rejeitado_sem_criar_o_pedido(self):
+        resposta = self.client.post('/api/pedidos/venda/', {
+            'cliente': self.cliente.id,
+            'itens_para_criar': [{'produto': self.produtos[0].id, 'quantidade': 1, 'preco_unitario': '1.00'}, {'produto': 0, 'quantidade': 1, 'preco_unitario': '1.00'}]
+        }, format='json')
+        self.assertEqual(resposta.status_code, 400)
+        self.assertFalse(PedidoVenda.objects.exists())
+
+
+class ExportacaoTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'senha'))
+        self.armazem = Armazem.objects.create(nome='Central')
+        self.produtos = [Produto.objects.create(nome=f'Produto, {i}', sku=f'SKU-{i}') for i in range(3)]
+        for produto in self.produtos:
+            EstoqueItem.objects.create(produto=produto, armazem=self.armazem, quantidade=5)
+
+    def _conteudo(self, url):
+        resposta = self.client.get(url)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(resposta.streaming)
+        return b''.join(resposta.streaming_content).decode('utf-8')
+
+    def test_csv_respeita_filtros(self):
+        linhas = self._conteudo(f'/api/estoque/exportar/?produto={self.produtos[1].id}').splitlines()
+        self.assertEqual(linhas[0].split(',')[:3], ['id', 'produto_id', 'produto_sku'])
+        self.assertEqual(len(linhas), 2)
+        self.assertIn('"Produto, 1"', linhas[1])
+
+    def test_ndjson_uma_linha_por_registro(self):
+        linhas = self._conteudo('/api/estoque/exportar/?formato=ndjson').splitlines()
+        self.assertEqual([json.loads(linha)['produto_sku'] for linha in linhas], ['SKU-0', 'SKU-1', 'SKU-2'])
+
+    def test_formato_invalido(self):
+        self.assertEqual(self.client.get('/api/estoque/exportar/?formato=xml').status_code, 400)
+
+
+class ImportacaoCatalogoTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'senha'))
+        self.fornecedor = Fornecedor.objects.create(nome_fantasia='Fornecedor', cnpj='11.111.111/0001-11')
+        self.produto = Produto.objects.create(nome='Existente', sku='SKU-1', preco_custo=1, preco_venda=5)
+        EstoqueItem.objects.create(produto=self.produto, armazem=Armazem.objects.create(nome='Central'), quantidade=3)
+
+    def _importar(self, conteudo, nome='catalogo.csv'):
+        arquivo = SimpleUploadedFile(nome, conteudo.encode('utf-8'))
+        return self.client.post('/api/produtos/importar/', {'arquivo': arquivo}, format='multipart')
+
+    def test_upsert_por_sku_com_erros_por_linha(self):
+        resposta = self._importar(
+            'sku,nome,categoria,fornecedor_cnpj,preco_custo,estoque_minimo\n'
+            'SKU-1,,Bebidas,,2.00,5\n'
+            'SKU-2,Novo,Bebidas,11.111.111/0001-11,1.00,0\n'
+            'SKU-3,Inválido,,,abc,0\n'
+            'SKU-4,Sem fornecedor,,99.999.999/0001-99,1.00,0\n'
+        )
+        self.assertEqual(resposta.status_code, 200, resposta.data)
+        self.assertEqual((resposta.data['criados'], resposta.data['atualizados'], resposta.data['erros']), (1, 1, 2))
+        self.assertEqual([erro['linha'] for erro in resposta.data['detalhes_erros']], [4, 5])
+
+        self.produto.refresh_from_db()
+        self.assertEqual((self.produto.nome, self.produto.preco_venda, self.produto.categoria.nome), ('Existente', 5, 'Bebidas'))
+        self.assertEqual(Produto.objects.get(sku='SKU-2').fornecedor, self.fornecedor)
+        # Sinais de Produto não rodam no bulk_create: indicador e métricas são sincronizados pelo importador.
+        self.assertTrue(EstoqueItem.objects.get(produto=self.produto).abaixo_minimo)
+        self.assertEqual(ResumoDiario.objects.get().variacao_inventario, 3)
+
+    def test_ndjson(self):
+        resposta = self._importar('{"sku": "SKU-9", "nome": "Novo", "preco_venda": 2}\nnão é json\n', 'catalogo.ndjson')
+        self.assertEqual((resposta.data['criados'], resposta.data['erros']), (1, 1))
+        self.assertEqual(Produto.objects.get(sku='SKU-9').preco_venda, 2)
+
+
+class CachePapeisTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.gerentes = Group.objects.create(name='Gerentes')
+        self.usuario = User.objects.create_user('gerente', password='senha')
+
+    def _pode(self):
+        requisicao = APIRequestFactory().get('/')
+        requisicao.user = User.objects.get(pk=self.usuario.pk)
+        return IsGerente().has_permission(requisicao, None)
+
+    def test_papeis_em_cache_nao_consultam_o_banco(self):
+        self.usuario.groups.add(self.gerentes)
+        self.assertTrue(self._pode())
+        usuario = User.objects.get(pk=self.usuario.pk)
+        requisicao = APIRequestFactory().get('/')
+        requisicao.user = usuario
+        with self.assertNumQueries(0):
+            self.assertTrue(IsGerente().has_permission(requisicao, None))
+
+    def _alterar(self, alteracao):
+        with self.captureOnCommitCallbacks(execute=True):
+            alteracao()
+
+    def test_mudancas_de_grupo_invalidam_o_cache(self):
+        self.assertFalse(self._pode())
+        self._alterar(lambda: self.usuario.groups.add(self.gerentes))
+        self.assertTrue(self._pode())
+        self._alterar(lambda: self.gerentes.user_set.remove(self.usuario))
+        self.assertFalse(self._pode())
+        self._alterar(lambda: self.usuario.groups.add(self.gerentes))
+        self.assertTrue(self._pode())
+        self._alterar(lambda: self.usuario.groups.clear())
+        self.assertFalse(self._pode())
+        self._alterar(lambda: self.usuario.groups.add(self.gerentes))
+        self.assertTrue(self._pode())
+        self.gerentes.name = 'Ex-gerentes'
+        self._alterar(self.gerentes.save)
+        self.assertFalse(self._pode())
+
+    def test_invalidacao_so_apos_o_commit(self):
+        self._alterar(lambda: self.usuario.groups.add(self.gerentes))
+        self.assertTrue(self._pode())
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.usuario.groups.clear()
+        # Antes do commit, o cache não é esvaziado (senão uma leitura concorrente guardaria os papéis antigos de novo).
+        self.assertEqual(cache.get(f'papeis:usuario:{self.usuario.pk}'), frozenset({'Gerentes'}))
+        for callback in callbacks:
+            callback()
+        self.assertFalse(self._pode())
+
+
+@override_settings(AUTENTICACAO_SEM_ESTADO=True)
+class AutenticacaoSemEstadoTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.gerentes = Group.objects.create(name='Gerentes')
+        self.usuario = User.objects.create_user('gerente', password='senha')
+        self.usuario.groups.add(self.gerentes)
+        self.armazem = Armazem.objects.create(nome='Central')
+        self.produto = Produto.objects.create(nome='Produto', sku='SKU-1')
+
+    def _autenticar(self):
+        tokens = self.client.post('/api/token/', {'username': 'gerente', 'password': 'senha'}, format='json').data
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        return tokens
+
+    def test_leitura_nao_consulta_usuario_nem_grupos(self):
+        self._autenticar()
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.client.get('/api/dashboard/').status_code, 200)
+        self.assertFalse([c for c in consultas.captured_queries if 'auth_user' in c['sql']])
+
+    def test_escrita_com_responsavel_usa_o_usuario_do_banco(self):
+        self._autenticar()
+        resposta = self.client.post('/api/estoque/entrada/', {'produto_id': self.produto.id, 'armazem_id': self.armazem.id, 'quantidade': 1}, format='json')
+        self.assertEqual(resposta.status_code, 200, resposta.data)
+        self.assertEqual(MovimentacaoEstoque.objects.get().responsavel, self.usuario)
+
+    def test_desativacao_e_mudanca_de_grupo_revogam_o_token(self):
+        tokens = self._autenticar()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.groups.remove(self.gerentes)
+        self.assertEqual(self.client.get('/api/dashboard/').status_code, 401)
+
+        renovado = self.client.post('/api/token/refresh/', {'refresh': tokens['refresh']}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {renovado.data['access']}")
+        self.assertEqual(self.client.get('/api/dashboard/').status_code, 403)
+
+        self.usuario.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.save()
+        self.assertEqual(self.client.get('/api/estoque/').status_code, 401)
+        self.assertEqual(self.client.post('/api/token/refresh/', {'refresh': tokens['refresh']}, format='json').status_code, 401)
+
+    def test_revogacao_no_mesmo_segundo_da_emissao(self):
+        # Emissão, revogação e nova emissão em poucos milissegundos (em geral no mesmo segundo do `iat`).
+        self._autenticar()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.set_password('nova')
+            self.usuario.save()
+        self.assertEqual(self.client.get('/api/dashboard/').status_code, 401)
+
+        tokens = self.client.post('/api/token/', {'username': 'gerente', 'password': 'nova'}, format='json').data
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(self.client.get('/api/dashboard/').status_code, 200)
+
+        # Tokens sem a claim de emissão: o `iat` do mesmo segundo da revogação é recusado.
+        token = AccessToken(tokens['access'])
+        del token[CLAIM_EMITIDO_EM]
+        token['iat'] = cache.get(f'jwt:revogado:{self.usuario.pk}') // 10 ** 9
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(self.client.get('/api/dashboard/').status_code, 401)
+
+    def test_sem_cache_compartilhado_le_o_usuario_do_banco(self):
+        self._autenticar()
+        with override_settings(AUTENTICACAO_SEM_ESTADO=None), CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.client.get('/api/dashboard/').status_code, 200)
+        self.assertTrue([c for c in consultas.captured_queries if 'auth_user' in c['sql']])
+
+        # Desativado em outro processo (sem revogação neste): o token é recusado pelo banco.
+        User.objects.filter(pk=self.usuario.pk).update(is_active=False)
+        with override_settings(AUTENTICACAO_SEM_ESTADO=None):
+            self.assertEqual(self.client.get('/api/dashboard/').status_code, 401)
+
+    def test_cache_de_revogacao_fora_do_ar_le_o_usuario_do_banco(self):
+        self._autenticar()
+        User.objects.filter(pk=self.usuario.pk).update(is_active=False)
+        with mock.patch('core.autenticacao.cache.get', side_effect=ConnectionError), self.assertLogs('core.autenticacao', 'WARNING'):
+            self.assertEqual(self.client.get('/api/dashboard/').status_code, 401)
+
+
+class CacheRespostasTests(APITestCase):
+    def setUp(self):
+        caches['respostas'].clear()
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'senha'))
+        self.categoria = Categoria.objects.create(nome='Bebidas')
+        self.produto = Produto.objects.create(nome='Suco', sku='SKU-1', categoria=self.categoria)
+
+    def test_segunda_leitura_vem_do_cache_sem_consultas(self):
+        self.assertEqual(self.client.get('/api/produtos/')['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            resposta = self.client.get('/api/produtos/')
+        self.assertEqual(resposta['X-Cache'], 'HIT')
+        self.assertEqual(resposta.data['results'][0]['nome'], 'Suco')
+        self.assertEqual(self.client.get('/api/produtos/?search=outro')['X-Cache'], 'MISS')
+
+    def test_etag_devolve_304(self):
+        etag = self.client.get(f'/api/produtos/{self.produto.id}/')['ETag']
+        resposta = self.client.get(f'/api/produtos/{self.produto.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 304)
+
+    def test_alteracoes_invalidam_os_recursos_dependentes(self):
+        self.client.get('/api/produtos/')
+        self.client.get('/api/armazens/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.categoria.nome = 'Sucos'
+            self.categoria.save()
+
+        resposta = self.client.get('/api/produtos/')
+        self.assertEqual((resposta['X-Cache'], resposta.data['results'][0]['categoria']), ('MISS', 'Sucos'))
+        self.assertEqual(self.client.get('/api/armazens/')['X-Cache'], 'HIT')
+
+    def test_movimentacao_invalida_so_os_produtos_movimentados(self):
+        armazem = Armazem.objects.create(nome='Central')
+        outro = Produto.objects.create(nome='Água', sku='SKU-2', categoria=self.categoria)
+        usuario = User.objects.get(username='admin')
+        self.client.get('/api/produtos/')
+        self.client.get(f'/api/produtos/{outro.id}/')
+        self.client.get('/api/produtos/?em_estoque=true')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            registrar_entrada(self.produto.id, armazem.id, 3, usuario, 'Compra')
+
+        self.assertEqual(self.client.get(f'/api/produtos/{outro.id}/')['X-Cache'], 'HIT')
+        resposta = self.client.get('/api/produtos/')
+        self.assertEqual(resposta['X-Cache'], 'MISS')
+        self.assertEqual({p['sku']: p['estoque_total'] for p in resposta.data['results']}, {'SKU-1': 3, 'SKU-2': 0})
+        self.assertEqual(self.client.get('/api/produtos/')['X-Cache'], 'HIT')
+        # Filtros pelo estoque não passam pelo cache.
+        resposta = self.client.get('/api/produtos/?em_estoque=true')
+        self.assertNotIn('X-Cache', resposta)
+        self.assertEqual([p['sku'] for p in resposta.data['results']], ['SKU-1'])
+
+
+class EstoqueTotalProdutoTests(APITestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_authenticate(self.usuario)
+        self.armazens = [Armazem.objects.create(nome=nome) for nome in ('Central', 'Filial')]
+        self.produto = Produto.objects.create(nome='Com estoque', sku='SKU-1')
+        self.sem_estoque = Produto.objects.create(nome='Sem estoque', sku='SKU-2')
+
+    def test_total_acompanha_movimentacoes_e_filtros_usam_o_total(self):
+        registrar_entrada(self.produto.id, self.armazens[0].id, 5, self.usuario, 'Compra')
+        registrar_entrada(self.produto.id, self.armazens[1].id, 7, self.usuario, 'Compra')
+        registrar_saida(self.produto.id, self.armazens[0].id, 2, self.usuario, 'Venda')
+        self.client.post('/api/estoque/lote/', {'movimentacoes': [
+            {'tipo': 'SAIDA', 'produto_id': self.produto.id, 'armazem_id': self.armazens[1].id, 'quantidade': 1},
+        ]}, format='json')
+
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.estoque_total, 9)
+
+        resposta = self.client.get('/api/produtos/?em_estoque=true')
+        self.assertEqual([p['sku'] for p in resposta.data['results']], ['SKU-1'])
+        self.assertEqual(resposta.data['results'][0]['estoque_por_armazem'], [
+            {'armazem': self.armazens[0].id, 'quantidade': 3}, {'armazem': self.armazens[1].id, 'quantidade': 6},
+        ])
+        self.assertEqual(self.client.get('/api/produtos/?quantidade_min=10').data['count'], 0)
+
+    def test_reconciliacao_repara_divergencias(self):
+        registrar_entrada(self.produto.id, self.armazens[0].id, 4, self.usuario, 'Compra')
+        Produto.objects.filter(pk=self.produto.pk).update(estoque_total=1)
+        with self.assertRaises(CommandError):
+            call_command('reconciliar_estoque', stdout=StringIO())
+        call_command('reconciliar_estoque', corrigir=True, stdout=StringIO())
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.estoque_total, 4)
+
+
+class ReservaConcorrenteTests(TransactionTestCase):
+    PEDIDOS = 20
+    ESTOQUE_INICIAL = 10
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.armazem = Armazem.objects.create(nome='Central')
+        self.produto = Produto.objects.create(nome='Produto', sku='SKU-1')
+        self.cliente = Cliente.objects.create(nome='Cliente', email='cliente@example.com')
+        EstoqueItem.objects.create(produto=self.produto, armazem=self.armazem, quantidade=self.ESTOQUE_INICIAL)
+
+    def test_checkouts_paralelos_nao_reservam_alem_do_estoque(self):
+        barreira = threading.Barrier(self.PEDIDOS)
+        respostas = []
+
+        def criar_pedido():
+            cliente = APIClient()
+            cliente.force_authenticate(self.usuario)
+            try:
+                barreira.wait()
+                resposta = cliente.post('/api/pedidos/venda/', {
+                    'cliente': self.cliente.id, 'armazem': self.armazem.id,
+                    'itens_para_criar': [{'produto': self.produto.id, 'quantidade': 1, 'preco_unitario': '10.00'}],
+                }, format='json')
+                respostas.append(resposta.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=criar_pedido) for _ in range(self.PEDIDOS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        item = EstoqueItem.objects.get(produto=self.produto, armazem=self.armazem)
+        self.assertEqual(respostas.count(201), self.ESTOQUE_INICIAL)
+        self.assertEqual(respostas.count(400), self.PEDIDOS - self.ESTOQUE_INICIAL)
+        self.assertEqual(item.reservado, self.ESTOQUE_INICIAL)
+        self.assertEqual(ReservaEstoque.objects.count(), self.ESTOQUE_INICIAL)
+        self.assertEqual(PedidoVenda.objects.count(), self.ESTOQUE_INICIAL)
+
+
+class ReservaEstoqueTests(APITestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_authenticate(self.usuario)
+        self.armazem = Armazem.objects.create(nome='Central')
+        self.produto = Produto.objects.create(nome='Produto', sku='SKU-1')
+        self.cliente = Cliente.objects.create(nome='Cliente', email='cliente@example.com')
+        registrar_entrada(self.produto.id, self.armazem.id, 5, self.usuario, 'Compra')
+
+    def _criar_pedido(self, quantidade, **extra):
+        return self.client.post('/api/pedidos/venda/', {
+            'cliente': self.cliente.id, 'armazem': self.armazem.id,
+            'itens_para_criar': [{'produto': self.produto.id, 'quantidade': quantidade, 'preco_unitario': '10.00'}],
+            **extra,
+        }, format='json')
+
+    def _item(self):
+        return EstoqueItem.objects.get(produto=self.produto, armazem=self.armazem)
+
+    def test_saida_avulsa_respeita_o_reservado(self):
+        self.assertEqual(self._criar_pedido(3).status_code, 201)
+        with self.assertRaises(EstoqueInsuficiente):
+            registrar_saida(self.produto.id, self.armazem.id, 3, self.usuario, 'Avulsa')
+        registrar_saida(self.produto.id, self.armazem.id, 2, self.usuario, 'Avulsa')
+        self.assertEqual((self._item().quantidade, self._item().reservado), (3, 3))
+        self.assertEqual(self._criar_pedido(1).status_code, 400)
+
+    def test_despacho_consome_a_reserva(self):
+        pedido_id = self._criar_pedido(4).data['id']
+        self.client.patch(f'/api/pedidos/venda/{pedido_id}/', {'status': 'PAGO'}, format='json')
+        self.assertTrue(ReservaEstoque.objects.filter(pedido_venda_id=pedido_id, expira_em__isnull=True).exists())
+
+        resposta = self.client.post(f'/api/pedidos/venda/{pedido_id}/despachar_pedido/', {}, format='json')
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual((self._item().quantidade, self._item().reservado), (1, 0))
+        self.assertFalse(ReservaEstoque.objects.exists())
+        self.assertEqual(MovimentacaoEstoque.objects.filter(tipo='SAIDA').get().quantidade, -4)
+
+    def test_despacho_com_reserva_recusa_outro_armazem(self):
+        pedido_id = self._criar_pedido(4).data['id']
+        self.client.patch(f'/api/pedidos/venda/{pedido_id}/', {'status': 'PAGO'}, format='json')
+        outro = Armazem.objects.create(nome='Filial')
+        url = f'/api/pedidos/venda/{pedido_id}/despachar_pedido/'
+
+        self.assertEqual(self.client.post(url, {'armazem_id': outro.id}, format='json').status_code, 400)
+        self.assertEqual(PedidoVenda.objects.get(pk=pedido_id).status, 'PAGO')
+        self.assertEqual(self.client.post(url, {'armazem_id': self.armazem.id}, format='json').status_code, 200)
+        self.assertEqual((self._item().quantidade, self._item().reservado), (1, 0))
+
+    def test_cancelamento_e_expiracao_devolvem_o_disponivel(self):
+        cancelado = self._criar_pedido(2).data['id']
+        self._criar_pedido(3)
+        self.assertEqual(self._item().reservado, 5)
+
+        self.client.patch(f'/api/pedidos/venda/{cancelado}/', {'status': 'CANCELADO'}, format='json')
+        self.assertEqual(self._item().reservado, 3)
+
+        ReservaEstoque.objects.update(expira_em=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(liberar_reservas_expiradas(), 1)
+        self.assertEqual(self._item().reservado, 0)
+        self.assertEqual(self._criar_pedido(5).status_code, 201)
+
+    def test_despacho_so_pela_acao(self):
+        pedido_id = self._criar_pedido(4).data['id']
+        self.client.patch(f'/api/pedidos/venda/{pedido_id}/', {'status': 'PAGO'}, format='json')
+
+        resposta = self.client.patch(f'/api/pedidos/venda/{pedido_id}/', {'status': 'DESPACHADO'}, format='json')
+        self.assertEqual(resposta.status_code, 400)
+        self.assertIn('status', resposta.data)
+        self.assertEqual(PedidoVenda.objects.get(pk=pedido_id).status, 'PAGO')
+        self.assertEqual((self._item().quantidade, self._item().reservado), (5, 4))
+
+        self.client.post(f'/api/pedidos/venda/{pedido_id}/despachar_pedido/', {}, format='json')
+        resposta = self.client.patch(f'/api/pedidos/venda/{pedido_id}/', {'status': 'PAGO'}, format='json')
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual((self._item().quantidade, self._item().reservado), (1, 0))
+
+    def test_sair_de_pago_volta_a_reserva_a_expirar(self):
+        pedido_id = self._criar_pedido(4).data['id']
+        self.client.patch(f'/api/pedidos/venda/{pedido_id}/', {'status': 'PAGO'}, format='json')
+        self.assertEqual(ReservaEstoque.objects.get().expira_em, None)
+
+        resposta = self.client.patch(f'/api/pedidos/venda/{pedido_id}/', {'status': 'AGUARDANDO_PAGAMENTO'}, format='json')
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertGreater(ReservaEstoque.objects.get().expira_em, timezone.now())
+        ReservaEstoque.objects.update(expira_em=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(liberar_reservas_expiradas(), 1)
+        self.assertEqual(self._item().reservado, 0)
+
+
+class AlocacaoAutomaticaTests(APITestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_authenticate(self.usuario)
+        self.armazens = [Armazem.objects.create(nome=nome, prioridade=prioridade) for nome, prioridade in (('Norte', 0), ('Central', 5), ('Sul', 1))]
+        self.produtos = [Produto.objects.create(nome=nome, sku=nome) for nome in ('A', 'B')]
+        for armazem, saldo_a, saldo_b in zip(self.armazens, (2, 5, 3), (0, 5, 0)):
+            registrar_entrada(self.produtos[0].id, armazem.id, saldo_a, self.usuario, 'Compra')
+            if saldo_b:
+                registrar_entrada(self.produtos[1].id, armazem.id, saldo_b, self.usuario, 'Compra')
+        self.pedido = PedidoVenda.objects.create(cliente=Cliente.objects.create(nome='Cliente', email='cliente@example.com'), status='PAGO')
+
+    def _despachar(self, quantidade_a, **dados):
+        self.pedido.itens.all().delete()
+        for produto, quantidade in zip(self.produtos, (quantidade_a, 3)):
+            ItemPedidoVenda.objects.create(pedido_venda=self.pedido, produto=produto, quantidade=quantidade, preco_unitario=10)
+        return self.client.post(f'/api/pedidos/venda/{self.pedido.id}/despachar_pedido/', dados, format='json')
+
+    def _saldos(self):
+        return dict(EstoqueItem.objects.filter(produto=self.produtos[0]).values_list('armazem__nome', 'quantidade'))
+
+    def test_simulacao_por_estrategia_nao_altera_o_estoque(self):
+        menos = self._despachar(4, simular=True)
+        prioridade = self._despachar(4, simular=True, estrategia='prioridade')
+
+        self.assertEqual(menos.data['plano'], [{'armazem': self.armazens[1].id, 'itens': [
+            {'produto': self.produtos[0].id, 'quantidade': 4}, {'produto': self.produtos[1].id, 'quantidade': 3},
+        ]}])
+        self.assertEqual(prioridade.data['armazens'], 3)
+        self.assertEqual(prioridade.data['plano'][0], {'armazem': self.armazens[0].id, 'itens': [{'produto': self.produtos[0].id, 'quantidade': 2}]})
+        self.assertEqual(self._saldos(), {'Norte': 2, 'Central': 5, 'Sul': 3})
+        self.assertEqual(PedidoVenda.objects.get(pk=self.pedido.pk).status, 'PAGO')
+
+    def test_despacho_divide_o_pedido_entre_armazens(self):
+        resposta = self._despachar(9, estrategia='PRIORIDADE')
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(len(resposta.data['plano']), 3)
+        self.assertEqual(self._saldos(), {'Norte': 0, 'Central': 1, 'Sul': 0})
+        self.assertEqual(Produto.objects.get(pk=self.produtos[0].pk).estoque_total, 1)
+        self.assertEqual(MovimentacaoEstoque.objects.filter(tipo='SAIDA').count(), 4)
+
+    def test_estoque_somado_insuficiente_nao_baixa_nada(self):
+        resposta = self._despachar(11)
+
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual(resposta.data['erro'], 'Estoque insuficiente para o produto A.')
+        self.assertEqual(self._saldos(), {'Norte': 2, 'Central': 5, 'Sul': 3})
+        self.assertEqual(PedidoVenda.objects.get(pk=self.pedido.pk).status, 'PAGO')
+
+
+class BuscaProdutosTests(APITestCase):
+    def setUp(self):
+        caches['respostas'].clear()
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'senha'))
+        Produto.objects.create(nome='Cadeira Ergonômica Azul', sku='CAD-001', descricao='Para escritório')
+        Produto.objects.create(nome='Cadeado de aço', sku='CAD-002')
+        self.mesa = Produto.objects.create(nome='Mesa', sku='MES-1', descricao='Acompanha cadeira')
+
+    def _skus(self, texto):
+        resposta = self.client.get('/api/produtos/buscar/', {'q': texto})
+        self.assertEqual(resposta.status_code, 200)
+        return [produto['sku'] for produto in resposta.data]
+
+    def test_prefixo_acentos_e_ranqueamento(self):
+        self.assertEqual(self._skus('ergonomica az'), ['CAD-001'])
+        self.assertEqual(self._skus('cadeira'), ['CAD-001', 'MES-1'])
+        self.assertEqual(self._skus('CAD-002')[0], 'CAD-002')
+        resposta = self.client.get('/api/produtos/buscar/', {'q': 'mesa'})
+        self.assertEqual(set(resposta.data[0]), {'id', 'sku', 'nome', 'preco_venda', 'estoque_total'})
+        self.assertEqual(self.client.get('/api/produtos/buscar/', {'q': 'm'}).status_code, 400)
+
+    def test_indice_acompanha_alteracoes_e_atende_o_search_da_listagem(self):
+        self.mesa.nome = 'Bancada'
+        self.mesa.save()
+        Produto.objects.filter(sku='CAD-002').delete()
+
+        self.assertEqual(self._skus('banc'), ['MES-1'])
+        self.assertEqual(self._skus('mesa'), [])
+        self.assertEqual(self._skus('cadeado'), [])
+        resposta = self.client.get('/api/produtos/', {'search': 'cade'})
+        self.assertEqual(sorted(produto['sku'] for produto in resposta.data['results']), ['CAD-001', 'MES-1'])
+
+    def test_search_da_listagem_encontra_pelo_nome_da_categoria(self):
+        self.mesa.categoria = Categoria.objects.create(nome='Móveis de Escritório')
+        self.mesa.save()
+        resposta = self.client.get('/api/produtos/', {'search': 'móveis escritório'})
+        self.assertEqual([produto['sku'] for produto in resposta.data['results']], ['MES-1'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'índices de busca do PostgreSQL')
+    def test_plano_usa_os_indices_no_postgres(self):
+        from .busca import filtrar_produtos
+        with connection.cursor() as cursor:
+            # Com poucas linhas o planner prefere Seq Scan; aqui só interessa se os índices servem a consulta.
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plano = filtrar_produtos(Produto.objects.all(), 'cad-0').explain()
+        self.assertIn('produto_busca_gin', plano)
+        self.assertIn('produto_sku_prefixo', plano)
+        self.assertNotIn('Seq Scan', plano)
+
+
+@override_settings(INDICE_SKU_VERIFICACAO_MS=0, INDICE_SKU_AQUECER=False)
+class ScanSkuTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'senha'))
+        self.produto = Produto.objects.create(nome='Parafuso', sku='789-001', preco_venda='1.50')
+        Produto.objects.create(nome='Porca', sku='789-002', preco_venda='0.25')
+        indice_sku.aquecer()
+
+    def test_scan_aquecido_nao_consulta_o_banco(self):
+        with self.assertNumQueries(0):
+            resposta = self.client.get('/api/produtos/scan/789-001/')
+        self.assertEqual(resposta.data, {'id': self.produto.id, 'sku': '789-001', 'preco_venda': '1.50'})
+        self.assertEqual(self.client.get('/api/produtos/scan/000/').status_code, 404)
+
+    def test_lote_frio_usa_uma_consulta(self):
+        cache.clear()
+        with self.assertNumQueries(1):
+            resposta = self.client.post('/api/produtos/scan/', {'skus': ['789-002', '000', '789-001']}, format='json')
+        self.assertEqual([produto['sku'] for produto in resposta.data['encontrados']], ['789-002', '789-001'])
+        self.assertEqual(resposta.data['nao_encontrados'], ['000'])
+
+    def test_alteracao_do_produto_invalida_o_indice(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.produto.preco_venda = '2.00'
+            self.produto.save()
+        self.assertEqual(self.client.get('/api/produtos/scan/789-001/').data['preco_venda'], '2.00')
+
+    def test_alteracao_descarta_so_o_sku_alterado_em_todos_os_processos(self):
+        outro_processo = IndiceSku()
+        outro_processo.aquecer()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.produto.sku = '789-009'
+            self.produto.preco_venda = '2.00'
+            self.produto.save()
+
+        for indice in (indice_sku, outro_processo):
+            with self.assertNumQueries(0):
+                self.assertEqual(indice.buscar('789-002')[1], '0.25')
+            with self.assertNumQueries(1):
+                self.assertIsNone(indice.buscar('789-001'))
+            self.assertEqual(indice.buscar('789-009'), (self.produto.id, '2.00'))
+
+    def test_geracao_conferida_no_maximo_a_cada_intervalo(self):
+        with override_settings(INDICE_SKU_VERIFICACAO_MS=60_000), mock.patch('core.indice_sku._geracao_atual', wraps=_geracao_atual) as geracao:
+            indice_sku._proxima_verificacao = 0
+            for _ in range(5):
+                indice_sku.buscar('789-001')
+        self.assertEqual(geracao.call_count, 1)
+
+    def test_troca_de_geracao_aquece_de_novo(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidar_indice_sku()
+        with mock.patch('core.indice_sku.aquecer_em_segundo_plano') as aquecer:
+            indice_sku.buscar('789-001')
+        aquecer.assert_called_once()
+
+
+class ArquivamentoMovimentacoesTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'senha'))
+        self.produto = Produto.objects.create(nome='Produto', sku='SKU-1')
+        self.armazem = Armazem.objects.create(nome='Central')
+        MovimentacaoEstoque.objects.bulk_create(
+            MovimentacaoEstoque(produto=self.produto, armazem=self.armazem, quantidade=i + 1, tipo='ENTRADA') for i in range(6)
+        )
+        ids = sorted(MovimentacaoEstoque.objects.values_list('id', flat=True))
+        # Três movimentações de 8 meses atrás (arquivadas) e três de 30 meses atrás (compactadas).
+        MovimentacaoEstoque.objects.filter(id__in=ids[:3]).update(data_movimentacao=inicio_do_mes(30) + timedelta(days=2))
+        MovimentacaoEstoque.objects.filter(id__in=ids[3:4]).update(data_movimentacao=inicio_do_mes(8) + timedelta(days=2))
+        self.ids = ids
+
+    def _percorrer(self, url):
+        ids = []
+        while url:
+            resposta = self.client.get(url)
+            ids += [movimentacao['id'] for movimentacao in resposta.data['results']]
+            url = resposta.data['next']
+        return ids
+
+    def test_paginacao_e_historico_continuam_no_arquivo(self):
+        call_command('arquivar_movimentacoes', '--meses-detalhados', '48', stdout=StringIO())
+        self.assertEqual(MovimentacaoEstoque.objects.count(), 2)
+        self.assertEqual(MovimentacaoEstoqueArquivada.objects.count(), 4)
+
+        esperado = [self.ids[5], self.ids[4], self.ids[3], self.ids[2], self.ids[1], self.ids[0]]
+        self.assertEqual(self._percorrer('/api/movimentacoes/?page_size=3'), esperado)
+        self.assertEqual(self._percorrer(f'/api/produtos/{self.produto.id}/historico/?page_size=4'), esperado)
+        self.assertEqual(self._percorrer(f'/api/movimentacoes/?page_size=2&armazem={self.armazem.id}'), esperado)
+        self.assertEqual(self.client.get(f'/api/movimentacoes/{self.ids[0]}/').data['quantidade'], 1)
+
+        resposta = self.client.get('/api/movimentacoes/exportar/?formato=ndjson')
+        linhas = [json.loads(linha) for linha in b''.join(resposta.streaming_content).decode('utf-8').splitlines()]
+        self.assertEqual([linha['id'] for linha in linhas], sorted(esperado))
+
+    def test_compacta_e_restaura_meses_antigos(self):
+        call_command('arquivar_movimentacoes', stdout=StringIO())
+        self.assertEqual(MovimentacaoEstoqueArquivada.objects.count(), 1)
+        resumo = ResumoMensalMovimentacao.objects.get()
+        self.assertEqual((resumo.mes, resumo.quantidade, resumo.movimentacoes), (inicio_do_mes(30).date(), 6, 3))
+        self.assertEqual(LoteMovimentacoesCompactadas.objects.get().linhas, 3)
+
+        call_command('arquivar_movimentacoes', '--restaurar', f'{inicio_do_mes(30):%Y-%m}', stdout=StringIO())
+        self.assertFalse(LoteMovimentacoesCompactadas.objects.exists())
+        self.assertEqual(
+            sorted(MovimentacaoEstoqueArquivada.objects.values_list('id', 'quantidade')),
+            [(self.ids[0], 1), (self.ids[1], 2), (self.ids[2], 3), (self.ids[3], 4)]
+        )
+        with self.assertRaises(CommandError):
+            call_command('arquivar_movimentacoes', '--restaurar', 'ontem', stdout=StringIO())
+
+    def test_listagem_e_historico_indicam_os_meses_compactados(self):
+        self.assertNotIn('X-Meses-Compactados', self.client.get('/api/movimentacoes/'))
+        call_command('arquivar_movimentacoes', stdout=StringIO())
+        mes = f'{inicio_do_mes(30):%Y-%m}'
+        outro = Produto.objects.create(nome='Outro', sku='SKU-2')
+
+        for url in ('/api/movimentacoes/', f'/api/movimentacoes/?produto={self.produto.id}&armazem={self.armazem.id}',
+                    f'/api/produtos/{self.produto.id}/historico/', f'/api/produtos/{self.produto.id}/historico/?fields=id'):
+            self.assertEqual(self.client.get(url)['X-Meses-Compactados'], mes)
+        self.assertNotIn('X-Meses-Compactados', self.client.get(f'/api/produtos/{outro.id}/historico/'))
+        self.assertNotIn('X-Meses-Compactados', self.client.get(f'/api/movimentacoes/?produto={outro.id}'))
+
+        call_command('arquivar_movimentacoes', '--restaurar', mes, stdout=StringIO())
+        self.assertNotIn('X-Meses-Compactados', self.client.get('/api/movimentacoes/'))
+
+    def test_mes_restaurado_so_volta_a_ser_compactado_explicitamente(self):
+        mes = f'{inicio_do_mes(30):%Y-%m}'
+        call_command('arquivar_movimentacoes', stdout=StringIO())
+        call_command('arquivar_movimentacoes', '--restaurar', mes, stdout=StringIO())
+
+        call_command('arquivar_movimentacoes', stdout=StringIO())
+        self.assertFalse(LoteMovimentacoesCompactadas.objects.exists())
+        self.assertEqual(MovimentacaoEstoqueArquivada.objects.count(), 4)
+
+        call_command('arquivar_movimentacoes', '--recompactar', mes, stdout=StringIO())
+        self.assertEqual(LoteMovimentacoesCompactadas.objects.get().linhas, 3)
+        self.assertEqual(MovimentacaoEstoqueArquivada.objects.count(), 1)
+        with self.assertRaises(CommandError):
+            call_command('arquivar_movimentacoes', '--recompactar', mes, stdout=StringIO())
+
+
+@override_settings(WEBHOOK_BAIXO_ESTOQUE_URL=None)
+class PosicaoEstoqueTests(APITestCase):
+    def setUp(self):
+        usuario = User.objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_authenticate(usuario)
+        self.produto = Produto.objects.create(nome='Produto', sku='SKU-1')
+        self.armazem = Armazem.objects.create(nome='Central')
+        self.base = inicio_do_mes(2)
+        for dias, quantidade in ((1, 10), (5, -3), (20, 5)):
+            if quantidade > 0:
+                registrar_entrada(self.produto.id, self.armazem.id, quantidade, usuario, 'Teste')
+            else:
+                registrar_saida(self.produto.id, self.armazem.id, -quantidade, usuario, 'Teste')
+            MovimentacaoEstoque.objects.filter(id=MovimentacaoEstoque.objects.latest('id').id).update(data_movimentacao=self.base + timedelta(days=dias, hours=12))
+
+    def _quantidade(self, alvo):
+        return posicoes_em(alvo)[0]['quantidade']
+
+    def test_checkpoints_esparsos_e_consulta_a_partir_deles(self):
+        self.assertEqual(registrar_posicoes(self.base + timedelta(days=3)), 1)
+        self.assertEqual(registrar_posicoes(self.base + timedelta(days=4)), 0)
+        self.assertEqual(registrar_posicoes(self.base + timedelta(days=10)), 1)
+        self.assertEqual(list(PosicaoEstoque.objects.order_by('momento').values_list('quantidade', flat=True)), [10, 7])
+
+        self.assertEqual(self._quantidade(self.base), 0)
+        self.assertEqual(self._quantidade(self.base + timedelta(days=2)), 10)
+        self.assertEqual(self._quantidade(self.base + timedelta(days=5, hours=13)), 7)
+        self.assertEqual(self._quantidade(timezone.now()), 12)
+
+        # Só o intervalo após o checkpoint é somado.
+        PosicaoEstoque.objects.filter(momento=self.base + timedelta(days=10)).update(quantidade=100)
+        self.assertEqual(self._quantidade(self.base + timedelta(days=25)), 105)
+
+    def test_endpoint_por_data(self):
+        call_command('registrar_posicoes_estoque', '--data', f'{(self.base + timedelta(days=3)).date()}', '--dias', '3', stdout=StringIO())
+        resposta = self.client.get('/api/estoque/posicao/', {'data': f'{(self.base + timedelta(days=5)).date()}', 'armazem': self.armazem.id})
+        self.assertEqual(resposta.data['results'], [{'produto_id': self.produto.id, 'armazem_id': self.armazem.id, 'quantidade': 7, 'produto_sku': 'SKU-1'}])
+        self.assertEqual(self.client.get('/api/estoque/posicao/', {'data': 'ontem'}).status_code, 400)
+
+    def test_mes_compactado_responde_pelos_totais_mensais(self):
+        # Checkpoint no meio do mês, que depois é compactado: não serve mais de base.
+        registrar_posicoes(self.base + timedelta(days=3))
+        fim_do_mes = inicio_do_mes(1)
+        registrar_entrada(self.produto.id, self.armazem.id, 4, None, 'Mês seguinte')
+        MovimentacaoEstoque.objects.filter(id=MovimentacaoEstoque.objects.latest('id').id).update(data_movimentacao=fim_do_mes + timedelta(days=2))
+        arquivar_movimentacoes(fim_do_mes)
+        compactar_meses(fim_do_mes)
+        self.assertFalse(MovimentacaoEstoqueArquivada.objects.filter(data_movimentacao__lt=fim_do_mes).exists())
+
+        self.assertEqual(self._quantidade(fim_do_mes), 12)
+        self.assertEqual(self._quantidade(fim_do_mes + timedelta(days=3)), 16)
+        resposta = self.client.get('/api/estoque/posicao/', {'data': f'{(fim_do_mes + timedelta(days=3)).date()}'})
+        self.assertEqual(resposta.data['results'][0]['quantidade'], 16)
+        # Só um momento dentro do mês compactado depende do detalhe.
+        resposta = self.client.get('/api/estoque/posicao/', {'data': f'{(self.base + timedelta(days=10)).date()}'})
+        self.assertEqual(resposta.status_code, 409)
+        with self.assertRaises(DetalheCompactado):
+            posicoes_em(self.base + timedelta(days=10))
+
+
+@override_settings(INSTRUMENTACAO_AMOSTRAGEM=1)
+class InstrumentacaoTests(APITestCase):
+    def setUp(self):
+        registro_instrumentacao.limpar()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_authenticate(self.admin)
+        Produto.objects.create(nome='Parafuso', sku='SKU-1')
+        Cliente.objects.create(nome='Cliente', email='cliente@example.com')
+
+    def test_fases_e_consultas_por_endpoint(self):
+        resposta = self.client.get('/api/clientes/')
+        self.assertIn('serializacao;dur=', resposta['Server-Timing'])
+        self.assertEqual(registro_instrumentacao.requisicoes[('ClienteViewSet.list', 'GET', '200')], 1)
+        self.assertGreater(registro_instrumentacao.consultas['ClienteViewSet.list'].soma, 0)
+
+        metricas = self.client.get('/api/_metrics/').content.decode('utf-8')
+        self.assertIn('gestao_estoque_requisicoes_total{endpoint="ClienteViewSet.list",metodo="GET",status="200"} 1', metricas)
+        self.assertIn('gestao_estoque_fase_duracao_segundos_bucket{endpoint="ClienteViewSet.list",fase="banco",le="+Inf"} 1', metricas)
+
+        self.client.force_authenticate(User.objects.create_user('comum', 'comum@example.com', 'senha'))
+        self.assertEqual(self.client.get('/api/_metrics/').status_code, 403)
+
+    def test_detecta_consulta_repetida(self):
+        def visao(request):
+            for _ in range(12):
+                Produto.objects.filter(sku='SKU-1').exists()
+            return HttpResponse()
+
+        with self.assertLogs('core.instrumentacao', 'WARNING'):
+            InstrumentacaoMiddleware(visao)(RequestFactory().get('/qualquer/'))
+        self.assertEqual(registro_instrumentacao.duplicadas['nao_resolvido'], 11)
+        self.assertEqual(registro_instrumentacao.suspeitas['nao_resolvido'], 1)
+
+    @override_settings(INSTRUMENTACAO_AMOSTRAGEM=0)
+    def test_desligada_por_padrao(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/clientes/'))
+        self.assertFalse(registro_instrumentacao.requisicoes)
+
+
+class DadosSinteticosTests(TestCase):
+    def test_gera_dados_coerentes_e_roda_o_benchmark(self):
+        call_command(
+            'gerar_dados_sinteticos', '--produtos', '40', '--armazens', '3', '--clientes', '20', '--fornecedores', '5',
+            '--movimentacoes', '600', '--pedidos', '60', '--semente', '7', stdout=StringIO(), stderr=StringIO()
+        )
+        self.assertEqual(Produto.objects.filter(sku__startswith='SINT-7-').count(), 40)
+        self.assertEqual(MovimentacaoEstoque.objects.count(), 600)
+        self.assertFalse(EstoqueItem.objects.filter(quantidade__lt=0).exists())
+        for item in EstoqueItem.objects.all():
+            soma = sum(MovimentacaoEstoque.objects.filter(produto_id=item.produto_id, armazem_id=item.armazem_id).values_list('quantidade', flat=True))
+            self.assertEqual(item.quantidade, soma)
+        call_command('reconciliar_estoque', stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('gerar_dados_sinteticos', '--semente', '7', stdout=StringIO(), stderr=StringIO())
+
+        saida = StringIO()
+        call_command('benchmark_api', '--requisicoes', '3', '--concorrencia', '1', '--aquecimento', '0', stdout=saida, stderr=StringIO())
+        resultado = json.loads(saida.getvalue())
+        self.assertEqual(set(resultado['cenarios']), {'entrada', 'saida', 'despachar_pedido', 'receber_pedido', 'dashboard', 'baixo_estoque', 'produtos_lista', 'produtos_busca'})
+        for cenario in ('entrada', 'dashboard', 'produtos_busca'):
+            self.assertEqual(resultado['cenarios'][cenario]['1']['status'], {'200': 3})
+
+
+class CamposEsparsosTests(APITestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_authenticate(self.usuario)
+        self.armazem = Armazem.objects.create(nome='Central')
+        self.produto = Produto.objects.create(nome='Parafuso', sku='PAR-1', descricao='Aço', categoria=Categoria.objects.create(nome='Geral'))
+        EstoqueItem.objects.create(produto=self.produto, armazem=self.armazem, quantidade=10)
+        registrar_entrada(self.produto.id, self.armazem.id, 5, self.usuario, 'Compra')
+        cliente = Cliente.objects.create(nome='Cliente', email='cliente@example.com')
+        pedido = PedidoVenda.objects.create(cliente=cliente, responsavel_venda=self.usuario)
+        ItemPedidoVenda.objects.create(pedido_venda=pedido, produto=self.produto, quantidade=1, preco_unitario=1)
+
+    def _get(self, url):
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(url)
+        return resposta, ' '.join(consulta['sql'] for consulta in consultas)
+
+    def test_estoque_plano_por_padrao_e_sem_juncoes(self):
+        resposta, sql = self._get('/api/estoque/')
+        self.assertEqual(resposta.data['results'], [{
+            'id': EstoqueItem.objects.get().id, 'produto': self.produto.id, 'armazem': self.armazem.id,
+            'quantidade': 15, 'reservado': 0, 'abaixo_minimo': False,
+        }])
+        self.assertNotIn('"core_produto"', sql)
+        self.assertNotIn('"core_armazem"', sql)
+
+    def test_expand_aninha_os_resumos(self):
+        resposta, sql = self._get('/api/estoque/?expand=produto,armazem&fields=id,quantidade')
+        item = resposta.data['results'][0]
+        self.assertEqual(set(item), {'id', 'quantidade', 'produto', 'armazem'})
+        self.assertEqual(item['produto']['sku'], 'PAR-1')
+        self.assertEqual(item['armazem'], {'id': self.armazem.id, 'nome': 'Central'})
+        self.assertNotIn('"core_produto"."descricao"', sql)
+
+        resposta, _ = self._get('/api/movimentacoes/?expand=produto&fields=id,quantidade')
+        self.assertEqual(resposta.data['results'][0]['produto']['nome'], 'Parafuso')
+
+    def test_fields_restringe_resposta_e_sql(self):
+        resposta, sql = self._get('/api/produtos/?fields=id,sku')
+        self.assertEqual(resposta.data['results'], [{'id': self.produto.id, 'sku': 'PAR-1'}])
+        self.assertNotIn('"descricao"', sql)
+        self.assertNotIn('"core_estoqueitem"', sql)
+        self.assertNotIn('"core_categoria"', sql)
+
+        resposta, sql = self._get('/api/pedidos/venda/?fields=id,status,cliente_nome')
+        self.assertEqual(resposta.data['results'][0], {'id': PedidoVenda.objects.get().id, 'status': 'AGUARDANDO_PAGAMENTO', 'cliente_nome': 'Cliente'})
+        self.assertNotIn('"core_itempedidovenda"', sql)
+        self.assertNotIn('"core_cliente"."email"', sql)
+
+        resposta, sql = self._get(f'/api/produtos/{self.produto.id}/?fields=estoque_por_armazem')
+        self.assertEqual(resposta.data, {'estoque_por_armazem': [{'armazem': self.armazem.id, 'quantidade': 15}]})
+
+        resposta, _ = self._get('/api/movimentacoes/?fields=id&page_size=1')
+        self.assertEqual(list(resposta.data['results'][0]), ['id'])
+
+    def test_campos_e_expansoes_invalidos(self):
+        resposta, _ = self._get('/api/estoque/?fields=id,inexistente')
+        self.assertEqual(resposta.status_code, 400)
+        self.assertIn('fields', resposta.data)
+        resposta, _ = self._get('/api/clientes/?expand=pedidos')
+        self.assertEqual(resposta.status_code, 400)
+        self.assertIn('expand', resposta.data)
+
+
+class LeituraRapidaTests(APITestCase):
+    """A leitura rápida (values() + orjson) deve devolver exatamente o que os serializers devolvem."""
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_authenticate(self.usuario)
+        armazens = [Armazem.objects.create(nome='Central'), Armazem.objects.create(nome='Filial')]
+        categoria = Categoria.objects.create(nome='Ferragens')
+        fornecedor = Fornecedor.objects.create(nome_fantasia='Fornecedor Ç')
+        produtos = [
+            Produto.objects.create(nome='Parafuso', sku='PAR-1', categoria=categoria, fornecedor=fornecedor, preco_custo='1.5', preco_venda='2.35'),
+            Produto.objects.create(nome='Porca', sku='POR-1', descricao='Sem fornecedor', preco_venda=3),
+        ]
+        for produto in produtos:
+            for armazem in armazens:
+                EstoqueItem.objects.create(produto=produto, armazem=armazem)
+                registrar_entrada(produto.id, armazem.id, 7, self.usuario, 'Compra')
+        MovimentacaoEstoque.objects.create(produto=produtos[0], armazem=armazens[1], quantidade=0, tipo='AJUSTE', motivo='Sem responsável')
+        self.produto = produtos[0]
+
+    def _comparar(self, classe, url):
+        caches['respostas'].clear()
+        with mock.patch.object(classe, 'leitura_rapida', False):
+            esperado = self.client.get(url)
+        caches['respostas'].clear()
+        with CaptureQueriesContext(connection) as consultas:
+            obtido = self.client.get(url)
+        self.assertEqual(obtido.status_code, 200)
+        self.assertEqual(json.loads(obtido.content), json.loads(esperado.content))
+        self.assertEqual(obtido.content, esperado.content)
+        return obtido, len(consultas)
+
+    def test_paridade_com_os_serializers(self):
+        self._comparar(EstoqueViewSet, '/api/estoque/')
+        self._comparar(EstoqueViewSet, '/api/estoque/?fields=id,quantidade&abaixo_minimo=false')
+        _, consultas = self._comparar(ProdutoViewSet, '/api/produtos/')
+        self.assertEqual(consultas, 3)  # contagem, página e estoque por armazém da página
+        self._comparar(ProdutoViewSet, '/api/produtos/?fields=sku,categoria,preco_venda')
+        resposta, _ = self._comparar(ProdutoViewSet, f'/api/produtos/{self.produto.id}/historico/?page_size=2')
+        pagina = self.client.get(resposta.data['next'])
+        self.assertEqual(len(pagina.data['results']), 1)
+
+    def test_expand_usa_o_serializer(self):
+        resposta = self.client.get('/api/estoque/?expand=produto')
+        self.assertEqual(resposta.data['results'][0]['produto']['sku'], 'PAR-1')
+
+    def test_renderizador_mantem_o_formato_do_drf(self):
+        dados = {'momento': timezone.now(), 'texto': 'ação', 'itens': [1, None, True]}
+        self.assertEqual(RenderizadorJSONRapido().render(dados), JSONRenderer().render(dados))
+
+
+@override_settings(WEBHOOK_BAIXO_ESTOQUE_URL=None)
+class ViewsAssincronasTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        registro_instrumentacao.limpar()
+        gerentes = Group.objects.create(name='Gerentes')
+        self.gerente = User.objects.create_user('gerente', password='senha')
+        self.gerente.groups.add(gerentes)
+        self.vendedor = User.objects.create_user('vendedor', password='senha')
+        self.armazens = [Armazem.objects.create(nome='Central'), Armazem.objects.create(nome='Filial')]
+        self.produtos = [Produto.objects.create(nome=f'Produto {i}', sku=f'SKU-{i}', estoque_minimo=10, preco_custo=2) for i in range(3)]
+        for produto in self.produtos:
+            for armazem in self.armazens:
+                EstoqueItem.objects.create(produto=produto, armazem=armazem)
+                registrar_entrada(produto.id, armazem.id, 5, self.gerente, 'Compra')
+        EstoqueItem.objects.filter(produto=self.produtos[0], armazem=self.armazens[1]).update(reservado=2)
+        self.client.force_authenticate(self.gerente)
+        self.tokens = {usuario: str(ObterTokenSerializer.get_token(usuario).access_token) for usuario in (self.gerente, self.vendedor)}
+
+    async def _get(self, url, usuario=None):
+        return await self.async_client.get(url, headers={'authorization': f'Bearer {self.tokens[usuario or self.gerente]}'})
+
+    async def test_disponibilidade_por_produto_e_armazem(self):
+        resposta = await self._get(f'/api/async/estoque/disponibilidade/?produto={self.produtos[0].id}')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json(), {
+            'produto': self.produtos[0].id, 'sku': 'SKU-0', 'disponivel': 8,
+            'armazens': [
+                {'armazem': self.armazens[0].id, 'quantidade': 5, 'reservado': 0, 'disponivel': 5},
+                {'armazem': self.armazens[1].id, 'quantidade': 5, 'reservado': 2, 'disponivel': 3},
+            ],
+        })
+        resposta = await self._get(f'/api/async/estoque/disponibilidade/?sku=SKU-0&armazem={self.armazens[1].id}', self.vendedor)
+        self.assertEqual(resposta.json()['disponivel'], 3)
+
+        sem_estoque = await Produto.objects.acreate(nome='Novo', sku='NOVO')
+        resposta = await self._get('/api/async/estoque/disponibilidade/?sku=NOVO')
+        self.assertEqual(resposta.json(), {'produto': sem_estoque.id, 'sku': 'NOVO', 'disponivel': 0, 'armazens': []})
+        self.assertEqual((await self._get('/api/async/estoque/disponibilidade/?sku=NADA')).status_code, 404)
+        self.assertEqual((await self._get('/api/async/estoque/disponibilidade/')).status_code, 400)
+
+    async def test_autenticacao_e_permissoes(self):
+        resposta = await self.async_client.get('/api/async/estoque/disponibilidade/?sku=SKU-0')
+        self.assertEqual(resposta.status_code, 401)
+        self.assertIn('Bearer', resposta['WWW-Authenticate'])
+        resposta = await self.async_client.get('/api/async/dashboard/', headers={'authorization': 'Bearer invalido'})
+        self.assertEqual(resposta.status_code, 401)
+        self.assertEqual((await self._get('/api/async/dashboard/', self.vendedor)).status_code, 403)
+        self.assertEqual((await self._get('/api/async/dashboard/')).status_code, 200)
+
+    async def test_mesmo_conteudo_das_views_do_drf(self):
+        for sincrona, assincrona in [
+            ('/api/relatorios/baixo-estoque/?page_size=2', '/api/async/relatorios/baixo-estoque/?page_size=2'),
+            ('/api/relatorios/baixo-estoque/?page_size=2&page=2', '/api/async/relatorios/baixo-estoque/?page_size=2&page=2'),
+            (f'/api/relatorios/baixo-estoque/?armazem={self.armazens[0].id}', f'/api/async/relatorios/baixo-estoque/?armazem={self.armazens[0].id}'),
+            ('/api/dashboard/', '/api/async/dashboard/'),
+            ('/api/dashboard/?data_inicio=2000-01-01', '/api/async/dashboard/?data_inicio=2000-01-01'),
+            ('/api/dashboard/?data_fim=2024-02-31', '/api/async/dashboard/?data_fim=2024-02-31'),
+        ]:
+            esperado = (await sync_to_async(self.client.get)(sincrona)).json()
+            obtido = (await self._get(assincrona)).json()
+            if 'next' in esperado:
+                for chave in ('next', 'previous'):
+                    esperado[chave] = esperado[chave] and esperado[chave].replace('/api/', '/api/async/')
+            self.assertEqual(obtido, esperado)
+        self.assertEqual((await self._get('/api/async/relatorios/baixo-estoque/?page=9')).status_code, 404)
+        self.assertEqual((await self._get('/api/async/dashboard/?data_inicio=2024-02-31')).status_code, 400)
+
+    @override_settings(INSTRUMENTACAO_AMOSTRAGEM=1)
+    async def test_instrumentacao_no_caminho_assincrono(self):
+        resposta = await self._get(f'/api/async/estoque/disponibilidade/?produto={self.produtos[0].id}')
+        self.assertIn('total;dur=', resposta['Server-Timing'])
+        self.assertIn('endpoint="DisponibilidadeEstoqueView.get"', registro_instrumentacao.exportar())
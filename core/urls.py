@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CategoriaViewSet, FornecedorViewSet, ProdutoViewSet, ArmazemViewSet, EstoqueViewSet, RelatorioBaixoEstoqueView, PedidoCompraViewSet, ClienteViewSet, PedidoVendaViewSet, DashboardView
+from .assincrono import DashboardAssincronoView, DisponibilidadeEstoqueView, RelatorioBaixoEstoqueAssincronoView
+from .views import CategoriaViewSet, FornecedorViewSet, ProdutoViewSet, ArmazemViewSet, EstoqueViewSet, RelatorioBaixoEstoqueView, PedidoCompraViewSet, ClienteViewSet, PedidoVendaViewSet, DashboardView, MovimentacaoEstoqueViewSet, MetricasInstrumentacaoView
 
 router = DefaultRouter()
 
@@ -9,6 +10,7 @@ router.register(r'fornecedores', FornecedorViewSet, basename='fornecedor')
 router.register(r'produtos', ProdutoViewSet, basename='produto')
 router.register(r'armazens', ArmazemViewSet, basename='armazem')
 router.register(r'estoque', EstoqueViewSet, basename='estoque')
+router.register(r'movimentacoes', MovimentacaoEstoqueViewSet, basename='movimentacao')
 router.register(r'pedidos/compra', PedidoCompraViewSet, basename='pedido-compra')
 router.register(r'clientes', ClienteViewSet, basename='cliente')
 router.register(r'pedidos/venda', PedidoVendaViewSet, basename='pedido-venda')
@@ -17,4 +19,9 @@ urlpatterns = [
     path('', include(router.urls)),
     path('relatorios/baixo-estoque/', RelatorioBaixoEstoqueView.as_view(), name='relatorio-baixo-estoque'),
     path('dashboard/', DashboardView.as_view(), name='dashboard'),
+    path('_metrics/', MetricasInstrumentacaoView.as_view(), name='metricas-instrumentacao'),
+    # Views assíncronas (ASGI) das leituras de alta concorrência.
+    path('async/estoque/disponibilidade/', DisponibilidadeEstoqueView.as_view(), name='disponibilidade-estoque'),
+    path('async/relatorios/baixo-estoque/', RelatorioBaixoEstoqueAssincronoView.as_view(), name='relatorio-baixo-estoque-async'),
+    path('async/dashboard/', DashboardAssincronoView.as_view(), name='dashboard-async'),
 ]
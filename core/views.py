@@ -1,37 +1,77 @@
-from django.db.models import F, Sum, DecimalField
-from django.db.models.functions import Coalesce
 from rest_framework.views import APIView
 from django.db import transaction
-from rest_framework import viewsets, status
+from rest_framework import generics, viewsets, status
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from .permissions import IsGerente 
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from .models import Categoria, Fornecedor, MovimentacaoEstoque, Produto, Armazem, EstoqueItem, PedidoCompra, Cliente, PedidoVenda, ItemPedidoVenda
-from .filters import ProdutoFilter
+from django.db.models import Prefetch, Q
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from .models import Categoria, Fornecedor, MovimentacaoEstoque, Produto, Armazem, EstoqueItem, PedidoCompra, ItemPedidoCompra, Cliente, PedidoVenda, ItemPedidoVenda, ReservaEstoque, MovimentacaoEstoqueArquivada, ContagemBaixoEstoque
+from django_filters.rest_framework import DjangoFilterBackend
+from .filters import ProdutoFilter, BaixoEstoqueFilter, BuscaProdutoFilter
+from .pagination import PaginacaoPadrao, PaginacaoMovimentacoes
+from .busca import LIMITE_SUGESTOES, MAXIMO_SUGESTOES, sugerir_produtos
+from .cache_respostas import RespostaEmCacheMixin
+from .campos import CamposEsparsosMixin
+from .leitura import LeituraRapidaMixin
+from .instrumentacao import InstrumentacaoMixin, registro as registro_instrumentacao
+from .exportacao import exportar_queryset
+from .importacao import FORMATOS_IMPORTACAO, ImportadorCatalogo, ler_linhas
+from .indice_sku import MAXIMO_SKUS_LOTE, indice_sku
+from .arquivamento import camadas_de_movimentacoes, meses_compactados
+from .posicoes import DetalheCompactado, fim_do_dia, posicoes_em
+from .alocacao import ESTRATEGIA_MENOS_ARMAZENS, ESTRATEGIAS_ALOCACAO, alocar_saidas, planejar_alocacao, serializar_plano
+from .reservas import consumir_reservas
 from .serializers import CategoriaSerializer, ForncedorSerializer, ProdutoSerializer, ArmazemSerializer, EstoqueItemSerializer, RelatorioBaixoEstoqueSerializer, MovimentacaoEstoqueSerializer, PedidoCompraSerializer, ClienteSerializer, PedidoVendaSerializer
-from .webhooks import enviar_webhook_baixo_estoque
+from .webhooks import enfileirar_webhooks_baixo_estoque
+from .metricas import obter_metricas, periodo_das_metricas, registrar_compra, registrar_venda
+from .services import aplicar_movimentacoes_em_lote, registrar_entrada, registrar_saida, registrar_entradas_pedido, registrar_saidas_pedido, EstoqueInsuficiente, MODOS_LOTE, MODO_TUDO_OU_NADA
+import logging
 
-class CategoriaViewSet(viewsets.ModelViewSet):
+logger = logging.getLogger(__name__)
+
+
+def _com_meses_compactados(resposta, **filtros):
+    # O detalhe dos meses compactados não é paginado; o cabeçalho avisa o cliente da lacuna.
+    meses = meses_compactados(**filtros)
+    if meses:
+        resposta['X-Meses-Compactados'] = ','.join(meses)
+    return resposta
+
+class CategoriaViewSet(InstrumentacaoMixin, CamposEsparsosMixin, RespostaEmCacheMixin, viewsets.ModelViewSet):
+    recurso_cache = 'categoria'
     queryset = Categoria.objects.all()
     serializer_class = CategoriaSerializer
     permission_classes = [IsAuthenticated]
 
-class FornecedorViewSet(viewsets.ModelViewSet):
+class FornecedorViewSet(InstrumentacaoMixin, CamposEsparsosMixin, RespostaEmCacheMixin, viewsets.ModelViewSet):
+    recurso_cache = 'fornecedor'
     queryset = Fornecedor.objects.all()
     serializer_class = ForncedorSerializer
     permission_classes = [IsAuthenticated]
 
-class ProdutoViewSet(viewsets.ModelViewSet):
-    queryset = Produto.objects.all()
+class ProdutoViewSet(InstrumentacaoMixin, CamposEsparsosMixin, RespostaEmCacheMixin, LeituraRapidaMixin, viewsets.ModelViewSet):
+    recurso_cache = 'produto'
+    # estoque_total e estoque_por_armazem mudam a cada movimentação: invalidados por produto, não pelo catálogo inteiro.
+    versao_por_linha = True
+    parametros_sem_cache = ('em_estoque', 'quantidade_min')
+    leitura_rapida = True
+    queryset = Produto.objects.select_related('categoria', 'fornecedor').prefetch_related(
+        Prefetch('itens_de_estoque', queryset=EstoqueItem.objects.only('id', 'produto_id', 'armazem_id', 'quantidade').order_by('armazem_id'))
+    )
     serializer_class = ProdutoSerializer
+    filter_backends = [DjangoFilterBackend, BuscaProdutoFilter]
     filterset_class = ProdutoFilter
     search_fields = ['nome', 'sku', 'descricao', 'categoria__nome']
     
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'buscar', 'scan', 'scan_lote']:
             permission_classes = [IsAuthenticated]
         else:
             permission_classes = [IsAdminUser | IsGerente]
@@ -41,25 +81,164 @@ class ProdutoViewSet(viewsets.ModelViewSet):
     def historico(self, request, pk=None):
         try:
             produto = self.get_object()
-            movimentacoes = MovimentacaoEstoque.objects.filter(produto=produto)
-
-            page = self.paginate_queryset(movimentacoes)
-            if page is not None:
-                serializer = MovimentacaoEstoqueSerializer(page, many=True)
-                return self.get_paginated_response(serializer.data)
-            
-            serializer = MovimentacaoEstoqueSerializer(movimentacoes, many=True)
-            return Response(serializer.data)
+            movimentacoes = camadas_de_movimentacoes(lambda queryset: queryset.filter(produto=produto))
+
+            paginator = PaginacaoMovimentacoes()
+            projecao = self.projecao(MovimentacaoEstoqueSerializer())
+            if projecao is not None:
+                page = paginator.paginate_queryset([projecao.valores(camada, 'data_movimentacao') for camada in movimentacoes], request, view=self)
+                return _com_meses_compactados(paginator.get_paginated_response(projecao.converter(page)), produto_id=produto.pk)
+            page = paginator.paginate_queryset(movimentacoes, request, view=self)
+            serializer = MovimentacaoEstoqueSerializer(page, many=True)
+            return _com_meses_compactados(paginator.get_paginated_response(serializer.data), produto_id=produto.pk)
         except Produto.DoesNotExist:
             return Response({"erro": "Produto não encontrado"}, status=status.HTTP_404_NOT_FOUND)
+
+    @action(detail=False, methods=['get'])
+    def buscar(self, request):
+        texto = request.query_params.get('q', '').strip()
+        if len(texto) < 2:
+            return Response({'erro': "Informe ao menos 2 caracteres em 'q'."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limite = min(int(request.query_params.get('limite', LIMITE_SUGESTOES)), MAXIMO_SUGESTOES)
+        except ValueError:
+            return Response({'erro': "'limite' deve ser um número inteiro."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(sugerir_produtos(texto, max(limite, 1)))
+
+    @action(detail=False, methods=['get'], url_path=r'scan/(?P<sku>[^/]+)')
+    def scan(self, request, sku=None):
+        # Caminho dos leitores de código de barras: índice em memória, sem serializer nem queryset.
+        encontrado = indice_sku.buscar(sku)
+        if encontrado is None:
+            return Response({'erro': 'SKU não encontrado.'}, status=status.HTTP_404_NOT_FOUND)
+        produto_id, preco_venda = encontrado
+        return Response({'id': produto_id, 'sku': sku, 'preco_venda': preco_venda})
+
+    @action(detail=False, methods=['post'], url_path='scan')
+    def scan_lote(self, request):
+        skus = request.data.get('skus')
+        if not isinstance(skus, list) or not skus or not all(isinstance(sku, str) for sku in skus):
+            return Response({'erro': "Informe uma lista de SKUs em 'skus'."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(skus) > MAXIMO_SKUS_LOTE:
+            return Response({'erro': f'Envie no máximo {MAXIMO_SKUS_LOTE} SKUs por requisição.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        skus = list(dict.fromkeys(skus))
+        encontrados = indice_sku.buscar_varios(skus)
+        return Response({
+            'encontrados': [
+                {'id': encontrados[sku][0], 'sku': sku, 'preco_venda': encontrados[sku][1]}
+                for sku in skus if sku in encontrados
+            ],
+            'nao_encontrados': [sku for sku in skus if sku not in encontrados],
+        })
+
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser])
+    def importar(self, request):
+        arquivo = request.FILES.get('arquivo')
+        if arquivo is None:
+            return Response({'erro': "Envie o catálogo no campo 'arquivo' (multipart)."}, status=status.HTTP_400_BAD_REQUEST)
+
+        formato = request.data.get('formato') or arquivo.name.rsplit('.', 1)[-1].lower()
+        if formato not in FORMATOS_IMPORTACAO:
+            return Response({'erro': f"Formato inválido. Use um de: {', '.join(FORMATOS_IMPORTACAO)}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        resultado = ImportadorCatalogo().importar(ler_linhas(arquivo, formato))
+        logger.info("Importação de catálogo: %(linhas)s linhas, %(criados)s criados, %(atualizados)s atualizados, %(erros)s erros em %(duracao_segundos)ss.", resultado)
+        return Response(resultado)
      
-class ArmazemViewSet(viewsets.ModelViewSet):
+class ArmazemViewSet(InstrumentacaoMixin, CamposEsparsosMixin, RespostaEmCacheMixin, viewsets.ModelViewSet):
+    recurso_cache = 'armazem'
     queryset = Armazem.objects.all()
     serializer_class = ArmazemSerializer
 
-class EstoqueViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = EstoqueItem.objects.select_related('produto', 'armazem').all()
+class MovimentacaoEstoqueViewSet(InstrumentacaoMixin, CamposEsparsosMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = MovimentacaoEstoque.objects.select_related('responsavel').all()
+    serializer_class = MovimentacaoEstoqueSerializer
+    pagination_class = PaginacaoMovimentacoes
+    campos_sempre_lidos = ('data_movimentacao',)
+    filterset_fields = {
+        'produto': ['exact'],
+        'armazem': ['exact'],
+        'tipo': ['exact'],
+        'data_movimentacao': ['gte', 'lte'],
+    }
+
+    # As consultas passam pela tabela quente e pelo arquivo (core.arquivamento) de forma transparente.
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(camadas_de_movimentacoes(self.filter_queryset))
+        # Os filtros já foram validados pelo filter_queryset acima.
+        return _com_meses_compactados(
+            self.get_paginated_response(self.get_serializer(page, many=True).data),
+            produto_id=request.query_params.get('produto') or None, armazem_id=request.query_params.get('armazem') or None,
+        )
+
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            return get_object_or_404(MovimentacaoEstoqueArquivada.objects.select_related('responsavel'), pk=self.kwargs['pk'])
+
+    @action(detail=False, methods=['get'])
+    def exportar(self, request):
+        quente, arquivo = camadas_de_movimentacoes(self.filter_queryset)
+        movimentacoes = [arquivo.select_related(None).order_by('id'), quente.select_related(None).order_by('id')]
+        return exportar_queryset(request, movimentacoes, [
+            ('id', 'id'),
+            ('data_movimentacao', 'data_movimentacao'),
+            ('tipo', 'tipo'),
+            ('produto_id', 'produto_id'),
+            ('produto_sku', 'produto__sku'),
+            ('armazem_id', 'armazem_id'),
+            ('quantidade', 'quantidade'),
+            ('responsavel', 'responsavel__username'),
+            ('motivo', 'motivo'),
+        ], 'movimentacoes')
+
+class EstoqueViewSet(InstrumentacaoMixin, CamposEsparsosMixin, LeituraRapidaMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = EstoqueItem.objects.select_related('produto', 'armazem').order_by('id')
     serializer_class = EstoqueItemSerializer
+    leitura_rapida = True
+    acoes_com_responsavel = ('entrada', 'saida', 'lote')
+    filterset_fields = ['produto', 'armazem', 'abaixo_minimo']
+
+    @action(detail=False, methods=['get'])
+    def exportar(self, request):
+        itens = self.filter_queryset(EstoqueItem.objects.order_by('id'))
+        return exportar_queryset(request, itens, [
+            ('id', 'id'),
+            ('produto_id', 'produto_id'),
+            ('produto_sku', 'produto__sku'),
+            ('produto_nome', 'produto__nome'),
+            ('armazem_id', 'armazem_id'),
+            ('armazem_nome', 'armazem__nome'),
+            ('quantidade', 'quantidade'),
+            ('abaixo_minimo', 'abaixo_minimo'),
+        ], 'estoque')
+
+    @action(detail=False, methods=['get'])
+    def posicao(self, request):
+        # Estoque em uma data: ?data=AAAA-MM-DD (fechamento do dia) ou um momento ISO 8601, com os filtros da listagem e ?sku=.
+        texto = request.query_params.get('data', '')
+        try:
+            data = parse_date(texto)
+            alvo = fim_do_dia(data) if data else parse_datetime(texto)
+        except ValueError:
+            alvo = None
+        if alvo is None:
+            return Response({'erro': 'Informe data=AAAA-MM-DD ou um momento ISO 8601.'}, status=status.HTTP_400_BAD_REQUEST)
+        if timezone.is_naive(alvo):
+            alvo = timezone.make_aware(alvo)
+
+        itens = self.filter_queryset(EstoqueItem.objects.all())
+        if request.query_params.get('sku'):
+            itens = itens.filter(produto__sku=request.query_params['sku'])
+        page = self.paginate_queryset(itens.order_by('armazem_id', 'produto_id').values_list('id', 'produto_id', 'produto__sku'))
+        try:
+            posicoes = posicoes_em(alvo, EstoqueItem.objects.filter(id__in=[item_id for item_id, _, _ in page]))
+        except DetalheCompactado as e:
+            return Response({'erro': str(e)}, status=status.HTTP_409_CONFLICT)
+        skus = {produto_id: sku for _, produto_id, sku in page}
+        return self.get_paginated_response([{**posicao, 'produto_sku': skus[posicao['produto_id']]} for posicao in posicoes])
 
     @action(detail=False, methods=['post'])
     def entrada(self, request):
@@ -72,25 +251,8 @@ class EstoqueViewSet(viewsets.ReadOnlyModelViewSet):
             return Response({'erro': 'A quantidade deve ser positiva.'}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            with transaction.atomic():
-                item, created = EstoqueItem.objects.get_or_create(
-                    produto_id=produto_id,
-                    armazem_id=armazem_id,
-                    defaults={'quantidade': 0}
-                )
-
-                item.quantidade += quantidade
-                item.save()
-
-                MovimentacaoEstoque.objects.create(
-                    produto_id=produto_id,
-                    armazem_id=armazem_id,
-                    quantidade=quantidade,
-                    responsavel=request.user,
-                    tipo='ENTRADA',
-                    motivo=motivo
-                )
-            return Response({'status': 'Entrada realizada com sucesso!', 'nova_quantidade': item.quantidade}, status=status.HTTP_200_OK)
+            nova_quantidade = registrar_entrada(produto_id, armazem_id, quantidade, request.user, motivo)
+            return Response({'status': 'Entrada realizada com sucesso!', 'nova_quantidade': nova_quantidade}, status=status.HTTP_200_OK)
         except Exception as e:
             return Response({'erro': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
             
@@ -105,53 +267,100 @@ class EstoqueViewSet(viewsets.ReadOnlyModelViewSet):
                 return Response({'erro': 'A quantidade deve ser positiva.'}, status=status.HTTP_400_BAD_REQUEST)
 
             try:
-                with transaction.atomic():
-                    item = EstoqueItem.objects.get(produto_id=produto_id, armazem_id=armazem_id)
-
-                    if item.quantidade < quantidade:
-                        return Response({'erro': 'Estoque insuficiente.'}, status=status.HTTP_400_BAD_REQUEST)
-
-                    item.quantidade -= quantidade
-                    item.save()
-
-                    MovimentacaoEstoque.objects.create(
-                        produto_id=produto_id,
-                        armazem_id=armazem_id,
-                        quantidade=-quantidade, 
-                        responsavel=request.user,
-                        tipo='SAIDA',
-                        motivo=motivo
-                    )
-                return Response({'status': 'Saída realizada com sucesso!', 'nova_quantidade': item.quantidade}, status=status.HTTP_200_OK)
+                nova_quantidade = registrar_saida(produto_id, armazem_id, quantidade, request.user, motivo)
+                return Response({'status': 'Saída realizada com sucesso!', 'nova_quantidade': nova_quantidade}, status=status.HTTP_200_OK)
+            except EstoqueInsuficiente as e:
+                return Response({'erro': str(e)}, status=status.HTTP_400_BAD_REQUEST)
             except EstoqueItem.DoesNotExist:
                 return Response({'erro': 'Este produto não existe no estoque deste armazém.'}, status=status.HTTP_404_NOT_FOUND)
             except Exception as e:
                 return Response({'erro': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)    
-            
-class RelatorioBaixoEstoqueView(APIView):
-    def get(self, request, format=None):
-        itens_com_minimo = EstoqueItem.objects.annotate(
-            estoque_minimo_produto=F('produto__estoque_minimo')
-        )
 
-        itens_baixo_estoque = itens_com_minimo.filter(
-            quantidade__lte=F('estoque_minimo_produto')
-        ).select_related('produto', 'armazem')
+    @action(detail=False, methods=['post'])
+    def lote(self, request):
+        movimentacoes = request.data.get('movimentacoes')
+        modo = str(request.data.get('modo', MODO_TUDO_OU_NADA)).upper()
+
+        if not isinstance(movimentacoes, list) or not movimentacoes:
+            return Response({'erro': 'Informe uma lista de movimentações.'}, status=status.HTTP_400_BAD_REQUEST)
+        if modo not in MODOS_LOTE:
+            return Response({'erro': f'Modo inválido. Use um de: {", ".join(MODOS_LOTE)}.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        if not itens_baixo_estoque.exists():
-            return Response({"mensagem": "Nenhum produto com baixo estoque encontrado."}, status=200)
+        try:
+            aplicado, resultados = aplicar_movimentacoes_em_lote(movimentacoes, request.user, modo)
+        except Exception as e:
+            return Response({'erro': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        serializer = RelatorioBaixoEstoqueSerializer(itens_baixo_estoque, many=True)
-        return Response(serializer.data)
+        sucessos = sum(1 for resultado in resultados if resultado['sucesso'])
+        data = {
+            'modo': modo,
+            'aplicado': aplicado,
+            'total': len(resultados),
+            'sucessos': sucessos,
+            'falhas': len(resultados) - sucessos,
+            'resultados': resultados
+        }
+        return Response(data, status=status.HTTP_200_OK if aplicado else status.HTTP_400_BAD_REQUEST)
+            
+class RelatorioBaixoEstoqueView(InstrumentacaoMixin, CamposEsparsosMixin, generics.ListAPIView):
+    # Lê apenas as linhas marcadas em EstoqueItem.abaixo_minimo (índice parcial), sem comparar a tabela inteira com o estoque mínimo.
+    queryset = EstoqueItem.objects.filter(abaixo_minimo=True).select_related('produto', 'armazem').order_by('armazem_id', 'produto_id')
+    serializer_class = RelatorioBaixoEstoqueSerializer
+    filterset_class = BaixoEstoqueFilter
+    pagination_class = PaginacaoPadrao
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if response.data['count'] == 0:
+            return Response({"mensagem": "Nenhum produto com baixo estoque encontrado."}, status=200)
+        return response
     
-class PedidoCompraViewSet(viewsets.ModelViewSet):
-    queryset = PedidoCompra.objects.prefetch_related('itens').all()
+class PedidoCompraViewSet(InstrumentacaoMixin, CamposEsparsosMixin, viewsets.ModelViewSet):
+    queryset = PedidoCompra.objects.all()
     serializer_class = PedidoCompraSerializer
     permission_classes = [IsGerente | IsAdminUser]
+    acoes_com_responsavel = ('create', 'receber_pedido')
+
+    filterset_fields = {
+        'status': ['exact'],
+        'fornecedor': ['exact'],
+        'data_pedido': ['gte', 'lte'],
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('receber_pedido', 'exportar'):
+            return queryset
+        queryset = queryset.select_related('fornecedor', 'responsavel_pedido').prefetch_related(
+            Prefetch('itens', queryset=ItemPedidoCompra.objects.only('id', 'pedido_compra_id', 'produto_id', 'quantidade', 'preco_unitario'))
+        )
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.only(
+                'id', 'status', 'data_pedido', 'data_recebimento',
+                'fornecedor_id', 'fornecedor__nome_fantasia', 'responsavel_pedido_id', 'responsavel_pedido__username'
+            )
+        return queryset
 
     def perform_create(self, serializer):
         serializer.save(responsavel_pedido=self.request.user)
 
+    @action(detail=False, methods=['get'])
+    def exportar(self, request):
+        # Uma linha por item, com os dados do pedido repetidos (formato plano para BI).
+        pedidos = self.filter_queryset(self.get_queryset())
+        itens = ItemPedidoCompra.objects.filter(pedido_compra__in=pedidos.values('id')).order_by('pedido_compra_id', 'id')
+        return exportar_queryset(request, itens, [
+            ('pedido_id', 'pedido_compra_id'),
+            ('status', 'pedido_compra__status'),
+            ('data_pedido', 'pedido_compra__data_pedido'),
+            ('data_recebimento', 'pedido_compra__data_recebimento'),
+            ('fornecedor_id', 'pedido_compra__fornecedor_id'),
+            ('fornecedor_nome', 'pedido_compra__fornecedor__nome_fantasia'),
+            ('produto_id', 'produto_id'),
+            ('quantidade', 'quantidade'),
+            ('preco_unitario', 'preco_unitario'),
+        ], 'pedidos_compra')
+
 
     @action(detail=True, methods=['post'])
     def receber_pedido(self, request, pk=None):
@@ -165,131 +374,170 @@ class PedidoCompraViewSet(viewsets.ModelViewSet):
         
         try:
             with transaction.atomic():
-                for item_pedido in pedido.itens.all():
-                    item_estoque, created = EstoqueItem.objects.get_or_create(
-                        produto=item_pedido.produto,
-                        armazem_id=armazem_id,
-                        defaults={'quantidade': 0}
-                    )
-                    item_estoque.quantidade += item_pedido.quantidade
-                    item_estoque.save()
-
-                    MovimentacaoEstoque.objects.create(
-                        produto=item_pedido.produto,
-                        armazem_id=armazem_id,
-                        quantidade=item_pedido.quantidade,
-                        responsavel=request.user,
-                        tipo='ENTRADA',
-                        motivo=f"Recebimento do Pedido de Compra #{pedido.id}"
-                    )
-                
-                pedido.status = 'RECEBIDO'
-                pedido.data_recebimento = timezone.now()
-                pedido.save()
+                # Transição condicional de status: dois recebimentos simultâneos do mesmo pedido não dão entrada em dobro.
+                if not PedidoCompra.objects.filter(pk=pedido.pk, status='APROVADO').update(status='RECEBIDO', data_recebimento=timezone.now()):
+                    return Response({'erro': 'Apenas pedidos com status "Aprovado" podem ser recebidos.'}, status=status.HTTP_409_CONFLICT)
+
+                itens = list(pedido.itens.values_list('produto_id', 'quantidade', 'preco_unitario'))
+                registrar_entradas_pedido(
+                    [(produto_id, quantidade) for produto_id, quantidade, _ in itens],
+                    armazem_id,
+                    request.user,
+                    f"Recebimento do Pedido de Compra #{pedido.id}"
+                )
+                registrar_compra(itens)
             
             return Response({'status': f'Pedido #{pedido.id} recebido com sucesso!'})
         
         except Exception as e:
             return Response({'erro': f'Ocorreu um erro: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
-class ClienteViewSet(viewsets.ModelViewSet):
+class ClienteViewSet(InstrumentacaoMixin, CamposEsparsosMixin, viewsets.ModelViewSet):
     queryset = Cliente.objects.all()
     serializer_class = ClienteSerializer
 
-class PedidoVendaViewSet(viewsets.ModelViewSet):
+class PedidoVendaViewSet(InstrumentacaoMixin, CamposEsparsosMixin, viewsets.ModelViewSet):
     queryset = PedidoVenda.objects.all()
     serializer_class = PedidoVendaSerializer
+    acoes_com_responsavel = ('create', 'despachar_pedido')
+
+    filterset_fields = {
+        'status': ['exact'],
+        'cliente': ['exact'],
+        'data_pedido': ['gte', 'lte'],
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('despachar_pedido', 'exportar'):
+            return queryset
+        queryset = queryset.select_related('cliente', 'responsavel_venda').prefetch_related(
+            Prefetch('itens', queryset=ItemPedidoVenda.objects.only('id', 'pedido_venda_id', 'produto_id', 'quantidade', 'preco_unitario'))
+        )
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.only(
+                'id', 'status', 'data_pedido', 'data_despacho', 'armazem_id',
+                'cliente_id', 'cliente__nome', 'responsavel_venda_id', 'responsavel_venda__username'
+            )
+        return queryset.prefetch_related(
+            Prefetch('reservas', queryset=ReservaEstoque.objects.only('id', 'pedido_venda_id', 'produto_id', 'armazem_id', 'quantidade', 'expira_em'))
+        )
 
     def perform_create(self, serializer):
         serializer.save(responsavel_venda=self.request.user)
 
+    @action(detail=False, methods=['get'])
+    def exportar(self, request):
+        # Uma linha por item, com os dados do pedido repetidos (formato plano para BI).
+        pedidos = self.filter_queryset(self.get_queryset())
+        itens = ItemPedidoVenda.objects.filter(pedido_venda__in=pedidos.values('id')).order_by('pedido_venda_id', 'id')
+        return exportar_queryset(request, itens, [
+            ('pedido_id', 'pedido_venda_id'),
+            ('status', 'pedido_venda__status'),
+            ('data_pedido', 'pedido_venda__data_pedido'),
+            ('data_despacho', 'pedido_venda__data_despacho'),
+            ('cliente_id', 'pedido_venda__cliente_id'),
+            ('cliente_nome', 'pedido_venda__cliente__nome'),
+            ('produto_id', 'produto_id'),
+            ('quantidade', 'quantidade'),
+            ('preco_unitario', 'preco_unitario'),
+        ], 'pedidos_venda')
+
     @action(detail=True, methods=['post'])
     def despachar_pedido(self, request, pk=None):
         pedido = self.get_object()
         armazem_id = request.data.get('armazem_id')
+        estrategia = str(request.data.get('estrategia', ESTRATEGIA_MENOS_ARMAZENS)).upper()
+        simular = str(request.data.get('simular', '')).lower() in ('1', 'true')
 
         if pedido.status != 'PAGO':
             return Response({'erro': 'Apenas pedidos com status "pago" podem ser despachados'}, status=status.HTTP_400_BAD_REQUEST)
-        if not armazem_id:
-            return Response({'erro': 'O ID do armazém de saída é obrigatório.'}, status=status.HTTP_400_BAD_REQUEST)
+        if estrategia not in ESTRATEGIAS_ALOCACAO:
+            return Response({'erro': f'Estratégia inválida. Use uma de: {", ".join(ESTRATEGIAS_ALOCACAO)}.'}, status=status.HTTP_400_BAD_REQUEST)
+        armazens_reservados = set(pedido.reservas.values_list('armazem_id', flat=True))
+        # Pedidos com reserva saem dos armazéns reservados; outro armazém informado é um conflito, não é ignorado.
+        if armazem_id and armazens_reservados and {str(armazem_id)} != {str(armazem) for armazem in armazens_reservados}:
+            return Response({'erro': 'O pedido tem estoque reservado em outro armazém; não informe armazem_id ou use o da reserva.'}, status=status.HTTP_400_BAD_REQUEST)
+        # Sem armazém informado nem reserva, o pedido é dividido automaticamente entre os armazéns.
+        automatica = not armazem_id and not pedido.armazem_id and not armazens_reservados
         
         try:
-            with transaction.atomic():
-                for item_pedido in pedido.itens.all():
-                    item_estoque = EstoqueItem.objects.get(
-                        produto=item_pedido.produto,
-                        armazem_id=armazem_id
-                    )
+            if simular:
+                if not automatica:
+                    return Response({'erro': 'A simulação se aplica apenas à alocação automática (sem armazém e sem reserva).'}, status=status.HTTP_400_BAD_REQUEST)
+                plano = planejar_alocacao(pedido.itens.values_list('produto_id', 'quantidade'), estrategia)
+                return Response({'plano': serializar_plano(plano), 'armazens': len(plano)})
 
-                    if item_estoque.quantidade < item_pedido.quantidade:
-                        raise Exception(f"Estoque insuficiente para o produto {item_estoque.produto.nome}.")
-                    
-                    item_estoque.quantidade -= item_pedido.quantidade
-                    item_estoque.save()
-
-                    print(f"DEBUG: Estoque atual do produto '{item_estoque.produto.nome}': {item_estoque.quantidade}")
-                    print(f"DEBUG: Estoque mínimo definido: {item_estoque.produto.estoque_minimo}")
-
-                    if item_estoque.quantidade <= item_estoque.produto.estoque_minimo:
-                        print("DEBUG: CONDIÇÃO ATENDIDA! Enviando webhook...")
-                        enviar_webhook_baixo_estoque(item_estoque.produto, item_estoque)
-
-                    MovimentacaoEstoque.objects.create(
-                        produto=item_pedido.produto,
-                        armazem_id=armazem_id,
-                        quantidade=-item_pedido.quantidade,
-                        responsavel=request.user,
-                        tipo='SAIDA',
-                        motivo=f"Saída para venda #{pedido.id}"
+            with transaction.atomic():
+                # Transição condicional de status: dois despachos simultâneos do mesmo pedido não dão baixa em dobro.
+                if not PedidoVenda.objects.filter(pk=pedido.pk, status='PAGO').update(status='DESPACHADO', data_despacho=timezone.now()):
+                    return Response({'erro': 'Apenas pedidos com status "pago" podem ser despachados'}, status=status.HTTP_409_CONFLICT)
+
+                motivo = f"Saída para venda #{pedido.id}"
+                itens = list(pedido.itens.values_list('produto_id', 'quantidade', 'preco_unitario'))
+                plano = None
+                if automatica:
+                    plano, saldos_por_armazem = alocar_saidas(
+                        [(produto_id, quantidade) for produto_id, quantidade, _ in itens], request.user, motivo, estrategia
                     )
-                
-                pedido.status = 'DESPACHADO'
-                pedido.data_despacho = timezone.now()
-                pedido.save()
+                else:
+                    # Pedidos com reserva só consomem o que já foi separado; os demais passam pela checagem de saldo.
+                    saldos_por_armazem = consumir_reservas(pedido, request.user, motivo)
+                    if not saldos_por_armazem:
+                        armazem_id = armazem_id or pedido.armazem_id
+                        saldos_por_armazem = {armazem_id: registrar_saidas_pedido(
+                            [(produto_id, quantidade) for produto_id, quantidade, _ in itens],
+                            armazem_id,
+                            request.user,
+                            motivo
+                        )}
+                registrar_venda(itens)
+
+                condicao = Q()
+                for armazem, saldos in saldos_por_armazem.items():
+                    condicao |= Q(armazem_id=armazem, produto_id__in=saldos.keys())
+                itens_baixo_estoque = EstoqueItem.objects.select_related('produto', 'armazem').filter(condicao, abaixo_minimo=True)
+                enfileirar_webhooks_baixo_estoque(itens_baixo_estoque)
             
-            return Response({'status': f'Pedido #{pedido.id} despachado com sucesso!'})
+            resposta = {'status': f'Pedido #{pedido.id} despachado com sucesso!'}
+            if plano is not None:
+                resposta['plano'] = serializar_plano(plano)
+            return Response(resposta)
         except EstoqueItem.DoesNotExist:
             return Response({'erro': 'Um dos produtos não existe no estoque do armazém informado'}, status=status.HTTP_404_NOT_FOUND)
+        except EstoqueInsuficiente as e:
+            produto = Produto.objects.filter(pk=e.produto_id).only('nome').first()
+            if produto is None:
+                return Response({'erro': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({'erro': f"Estoque insuficiente para o produto {produto.nome}."}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({'erro': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-class DashboardView(APIView):
+class DashboardView(InstrumentacaoMixin, APIView):
     permission_classes = [IsGerente | IsAdminUser]
 
     def get(self, request, format=None):
+        datas, erro = periodo_das_metricas(request.query_params)
+        if erro:
+            return Response({'erro': erro}, status=status.HTTP_400_BAD_REQUEST)
 
-        total_vendas = PedidoVenda.objects.filter(status='DESPACHADO').aggregate(
-            total=Coalesce(Sum(F('itens__quantidade') * F('itens__preco_unitario')), 0, output_field=DecimalField())
-        )['total']
-
-        total_compras = PedidoCompra.objects.filter(status='RECEBIDO').aggregate(
-            total=Coalesce(Sum(F('itens__quantidade') * F('itens__preco_unitario')), 0, output_field=DecimalField())
-        )['total']
-
-        valor_inventario = EstoqueItem.objects.aggregate(
-            total=Coalesce(Sum(F('quantidade') * F('produto__preco_custo')), 0, output_field=DecimalField())
-        )['total']
-
-        produtos_baixo_estoque = EstoqueItem.objects.filter(
-            quantidade__lte=F('produto__estoque_minimo')
-        ).count()
-
-        top_5_produtos = ItemPedidoVenda.objects.filter(
-            pedido_venda__status='DESPACHADO'
-        ).values(
-            'produto__nome'
-        ).annotate(
-            total_vendido=Sum('quantidade')
-        ).order_by(
-            '-total_vendido'
-        )[:5]
+        metricas = obter_metricas(**datas)
+        # Soma de uma linha por armazém, mantida pelos gatilhos: não depende de quantos itens estão abaixo do mínimo.
+        produtos_baixo_estoque = ContagemBaixoEstoque.total()
 
         data = {
-            'total_vendas': total_vendas,
-            'total_compras': total_compras,
-            'valor_total_inventario': valor_inventario,
+            'total_vendas': metricas['total_vendas'],
+            'total_compras': metricas['total_compras'],
+            'valor_total_inventario': metricas['valor_total_inventario'],
             'produtos_com_baixo_estoque': produtos_baixo_estoque,
-            'top_5_produtos_vendidos': list(top_5_produtos)
+            'top_5_produtos_vendidos': metricas['top_5_produtos_vendidos']
         }
 
-        return Response(data)
\ No newline at end of file
+        return Response(data)
+
+class MetricasInstrumentacaoView(APIView):
+    # Histogramas do InstrumentacaoMiddleware no formato do Prometheus (deste processo).
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, format=None):
+        return HttpResponse(registro_instrumentacao.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
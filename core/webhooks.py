@@ -1,29 +1,201 @@
 import requests
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+from .models import EventoWebhook
 import logging
 
 logger = logging.getLogger(__name__)
 
-def enviar_webhook_baixo_estoque(produto, estoque_item):
+TIPO_BAIXO_ESTOQUE = 'BAIXO_ESTOQUE'
+
+_executor = None
+_sessao = None
+_trava = threading.Lock()
+
+
+def _config(nome, padrao):
+    return getattr(settings, nome, padrao)
+
+
+def _obter_executor():
+    global _executor
+    with _trava:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=_config('WEBHOOK_MAX_WORKERS', 4),
+                thread_name_prefix='webhook'
+            )
+        return _executor
+
+
+def _obter_sessao():
+    # Sessão compartilhada com pool de conexões: envios para o mesmo destino reutilizam a conexão HTTP (keep-alive).
+    global _sessao
+    with _trava:
+        if _sessao is None:
+            _sessao = requests.Session()
+            tamanho_pool = _config('WEBHOOK_MAX_WORKERS', 4)
+            adaptador = HTTPAdapter(pool_connections=tamanho_pool, pool_maxsize=tamanho_pool)
+            _sessao.mount('http://', adaptador)
+            _sessao.mount('https://', adaptador)
+        return _sessao
+
+
+def enfileirar_webhooks_baixo_estoque(itens_estoque):
+    """
+    Grava os alertas de baixo estoque na tabela de saída (outbox) dentro da transação
+    corrente. O envio HTTP só acontece depois do commit, fora da transação.
+    Alertas do mesmo produto/armazém dentro da janela de deduplicação são descartados; a
+    restrição única em (chave_deduplicacao, janela) descarta também os enfileirados por uma
+    transação concorrente, então o retorno pode incluir eventos que não foram gravados.
+    Os itens devem vir com produto e armazem carregados (select_related).
+    """
     url = settings.WEBHOOK_BAIXO_ESTOQUE_URL
     if not url:
         logger.warning("URL de webhook para baixo estoque não configurada")
-        return
-    
-    payload = {
-        "alerta": "Estoque Baixo",
-        "produto_id": produto.id,
-        "produto_nome": produto.nome,
-        "produto_sku": produto.sku,
-        "quantidade_atual": estoque_item.quantidade,
-        "estoque_minimo": produto.estoque_minimo,
-        "armazem_id": estoque_item.armazem.id,
-        "armazem_nome": estoque_item.armazem.nome
+        return []
+
+    por_chave = {
+        f"{TIPO_BAIXO_ESTOQUE}:{item.produto_id}:{item.armazem_id}": item
+        for item in itens_estoque
     }
+    if not por_chave:
+        return []
+
+    janela = int(timezone.now().timestamp()) // _config('WEBHOOK_JANELA_DEDUPLICACAO', 300)
+    recentes = set(
+        EventoWebhook.objects.filter(chave_deduplicacao__in=por_chave.keys(), janela=janela)
+        .exclude(status='FALHOU')
+        .values_list('chave_deduplicacao', flat=True)
+    )
+
+    eventos = []
+    for chave, item in por_chave.items():
+        if chave in recentes:
+            logger.info(f"Alerta de baixo estoque para o produto {item.produto.sku} já enfileirado recentemente; ignorando")
+            continue
+        eventos.append(EventoWebhook(
+            tipo=TIPO_BAIXO_ESTOQUE,
+            url=url,
+            chave_deduplicacao=chave,
+            janela=janela,
+            payload={
+                "alerta": "Estoque Baixo",
+                "produto_id": item.produto.id,
+                "produto_nome": item.produto.nome,
+                "produto_sku": item.produto.sku,
+                "quantidade_atual": item.quantidade,
+                "estoque_minimo": item.produto.estoque_minimo,
+                "armazem_id": item.armazem.id,
+                "armazem_nome": item.armazem.nome
+            }
+        ))
+
+    if eventos:
+        EventoWebhook.objects.bulk_create(eventos, ignore_conflicts=True)
+        transaction.on_commit(agendar_processamento)
+    return eventos
+
+
+def agendar_processamento():
+    if _config('WEBHOOK_ENVIO_ASSINCRONO', True):
+        _obter_executor().submit(_processar_em_thread)
+    else:
+        processar_outbox()
 
+
+def _processar_em_thread():
+    try:
+        processar_outbox()
+    except Exception:
+        logger.exception("Falha inesperada ao processar a fila de webhooks")
+    finally:
+        connection.close()
+
+
+def _reservar_eventos(limite):
+    # A reserva empurra proxima_tentativa para frente (lease) com um UPDATE condicional,
+    # então workers concorrentes nunca pegam o mesmo evento; se o worker morrer, o lease expira e o evento volta para a fila.
+    agora = timezone.now()
+    ids = list(
+        EventoWebhook.objects.filter(status='PENDENTE', proxima_tentativa__lte=agora)
+        .order_by('proxima_tentativa', 'id')
+        .values_list('id', flat=True)[:limite]
+    )
+    if not ids:
+        return []
+
+    lote = uuid.uuid4().hex
+    EventoWebhook.objects.filter(pk__in=ids, status='PENDENTE', proxima_tentativa__lte=agora).update(
+        lote=lote,
+        proxima_tentativa=agora + timedelta(seconds=_config('WEBHOOK_TEMPO_RESERVA', 60))
+    )
+    return list(EventoWebhook.objects.filter(lote=lote))
+
+
+def _registrar_falha(eventos, erro):
+    agora = timezone.now()
+    maximo_tentativas = _config('WEBHOOK_MAX_TENTATIVAS', 5)
+    atraso_base = _config('WEBHOOK_ATRASO_BASE', 5)
+    atraso_maximo = _config('WEBHOOK_ATRASO_MAXIMO', 3600)
+
+    for evento in eventos:
+        evento.tentativas += 1
+        evento.ultimo_erro = str(erro)[:2000]
+        evento.lote = ''
+        if evento.tentativas >= maximo_tentativas:
+            evento.status = 'FALHOU'
+            logger.error(f"Webhook #{evento.id} descartado após {evento.tentativas} tentativas: {erro}")
+        else:
+            atraso = min(atraso_base * 2 ** (evento.tentativas - 1), atraso_maximo)
+            evento.proxima_tentativa = agora + timedelta(seconds=atraso)
+    EventoWebhook.objects.bulk_update(eventos, ['tentativas', 'ultimo_erro', 'lote', 'status', 'proxima_tentativa'])
+
+
+def _enviar_lote(url, eventos):
     try:
-        resposta = requests.post(url, json=payload, timeout=10)
+        resposta = _obter_sessao().post(
+            url,
+            json={"alertas": [evento.payload for evento in eventos]},
+            timeout=_config('WEBHOOK_TIMEOUT', 10)
+        )
         resposta.raise_for_status()
-        logger.info(f"Webhook de baixo de estoque enviado com sucesso para o produto {produto.sku}")
     except requests.exceptions.RequestException as e:
-        logger.error(f"Falha ao enviar webhook de baixo estoque para o produto {produto.sku}: {e}")
\ No newline at end of file
+        logger.error(f"Falha ao enviar {len(eventos)} webhook(s) para {url}: {e}")
+        _registrar_falha(eventos, e)
+        return False
+
+    EventoWebhook.objects.filter(pk__in=[evento.id for evento in eventos]).update(
+        status='ENVIADO', data_envio=timezone.now(), lote='', tentativas=F('tentativas') + 1
+    )
+    logger.info(f"{len(eventos)} webhook(s) enviados com sucesso para {url}")
+    return True
+
+
+def processar_outbox(limite=500):
+    """
+    Envia os eventos pendentes, agrupados por destino em lotes de até
+    WEBHOOK_TAMANHO_LOTE alertas por requisição. Retorna (enviados, falhas).
+    """
+    eventos = _reservar_eventos(limite)
+    por_destino = {}
+    for evento in eventos:
+        por_destino.setdefault(evento.url, []).append(evento)
+
+    tamanho_lote = _config('WEBHOOK_TAMANHO_LOTE', 50)
+    enviados = falhas = 0
+    for url, eventos_destino in por_destino.items():
+        for inicio in range(0, len(eventos_destino), tamanho_lote):
+            lote = eventos_destino[inicio:inicio + tamanho_lote]
+            if _enviar_lote(url, lote):
+                enviados += len(lote)
+            else:
+                falhas += len(lote)
+    return enviados, falhas
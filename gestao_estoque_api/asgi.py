@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gestao_estoque_api.settings')
 
 application = get_asgi_application()
+
+from core.indice_sku import aquecer_em_segundo_plano  # noqa: E402
+
+aquecer_em_segundo_plano()
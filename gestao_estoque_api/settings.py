@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -38,12 +39,15 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    # Lookups de trigramas (busca aproximada de SKU em core.busca) quando o banco é PostgreSQL.
+    'django.contrib.postgres',
     'rest_framework',
     'django_filters',
     'core.apps.CoreConfig',
 ]
 
 MIDDLEWARE = [
+    'core.instrumentacao.InstrumentacaoMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,6 +84,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Banco de testes em arquivo (e não em memória) para que os testes de concorrência
+        # usem conexões independentes por thread, como acontece em produção.
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -127,7 +136,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.autenticacao.AutenticacaoJWTSemEstado',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -135,9 +144,96 @@ REST_FRAMEWORK = {
     
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend'
-    ]
+    ],
+
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.PaginacaoPadrao',
+    'PAGE_SIZE': 50,
+}
+
+# Cache padrão: papéis dos usuários, revogação de tokens e invalidações do índice de SKU, que precisam valer
+# entre processos. CACHE_BACKEND: 'memoria' (só por processo, para um worker) ou 'redis' (CACHE_REDIS_URL),
+# obrigatório com mais de um processo (gunicorn -w N).
+CACHES_DISPONIVEIS = {
+    'memoria': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('CACHE_REDIS_URL', 'redis://127.0.0.1:6379/0'),
+    },
+}
+CACHES = {
+    'default': CACHES_DISPONIVEIS[os.environ.get('CACHE_BACKEND', 'memoria')],
 }
 
+# Cache de respostas do catálogo (produtos, categorias, fornecedores, armazéns).
+# CACHE_RESPOSTAS_BACKEND: 'memoria' (LRU em processo), 'arquivo' ou 'redis' (CACHE_RESPOSTAS_REDIS_URL).
+CACHES_RESPOSTAS_DISPONIVEIS = {
+    'memoria': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'respostas',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'arquivo': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_RESPOSTAS_DIRETORIO', os.path.join(tempfile.gettempdir(), 'gestao_estoque_respostas')),
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('CACHE_RESPOSTAS_REDIS_URL', 'redis://127.0.0.1:6379/1'),
+    },
+}
+CACHES['respostas'] = CACHES_RESPOSTAS_DISPONIVEIS[os.environ.get('CACHE_RESPOSTAS_BACKEND', 'memoria')]
+CACHE_RESPOSTAS_ALIAS = 'respostas'
+CACHE_RESPOSTAS_TIMEOUT = 300
+
+# Validade máxima (segundos) dos papéis de usuário em cache (IsGerente).
+PAPEIS_CACHE_TIMEOUT = 300
+
+# Autenticação pelas claims do token, sem ler o usuário no banco. None: só com cache compartilhado
+# (CACHE_BACKEND=redis), necessário para a revogação valer em todos os processos. True com cache em
+# memória só é seguro com um único processo.
+AUTENTICACAO_SEM_ESTADO = None
+
+# Tokens com claims de usuário (username, is_staff, grupos) para a autenticação sem estado.
+SIMPLE_JWT = {
+    'TOKEN_OBTAIN_SERIALIZER': 'core.autenticacao.ObterTokenSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'core.autenticacao.RenovarTokenSerializer',
+}
+
+# Validade (minutos) das reservas de estoque de pedidos ainda não pagos; a varredura é o comando liberar_reservas.
+RESERVA_VALIDADE_MINUTOS = 30
+
+# Janelas das movimentações (comando arquivar_movimentacoes): meses na tabela quente e meses com detalhe no arquivo.
+MOVIMENTACOES_MESES_QUENTES = 6
+MOVIMENTACOES_MESES_DETALHADOS = 24
+
+# Aquece o índice de SKU em memória (scan de código de barras) ao subir o wsgi/asgi e após uma troca de geração.
+INDICE_SKU_AQUECER = True
+# Intervalo mínimo entre as conferências das alterações publicadas no cache (defasagem máxima entre processos).
+INDICE_SKU_VERIFICACAO_MS = 1000
+# Sem cache compartilhado, o índice é recarregado por inteiro neste intervalo (0 desliga).
+INDICE_SKU_RECARGA_SEGUNDOS = 300
+
+# Fração das requisições instrumentadas (tempos por fase, consultas SQL, N+1), expostas em /api/_metrics/. 0 desliga.
+INSTRUMENTACAO_AMOSTRAGEM = float(os.environ.get('INSTRUMENTACAO_AMOSTRAGEM', 0))
+# Repetições da mesma consulta numa requisição a partir das quais ela é registrada como possível N+1.
+INSTRUMENTACAO_LIMIAR_N_MAIS_1 = 10
+
+# Limite para ?page_size= nos endpoints com paginação por página.
+PAGINACAO_TAMANHO_MAXIMO = 500
+
 # Em settings.py (no final do arquivo)
 
-WEBHOOK_BAIXO_ESTOQUE_URL = 'https://webhook.site/5415c561-d665-48b2-931d-e662f51f71a2'
\ No newline at end of file
+WEBHOOK_BAIXO_ESTOQUE_URL = 'https://webhook.site/5415c561-d665-48b2-931d-e662f51f71a2'
+
+# Entrega dos webhooks (outbox): os eventos são gravados na transação e enviados após o commit.
+WEBHOOK_ENVIO_ASSINCRONO = True
+WEBHOOK_MAX_WORKERS = 4
+WEBHOOK_TIMEOUT = 10
+WEBHOOK_TAMANHO_LOTE = 50
+WEBHOOK_MAX_TENTATIVAS = 5
+WEBHOOK_ATRASO_BASE = 5  # segundos; dobra a cada nova tentativa
+WEBHOOK_ATRASO_MAXIMO = 3600
+WEBHOOK_TEMPO_RESERVA = 60
+WEBHOOK_JANELA_DEDUPLICACAO = 300
\ No newline at end of file
@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gestao_estoque_api.settings')
 
 application = get_wsgi_application()
+
+from core.indice_sku import aquecer_em_segundo_plano  # noqa: E402
+
+aquecer_em_segundo_plano()